@@ -0,0 +1,383 @@
+"""
+Semantic search over blog articles.
+
+Articles are split into overlapping word chunks (the title heads the first one),
+embedded with the same model as the image catalog (qdrant_utils.encode) and
+stored in their own Qdrant collection, one point per chunk. Creates, updates and
+deletes are queued and applied in the background in small batches; a search
+returns the best-matching articles, each with its best chunk.
+
+Every article write also leaves a `search_pending` marker on the article, cleared
+once that version is indexed, so changes queued by a worker that crashed are
+picked up again by the periodic sweep.
+
+    python article_search.py --reindex   # (re)index every article
+"""
+import argparse
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from qdrant_client.http import models
+from qdrant_client.http.models import PointStruct, VectorParams
+
+import qdrant_utils
+from embedding_cache import query_cache
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+ARTICLE_COLLECTION = os.getenv("QDRANT_ARTICLE_COLLECTION", "blog_articles")
+ARTICLE_CHUNK_WORDS = int(os.getenv("ARTICLE_CHUNK_WORDS", "200"))
+ARTICLE_CHUNK_OVERLAP = int(os.getenv("ARTICLE_CHUNK_OVERLAP", "40"))
+ARTICLE_INDEX_INTERVAL = float(os.getenv("ARTICLE_INDEX_INTERVAL", "1"))
+ARTICLE_INDEX_BATCH = int(os.getenv("ARTICLE_INDEX_BATCH", "16"))
+# Reprise des articles restés marqués `search_pending` (écriture perdue par un worker arrêté)
+ARTICLE_INDEX_SWEEP_INTERVAL = float(os.getenv("ARTICLE_INDEX_SWEEP_INTERVAL", "60"))
+
+collection_ready = False
+
+
+# =====================================================
+# MORCEAUX
+# =====================================================
+
+def chunk_article(article, words_per_chunk=ARTICLE_CHUNK_WORDS, overlap=ARTICLE_CHUNK_OVERLAP):
+    """Fenêtres de mots qui se chevauchent sur le contenu ; le titre est placé en tête de la première."""
+    title = (article.get("title") or "").strip()
+    words = (article.get("content") or "").split()
+    step = max(1, words_per_chunk - overlap)
+    chunks = []
+    for start in range(0, max(len(words), 1), step):
+        chunks.append(" ".join(words[start:start + words_per_chunk]))
+        if start + words_per_chunk >= len(words):
+            break
+    if title:
+        chunks[0] = f"{title}\n{chunks[0]}".strip()
+    return [chunk for chunk in chunks if chunk]
+
+
+def chunk_point_id(article_id, chunk_index):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"eduagent-article:{article_id}:{chunk_index}"))
+
+
+def _article_filter(article_id):
+    return models.FieldCondition(key="article_id", match=models.MatchValue(value=article_id))
+
+
+# =====================================================
+# COLLECTION
+# =====================================================
+
+def setup_article_collection():
+    """Crée la collection des articles et ses index de payload. Retourne True si elle vient d'être créée."""
+    global collection_ready
+    client = qdrant_utils.client
+    if client is None or not qdrant_utils.qdrant_available:
+        return False
+    created = False
+    if not client.collection_exists(collection_name=ARTICLE_COLLECTION):
+        client.create_collection(
+            collection_name=ARTICLE_COLLECTION,
+            vectors_config=VectorParams(size=768, distance="Cosine"),
+        )
+        for field in ("article_id", "category", "tags"):
+            client.create_payload_index(
+                collection_name=ARTICLE_COLLECTION,
+                field_name=field,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+        client.create_payload_index(
+            collection_name=ARTICLE_COLLECTION,
+            field_name="chunk",
+            field_schema=models.PayloadSchemaType.INTEGER,
+        )
+        created = True
+    collection_ready = True
+    return created
+
+
+def index_articles(articles):
+    """
+    Encode tous les morceaux de `articles` en un lot et les enregistre, puis
+    supprime les morceaux en trop laissés par des versions plus longues.
+    """
+    client = qdrant_utils.client
+    entries = []
+    chunk_counts = {}
+    for article in articles:
+        article_id = str(article["_id"])
+        chunks = chunk_article(article)
+        chunk_counts[article_id] = len(chunks)
+        for index, chunk in enumerate(chunks):
+            entries.append((article_id, index, chunk, article))
+
+    points = []
+    if entries:
+        vectors = qdrant_utils.encode([chunk for _, _, chunk, _ in entries])
+        points = [
+            PointStruct(
+                id=chunk_point_id(article_id, index),
+                vector=vector.tolist(),
+                payload={
+                    "article_id": article_id,
+                    "chunk": index,
+                    "text": chunk,
+                    "title": article.get("title", ""),
+                    "category": article.get("category"),
+                    "tags": article.get("tags") or [],
+                },
+            )
+            for (article_id, index, chunk, article), vector in zip(entries, vectors)
+        ]
+        client.upsert(collection_name=ARTICLE_COLLECTION, points=points)
+
+    client.delete(
+        collection_name=ARTICLE_COLLECTION,
+        points_selector=models.FilterSelector(filter=models.Filter(should=[
+            models.Filter(must=[
+                _article_filter(article_id),
+                models.FieldCondition(key="chunk", range=models.Range(gte=count)),
+            ])
+            for article_id, count in chunk_counts.items()
+        ])),
+    )
+    return len(points)
+
+
+def delete_articles(article_ids):
+    qdrant_utils.client.delete(
+        collection_name=ARTICLE_COLLECTION,
+        points_selector=models.FilterSelector(filter=models.Filter(must=[
+            models.FieldCondition(key="article_id", match=models.MatchAny(any=list(article_ids))),
+        ])),
+    )
+
+
+# =====================================================
+# FILE D'INDEXATION
+# =====================================================
+
+class ArticleIndexQueue:
+    """
+    Modifications d'articles en attente, regroupées par article (la dernière
+    opération l'emporte) et appliquées par un thread dédié toutes les
+    ARTICLE_INDEX_INTERVAL secondes, par lots de ARTICLE_INDEX_BATCH articles.
+    Les articles sont relus dans MongoDB au moment du traitement : seule leur
+    dernière version est encodée.
+
+    La file ne vit qu'en mémoire. Ce qui s'y trouvait à l'arrêt brutal d'un
+    worker est retrouvé par le balayage (toutes les ARTICLE_INDEX_SWEEP_INTERVAL
+    secondes, et au démarrage) des articles encore marqués `search_pending` ; les
+    points d'un article supprimé entre-temps sont retirés quand une recherche les
+    renvoie (voir routes/blog.py).
+    """
+
+    def __init__(self, interval=ARTICLE_INDEX_INTERVAL, batch_size=ARTICLE_INDEX_BATCH, sweep_interval=ARTICLE_INDEX_SWEEP_INTERVAL):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.sweep_interval = sweep_interval
+        self.pending = OrderedDict()  # article_id -> "index" | "delete"
+        self.cond = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.indexed = 0
+        self.deleted = 0
+        self.chunks = 0
+        self.swept = 0
+        self.failures = 0
+
+    def enqueue(self, article_id, op="index"):
+        with self.cond:
+            self.pending[str(article_id)] = op
+            self.pending.move_to_end(str(article_id))
+            if len(self.pending) >= self.batch_size:
+                self.cond.notify()
+
+    def _take(self):
+        with self.cond:
+            batch = OrderedDict()
+            while self.pending and len(batch) < self.batch_size:
+                article_id, op = self.pending.popitem(last=False)
+                batch[article_id] = op
+            return batch
+
+    def _requeue(self, batch):
+        # Les opérations en échec repassent devant, sauf si une plus récente est arrivée entre-temps
+        with self.cond:
+            for article_id, op in reversed(batch.items()):
+                if article_id not in self.pending:
+                    self.pending[article_id] = op
+                    self.pending.move_to_end(article_id, last=False)
+
+    def process(self, batch):
+        from mongo import get_articles_for_index, mark_articles_indexed
+
+        to_index = [article_id for article_id, op in batch.items() if op == "index"]
+        articles = get_articles_for_index(to_index) if to_index else []
+        found = {str(article["_id"]) for article in articles}
+        # Supprimé, ou disparu avant d'avoir pu être indexé
+        to_delete = [article_id for article_id in batch if article_id not in found]
+        if articles:
+            self.chunks += index_articles(articles)
+            self.indexed += len(articles)
+            mark_articles_indexed(articles)
+        if to_delete:
+            delete_articles(to_delete)
+            self.deleted += len(to_delete)
+
+    def drain(self):
+        """Applique tout ce qui est en attente. Retourne le nombre d'articles traités."""
+        processed = 0
+        while collection_ready:
+            batch = self._take()
+            if not batch:
+                break
+            try:
+                self.process(batch)
+            except Exception as e:
+                self.failures += 1
+                print(f"[Article Search] Indexing failed, will retry: {e}")
+                self._requeue(batch)
+                break
+            processed += len(batch)
+        return processed
+
+    def sweep(self):
+        """
+        Remet en file les articles marqués `search_pending` depuis plus d'un
+        intervalle de balayage (les plus récents sont encore dans la file du
+        worker qui les a écrits). Retourne le nombre d'articles ajoutés.
+        """
+        from mongo import list_pending_article_ids
+
+        if not collection_ready:
+            return 0
+        ids = list_pending_article_ids(datetime.utcnow() - timedelta(seconds=self.sweep_interval))
+        with self.cond:
+            ids = [article_id for article_id in ids if article_id not in self.pending]
+        for article_id in ids:
+            self.enqueue(article_id)
+        self.swept += len(ids)
+        return len(ids)
+
+    def _run(self):
+        next_sweep = 0.0
+        while self.running:
+            if time.monotonic() >= next_sweep:
+                try:
+                    swept = self.sweep()
+                    if swept:
+                        print(f"[Article Search] Re-queued {swept} articles left pending")
+                except Exception as e:
+                    print(f"[Article Search] Sweep failed: {e}")
+                next_sweep = time.monotonic() + self.sweep_interval
+            self.drain()
+            with self.cond:
+                self.cond.wait(timeout=self.interval)
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="article-index", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.running = False
+            with self.cond:
+                self.cond.notify()
+            self.thread.join()
+            self.thread = None
+        self.drain()
+
+    def backfill(self):
+        """
+        Indexation de tous les articles (collection neuve, --reindex) : ils sont
+        marqués `search_pending` en base, puis remis en file par un balayage. Un
+        worker arrêté avant la fin ne perd rien : le balayage suivant reprend
+        les articles toujours marqués. Retourne le nombre d'articles marqués.
+        """
+        from mongo import mark_all_articles_pending
+
+        marked = mark_all_articles_pending()
+        self.sweep()
+        return marked
+
+    def stats(self):
+        with self.cond:
+            depth = len(self.pending)
+        return {
+            "collection_ready": collection_ready,
+            "queue_depth": depth,
+            "indexed": self.indexed,
+            "deleted": self.deleted,
+            "chunks": self.chunks,
+            "swept": self.swept,
+            "failures": self.failures,
+        }
+
+
+article_index = ArticleIndexQueue()
+
+
+# =====================================================
+# RECHERCHE
+# =====================================================
+
+def _search_filter(category=None, tag=None):
+    conditions = []
+    if category:
+        conditions.append(models.FieldCondition(key="category", match=models.MatchValue(value=category)))
+    if tag:
+        conditions.append(models.FieldCondition(key="tags", match=models.MatchValue(value=tag)))
+    return models.Filter(must=conditions) if conditions else None
+
+
+def semantic_search(query, limit=10, category=None, tag=None):
+    """
+    Les `limit` meilleurs articles pour `query`, en [{"article_id", "score", "passage"}] :
+    une entrée par article (son meilleur morceau), filtrée au besoin par catégorie / tag.
+    """
+    client = qdrant_utils.client
+    vector = query_cache.encode([query], qdrant_utils.encode)[0].tolist()
+    query_filter = _search_filter(category, tag)
+
+    response = client.query_points_groups(
+        collection_name=ARTICLE_COLLECTION,
+        query=vector,
+        group_by="article_id",
+        limit=limit,
+        group_size=1,
+        query_filter=query_filter,
+        with_payload=True,
+    )
+    return [
+        {"article_id": group.id, "score": group.hits[0].score, "passage": group.hits[0].payload.get("text", "")}
+        for group in response.groups if group.hits
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index blog articles for semantic search.")
+    parser.add_argument("--reindex", action="store_true", help="Embed and upsert every article")
+    args = parser.parse_args()
+    if not args.reindex:
+        parser.print_help()
+        return
+
+    qdrant_utils.setup_qdrant()
+    setup_article_collection()
+    if not collection_ready:
+        raise SystemExit("Qdrant is not available")
+    queued = article_index.backfill()
+    processed = article_index.drain()
+    print(f"[Article Search] ✓ {processed}/{queued} articles indexed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+import os
+from datetime import datetime, timedelta
+from bson import Binary, ObjectId
+from pymongo import AsyncMongoClient, DeleteMany, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from mongo import MONGO_URI
+from utils.pagination import keyset_filter, keyset_page
+
+# =====================================================
+# CONFIGURATION DU POOL
+# =====================================================
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+# Client asynchrone partagé par toutes les routes (le client de mongo.py reste
+# utilisé par le CLI et les threads d'écriture différée)
+client = AsyncMongoClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    serverSelectionTimeoutMS=5000,
+)
+
+db = client["eduagent"]
+
+
+async def ping():
+    await client.admin.command("ping")
+
+
+async def close():
+    await client.close()
+
+
+# =====================================================
+# HISTORIQUES
+# =====================================================
+
+# Ordre total (date desc, _id desc) : stable entre les pages et servi par les index
+HISTORY_ORDER = [("updated_at", -1), ("_id", -1)]
+ARTICLE_ORDER = [("created_at", -1), ("_id", -1)]
+# Le sketch binaire des lecteurs uniques ne sort jamais de la couche de données, ni
+# l'ancien tableau `comments` (voir migrate_comments.py), ni le marqueur d'indexation
+ARTICLE_PROJECTION = {"viewers_hll": 0, "viewers_hll_version": 0, "comments": 0, "search_pending": 0}
+# Listes : résumés seulement, les corps complets ne sortent que des routes de détail
+EXCERPT_LENGTH = 200
+ARTICLE_SUMMARY = {
+    "title": 1, "author_id": 1, "author_email": 1, "tags": 1, "category": 1,
+    "likes": 1, "views": 1, "unique_viewers": 1, "comment_count": 1,
+    "created_at": 1, "updated_at": 1,
+    "excerpt": {"$substrCP": [{"$ifNull": ["$content", ""]}, 0, EXCERPT_LENGTH]},
+    "content_length": {"$strLenCP": {"$ifNull": ["$content", ""]}},
+}
+HISTORY_SUMMARY = {
+    "topic": 1, "status": 1, "current_part_index": 1, "created_at": 1, "updated_at": 1,
+    "part_count": {"$size": {"$ifNull": ["$plan", []]}},
+}
+# Champs sélectionnables avec `fields=` sur les routes de détail
+ARTICLE_FIELDS = {
+    "title", "content", "author_id", "author_email", "tags", "category", "links",
+    "likes", "views", "unique_viewers", "comment_count", "created_at", "updated_at",
+}
+# Le jeton de session (seul secret permettant d'écrire dans une session) n'est jamais renvoyé,
+# ni les identifiants d'écriture internes (history_writer)
+HISTORY_PROJECTION = {"session_token": 0, "writes": 0}
+HISTORY_FIELDS = {
+    "topic", "plan", "history", "status", "current_part_index", "state", "revision",
+    "created_at", "updated_at",
+}
+# Utilisateur authentifié (mis en cache par get_current_user) : sans le hash du mot de passe
+USER_PROJECTION = {"password": 0}
+# Version d'un article lue atomiquement avec son écriture, pour les compteurs de taxonomie
+TAXONOMY_PROJECTION = {"category": 1, "tags": 1}
+# Commentaires dans l'ordre chronologique
+COMMENT_ORDER = [("created_at", 1), ("_id", 1)]
+
+
+async def list_histories(limit=100, skip=0):
+    """Lister tous les historiques"""
+    try:
+        histories = await db["histories"].find({}, HISTORY_SUMMARY).sort(HISTORY_ORDER).skip(skip).limit(limit).to_list()
+        for history in histories:
+            history["_id"] = str(history["_id"])
+        return histories
+    except Exception as e:
+        print(f"[MongoDB] ✗ Erreur list_histories: {e}")
+        return []
+
+
+async def list_histories_page(limit=100, cursor=None):
+    """Page d'historiques après `cursor` (pagination par clé). Retourne (historiques, next_cursor)"""
+    query = keyset_filter("updated_at", cursor) if cursor else {}
+    docs = await db["histories"].find(query, HISTORY_SUMMARY).sort(HISTORY_ORDER).limit(limit + 1).to_list()
+    histories, next_cursor = keyset_page(docs, limit, "updated_at")
+    for history in histories:
+        history["_id"] = str(history["_id"])
+    return histories, next_cursor
+
+
+async def get_history_by_id(history_id, fields=None):
+    """Récupérer un historique par son ID (tous les champs, ou seulement `fields`)"""
+    projection = dict.fromkeys(fields, 1) if fields else HISTORY_PROJECTION
+    try:
+        doc = await db["histories"].find_one({"_id": ObjectId(history_id)}, projection)
+        if doc:
+            doc["_id"] = str(doc["_id"])
+        return doc
+    except Exception as e:
+        print(f"[MongoDB] ✗ Erreur get_history: {e}")
+        return None
+
+
+async def get_history_by_session(session_token):
+    """Historique complet d'une session du tuteur (reprise sur un autre worker)"""
+    doc = await db["histories"].find_one({"session_token": session_token})
+    if doc:
+        doc["_id"] = str(doc["_id"])
+    return doc
+
+
+async def get_session_revision(session_token):
+    """Révision courante de l'historique d'une session (None s'il n'existe pas)"""
+    doc = await db["histories"].find_one({"session_token": session_token}, {"revision": 1})
+    if not doc:
+        return None
+    return doc.get("revision", 0)
+
+
+# =====================================================
+# UTILISATEURS
+# =====================================================
+
+async def get_user_by_email(email: str):
+    """Récupérer un utilisateur par email"""
+    try:
+        return await db["users"].find_one({"email": email})
+    except Exception as e:
+        print(f"[MongoDB] ✗ Erreur get_user: {e}")
+        return None
+
+
+async def get_user_by_id(user_id: str):
+    """Récupérer un utilisateur par son ID (sans le hash du mot de passe)"""
+    return await db["users"].find_one({"_id": ObjectId(user_id)}, USER_PROJECTION)
+
+
+async def create_user(user_data: dict):
+    """Créer un utilisateur et retourner son ID"""
+    result = await db["users"].insert_one(user_data)
+    return result.inserted_id
+
+
+# =====================================================
+# ARTICLES
+# =====================================================
+
+async def insert_article(article_data: dict):
+    # Marqueur `search_pending` : l'article reste à indexer tant qu'article_search ne l'a pas retiré
+    result = await db["articles"].insert_one({**article_data, "search_pending": ObjectId()})
+    return result.inserted_id
+
+
+async def find_articles(query: dict, sort, limit: int, skip: int = 0):
+    cursor = db["articles"].find(query, ARTICLE_SUMMARY).sort(sort)
+    if skip:
+        cursor = cursor.skip(skip)
+    return await cursor.limit(limit).to_list()
+
+
+async def find_articles_page(query: dict, limit: int, cursor=None):
+    """Page d'articles après `cursor` (pagination par clé). Retourne (articles, next_cursor)"""
+    if cursor:
+        query = {"$and": [query, keyset_filter("created_at", cursor)]} if query else keyset_filter("created_at", cursor)
+    docs = await db["articles"].find(query, ARTICLE_SUMMARY).sort(ARTICLE_ORDER).limit(limit + 1).to_list()
+    return keyset_page(docs, limit, "created_at")
+
+
+async def text_search_articles(text_filter: dict, limit: int, skip: int = 0):
+    """Recherche plein texte (index texte), triée par pertinence, avec le total"""
+    # Le contenu sert à construire l'extrait surligné, il n'est pas renvoyé
+    projection = {**ARTICLE_SUMMARY, "content": 1, "score": {"$meta": "textScore"}}
+    cursor = (
+        db["articles"]
+        .find(text_filter, projection)
+        .sort([("score", {"$meta": "textScore"}), ("created_at", -1)])
+        .skip(skip)
+        .limit(limit)
+    )
+    articles = await cursor.to_list()
+    total = await db["articles"].count_documents(text_filter)
+    return articles, total
+
+
+async def find_articles_by_ids(article_ids: list):
+    """Résumés des articles demandés, dans l'ordre de `article_ids` (les absents sont ignorés)"""
+    object_ids = [ObjectId(article_id) for article_id in article_ids if ObjectId.is_valid(article_id)]
+    docs = await db["articles"].find({"_id": {"$in": object_ids}}, ARTICLE_SUMMARY).to_list()
+    by_id = {str(doc["_id"]): doc for doc in docs}
+    return [by_id[article_id] for article_id in article_ids if article_id in by_id]
+
+
+async def get_article(article_id: str, fields=None):
+    projection = dict.fromkeys(fields, 1) if fields else ARTICLE_PROJECTION
+    return await db["articles"].find_one({"_id": ObjectId(article_id)}, projection)
+
+
+async def bulk_increment_views(deltas: dict):
+    """Applique les vues accumulées {article_id: delta} en un seul bulk_write"""
+    operations = [
+        UpdateOne({"_id": ObjectId(article_id)}, {"$inc": {"views": delta}})
+        for article_id, delta in deltas.items()
+    ]
+    if operations:
+        await db["articles"].bulk_write(operations, ordered=False)
+
+
+async def get_viewer_sketches(article_ids):
+    """Sketchs des lecteurs uniques stockés : {article_id: (octets ou None, version)}"""
+    cursor = db["articles"].find(
+        {"_id": {"$in": [ObjectId(article_id) for article_id in article_ids]}},
+        {"viewers_hll": 1, "viewers_hll_version": 1}
+    )
+    return {
+        str(doc["_id"]): (doc.get("viewers_hll"), doc.get("viewers_hll_version", 0))
+        async for doc in cursor
+    }
+
+
+async def bulk_set_viewer_sketches(updates):
+    """
+    Écrit les sketchs fusionnés (article_id, version lue, octets, estimation).
+    Chaque écriture est conditionnée à la version lue (compare-and-swap) ;
+    celles qui échouent sont détectées par la relecture suivante.
+    """
+    operations = [
+        UpdateOne(
+            {"_id": ObjectId(article_id), "viewers_hll_version": version or {"$in": [0, None]}},
+            {
+                "$set": {"viewers_hll": Binary(data), "unique_viewers": estimate},
+                "$inc": {"viewers_hll_version": 1},
+            }
+        )
+        for article_id, version, data, estimate in updates
+    ]
+    if operations:
+        await db["articles"].bulk_write(operations, ordered=False)
+
+
+async def update_article(article_id: str, update_data: dict):
+    """Modifier un article. Retourne sa catégorie et ses tags d'avant la modification (None si absent)"""
+    return await db["articles"].find_one_and_update(
+        {"_id": ObjectId(article_id)},
+        {"$set": {**update_data, "search_pending": ObjectId()}},
+        projection=TAXONOMY_PROJECTION,
+        return_document=ReturnDocument.BEFORE
+    )
+
+
+async def delete_article(article_id: str):
+    """Supprimer un article et ses commentaires. Retourne sa catégorie et ses tags (None si déjà supprimé)"""
+    deleted = await db["articles"].find_one_and_delete({"_id": ObjectId(article_id)}, projection=TAXONOMY_PROJECTION)
+    await db["article_comments"].delete_many({"article_id": article_id})
+    return deleted
+
+
+# =====================================================
+# FLUX TENDANCES (trending.py)
+# =====================================================
+
+async def iter_article_summaries():
+    """Tous les articles, en résumé (pour le calcul des flux)"""
+    async for article in db["articles"].find({}, ARTICLE_SUMMARY):
+        yield article
+
+
+async def load_feeds():
+    """Flux enregistrés : (date de calcul ou None s'ils n'ont jamais été calculés, {clé: articles})"""
+    computed_at = None
+    marker = None
+    feeds = {}
+    async for doc in db["feeds"].find({"kind": {"$in": ["feed", "computed"]}}):
+        if doc["kind"] == "computed":
+            marker = doc["computed_at"]
+            continue
+        feeds[doc["_id"]] = doc["articles"]
+        computed_at = doc["computed_at"] if computed_at is None else min(computed_at, doc["computed_at"])
+    # Date du dernier calcul, même sans aucun flux (aucun article engagé)
+    return marker or computed_at, feeds
+
+
+async def save_feeds(feeds: dict, computed_at):
+    """Remplace les flux enregistrés (et supprime ceux qui n'existent plus), puis la date du calcul"""
+    operations = [
+        ReplaceOne(
+            {"_id": key},
+            {"kind": "feed", "articles": articles, "computed_at": computed_at},
+            upsert=True
+        )
+        for key, articles in feeds.items()
+    ]
+    operations.append(DeleteMany({"kind": "feed", "_id": {"$nin": list(feeds)}}))
+    operations.append(ReplaceOne({"_id": "computed"}, {"kind": "computed", "computed_at": computed_at}, upsert=True))
+    await db["feeds"].bulk_write(operations, ordered=True)
+
+
+async def acquire_feeds_lease(owner: str, ttl_seconds: float) -> bool:
+    """Bail exclusif du calcul des flux entre workers (True si obtenu)"""
+    now = datetime.utcnow()
+    try:
+        await db["feeds"].find_one_and_update(
+            {"_id": "lease", "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"kind": "lease", "owner": owner, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Bail détenu et valide : l'upsert entre en collision avec le document existant
+        return False
+
+
+# =====================================================
+# TAXONOMIE (compteurs de catégories et de tags)
+# =====================================================
+
+def taxonomy_id(kind: str, name: str) -> str:
+    return f"{kind}:{name}"
+
+
+async def apply_taxonomy_deltas(deltas: dict):
+    """Applique {(kind, nom): delta} puis supprime les entrées retombées à zéro"""
+    operations = [
+        UpdateOne(
+            {"_id": taxonomy_id(kind, name)},
+            {"$inc": {"count": delta}, "$setOnInsert": {"kind": kind, "name": name}},
+            upsert=True
+        )
+        for (kind, name), delta in deltas.items()
+    ]
+    operations.append(DeleteMany({
+        "_id": {"$in": [taxonomy_id(kind, name) for kind, name in deltas]},
+        "count": {"$lte": 0},
+    }))
+    await db["taxonomy"].bulk_write(operations, ordered=True)
+
+
+async def list_taxonomy():
+    return await db["taxonomy"].find({}, {"kind": 1, "name": 1, "count": 1}).to_list()
+
+
+async def taxonomy_is_empty() -> bool:
+    return await db["taxonomy"].find_one({}, {"_id": 1}) is None
+
+
+async def rebuild_taxonomy() -> int:
+    """Recalcule tous les compteurs depuis les articles. Retourne le nombre d'entrées"""
+    pipelines = {
+        "category": [
+            {"$match": {"category": {"$nin": [None, ""]}}},
+            {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+        ],
+        "tags": [
+            # Un tag répété dans un article ne compte qu'une fois
+            {"$project": {"tags": {"$setUnion": [{"$ifNull": ["$tags", []]}, []]}}},
+            {"$unwind": "$tags"},
+            {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+        ],
+    }
+    entries = []
+    for kind, pipeline in pipelines.items():
+        async for doc in await db["articles"].aggregate(pipeline):
+            entries.append({"_id": taxonomy_id(kind, doc["_id"]), "kind": kind, "name": doc["_id"], "count": doc["count"]})
+
+    if not entries:
+        await db["taxonomy"].delete_many({})
+        return 0
+    # Construite à part puis substituée d'un coup (renameCollection) : deux reconstructions
+    # concurrentes (plusieurs workers au démarrage) ne se marchent pas dessus, et les
+    # lecteurs ne voient jamais une collection à moitié remplie
+    staging = db[f"taxonomy_rebuild_{ObjectId()}"]
+    try:
+        await staging.insert_many(entries)
+        await staging.rename("taxonomy", dropTarget=True)
+    except Exception:
+        await staging.drop()
+        raise
+    return len(entries)
+
+
+# =====================================================
+# LIKES
+# =====================================================
+
+async def toggle_like(article_id: str, user_id: str) -> bool:
+    """
+    Bascule le like (article, utilisateur) et retourne le nouvel état.
+    Un like est un document (unique sur article_id + user_id), supprimé à l'unlike :
+    pas de documents « liked: false » qui s'accumulent. Les anciens documents
+    « liked: false » sont repris par le like suivant. Deux clics simultanés se
+    rencontrent sur l'index unique : celui qui perd rebascule (unlike).
+    """
+    query = {"article_id": article_id, "user_id": user_id}
+    while True:
+        result = await db["article_likes"].delete_one({**query, "liked": {"$ne": False}})
+        if result.deleted_count:
+            return False
+        try:
+            await db["article_likes"].update_one(
+                {**query, "liked": False},
+                {"$set": {"liked": True, "updated_at": datetime.utcnow()}, "$setOnInsert": {"created_at": datetime.utcnow()}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # Liké entre-temps par une requête concurrente : on le retire
+            continue
+
+
+async def delete_like(article_id: str, user_id: str):
+    await db["article_likes"].delete_one({"article_id": article_id, "user_id": user_id})
+
+
+async def liked_article_ids(user_id: str, article_ids: list) -> set:
+    """Parmi `article_ids`, ceux que l'utilisateur like (une seule requête)"""
+    cursor = db["article_likes"].find(
+        {"article_id": {"$in": article_ids}, "user_id": user_id, "liked": {"$ne": False}},
+        {"article_id": 1, "_id": 0}
+    )
+    return {doc["article_id"] async for doc in cursor}
+
+
+async def increment_article_likes(article_id: str, delta: int) -> bool:
+    """Retourne False si l'article n'existe pas"""
+    result = await db["articles"].update_one({"_id": ObjectId(article_id)}, {"$inc": {"likes": delta}})
+    return result.matched_count > 0
+
+
+# =====================================================
+# COMMENTAIRES
+# =====================================================
+
+async def increment_comment_count(article_id: str, delta: int) -> bool:
+    """Retourne False si l'article n'existe pas"""
+    result = await db["articles"].update_one({"_id": ObjectId(article_id)}, {"$inc": {"comment_count": delta}})
+    return result.matched_count > 0
+
+
+async def insert_comment(comment_data: dict):
+    result = await db["article_comments"].insert_one(comment_data)
+    return result.inserted_id
+
+
+async def find_comments(article_id: str, limit: int, skip: int = 0):
+    cursor = db["article_comments"].find({"article_id": article_id}).sort(COMMENT_ORDER)
+    if skip:
+        cursor = cursor.skip(skip)
+    return await cursor.limit(limit).to_list()
+
+
+async def find_comments_page(article_id: str, limit: int, cursor=None):
+    """Page de commentaires après `cursor` (pagination par clé). Retourne (commentaires, next_cursor)"""
+    query = {"article_id": article_id}
+    if cursor:
+        query.update(keyset_filter("created_at", cursor, direction=1))
+    docs = await db["article_comments"].find(query).sort(COMMENT_ORDER).limit(limit + 1).to_list()
+    return keyset_page(docs, limit, "created_at")
@@ -0,0 +1,61 @@
+import os
+import time
+from collections import OrderedDict
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_PRINCIPAL_TTL = float(os.getenv("AUTH_PRINCIPAL_TTL", "60"))
+
+
+class TTLCache:
+    """LRU bornée dont chaque entrée expire à une date donnée (time.time())."""
+
+    def __init__(self, max_size=AUTH_CACHE_SIZE, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # clé -> (valeur, expiration)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value, expires_at=None):
+        if expires_at is None:
+            expires_at = time.time() + self.ttl
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Payloads des JWT déjà vérifiés (clé : le token), valables jusqu'à leur `exp`
+token_cache = TTLCache()
+# Utilisateurs authentifiés (clé : `sub` du token), relus après AUTH_PRINCIPAL_TTL secondes.
+# Pas d'éviction à la modification : un changement d'utilisateur (suppression comprise)
+# est vu au plus tard AUTH_PRINCIPAL_TTL secondes après, sur chaque worker
+principal_cache = TTLCache(ttl=AUTH_PRINCIPAL_TTL)
+
+
+def stats():
+    return {"tokens": token_cache.stats(), "principals": principal_cache.stats()}
@@ -0,0 +1,212 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+EMBEDDING_DIM = 768
+
+
+def normalize_query(text):
+    """Queries differing only by case or whitespace share the same embedding."""
+    return " ".join(text.lower().split())
+
+
+class _FileLock:
+    """Exclusive lock on a file, held between processes (flock, or msvcrt on Windows)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file.close()
+        self.file = None
+
+
+class DiskEmbeddingStore:
+    """
+    Append-only on-disk store: a float32 matrix (`vectors.f32`, read through a
+    memory map) plus a key index (`keys.jsonl`, one key per row).
+
+    Several processes (uvicorn workers) may share a directory: appends and the
+    startup repair run under a lock file, and each process picks up the rows
+    appended by the others before writing, or when a key is not known yet.
+    A vector is always written before its key, so a complete key line always
+    has its row.
+    """
+
+    def __init__(self, directory, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.row_bytes = 4 * dim
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.keys_path = os.path.join(directory, "keys.jsonl")
+        self.lock = _FileLock(os.path.join(directory, "store.lock"))
+        self.rows = {}
+        self.n_rows = 0
+        self.keys_offset = 0  # bytes of keys.jsonl already read
+        self._matrix = None
+
+        with self.lock:
+            self._repair()
+            self._sync()
+
+    def _repair(self):
+        """Drop what a crash in the middle of an append left behind (caller holds the lock)."""
+        for path in (self.vectors_path, self.keys_path):
+            open(path, "ab").close()
+        with open(self.keys_path, "r+b") as f:
+            data = f.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                f.truncate(complete)
+            n_keys = data.count(b"\n", 0, complete)
+        # Orphan vector (crash before its key was written) or torn row
+        if os.path.getsize(self.vectors_path) != n_keys * self.row_bytes:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(min(os.path.getsize(self.vectors_path), n_keys * self.row_bytes))
+
+    def _sync(self):
+        """Read the keys appended since the last call, by this process or another one."""
+        if os.path.getsize(self.keys_path) <= self.keys_offset:
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(self.keys_offset)
+            data = f.read()
+        # A line still being written by another process is read next time
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            self.rows.setdefault(json.loads(line), self.n_rows)
+            self.n_rows += 1
+        self.keys_offset += complete
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, key):
+        row = self.rows.get(key)
+        if row is None:
+            self._sync()
+            row = self.rows.get(key)
+            if row is None:
+                return None
+        if self._matrix is None or row >= self._matrix.shape[0]:
+            # Remap to see the rows appended since the last mapping
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.n_rows, self.dim))
+        return np.array(self._matrix[row])
+
+    def put(self, key, vector):
+        if key in self.rows:
+            return
+        with self.lock:
+            self._sync()
+            if key in self.rows:
+                return
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.asarray(vector, dtype=np.float32).reshape(self.dim).tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write((json.dumps(key) + "\n").encode("utf-8"))
+            self._sync()
+
+
+class EmbeddingCache:
+    """Size-bounded in-memory LRU in front of an optional DiskEmbeddingStore."""
+
+    def __init__(self, max_size=EMBEDDING_CACHE_SIZE, disk_dir=EMBEDDING_CACHE_DIR, dim=EMBEDDING_DIM):
+        self.max_size = max_size
+        self.memory = OrderedDict()
+        self.disk = DiskEmbeddingStore(disk_dir, dim) if disk_dir else None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return vector
+            if self.disk is not None:
+                vector = self.disk.get(key)
+                if vector is not None:
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, key, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self.lock:
+            self._remember(key, vector)
+            if self.disk is not None:
+                try:
+                    self.disk.put(key, vector)
+                except OSError as e:
+                    print(f"[Embedding Cache] Disk write failed: {e}")
+
+    def encode(self, texts, encoder):
+        """
+        Return one embedding per text (np.ndarray of shape (len(texts), dim)).
+        Only the normalized texts missing from the cache are passed to `encoder`, in one batch.
+        """
+        keys = [normalize_query(text) for text in texts]
+        found = {}
+        for key in dict.fromkeys(keys):
+            vector = self.get(key)
+            if vector is not None:
+                found[key] = vector
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            for key, vector in zip(missing, encoder(missing)):
+                self.put(key, vector)
+                found[key] = np.asarray(vector, dtype=np.float32)
+
+        return np.stack([found[key] for key in keys])
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+            "memory_size": len(self.memory),
+            "disk_size": len(self.disk) if self.disk is not None else None,
+        }
+
+
+query_cache = EmbeddingCache()
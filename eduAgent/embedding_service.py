@@ -0,0 +1,220 @@
+"""
+Embedding service: one local process owns the SentenceTransformer model and
+serves encode requests from every uvicorn worker over a local socket.
+
+Concurrent requests are gathered into micro-batches (EMBEDDING_BATCH_SIZE texts
+at most, waiting EMBEDDING_BATCH_WAIT_MS at most for the batch to fill up).
+
+Run it with `python embedding_service.py`, then start the API with
+EMBEDDING_SERVICE_ADDRESS pointing to the same address. Both sides need the same
+EMBEDDING_SERVICE_AUTHKEY; the service refuses to start without it, and only
+listens on a loopback address or a local socket.
+"""
+import ipaddress
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_SERVICE_ADDRESS = os.getenv("EMBEDDING_SERVICE_ADDRESS")
+# Required shared secret: received messages are unpickled, so only an authenticated peer may talk to the service
+EMBEDDING_SERVICE_AUTHKEY = os.getenv("EMBEDDING_SERVICE_AUTHKEY")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+EMBEDDING_MODEL_NAME = "all-mpnet-base-v2"
+
+
+def parse_address(address):
+    """`host:port` -> TCP socket, anything else -> Unix socket / Windows named pipe path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return (host or "localhost", int(port))
+    return address
+
+
+def require_authkey():
+    if not EMBEDDING_SERVICE_AUTHKEY:
+        raise RuntimeError("EMBEDDING_SERVICE_AUTHKEY must be set to use the embedding service")
+    return EMBEDDING_SERVICE_AUTHKEY.encode("utf-8")
+
+
+def is_loopback(address):
+    """True for a Unix socket / named pipe, or a TCP address that only accepts local connections."""
+    if not isinstance(address, tuple):
+        return True
+    host = address[0].strip("[]")
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+# =====================================================
+# SERVER
+# =====================================================
+
+class _EncodeRequest:
+    def __init__(self, texts):
+        self.texts = texts
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class EmbeddingServer:
+    def __init__(self, encode, max_batch_size=EMBEDDING_BATCH_SIZE, max_wait_ms=EMBEDDING_BATCH_WAIT_MS):
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else None,
+            "queued_requests": self.requests.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    def _next_batch(self):
+        batch = [self.requests.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def batch_loop(self):
+        while True:
+            batch = self._next_batch()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = np.asarray(self.encode(texts), dtype=np.float32)
+                offset = 0
+                for request in batch:
+                    request.result = vectors[offset:offset + len(request.texts)]
+                    offset += len(request.texts)
+            except Exception as e:
+                print(f"[Embedding Service] Encode failed: {e}")
+                for request in batch:
+                    request.error = str(e)
+            self.batches += 1
+            self.texts += len(texts)
+            for request in batch:
+                request.done.set()
+
+    def handle_connection(self, conn):
+        try:
+            while True:
+                message = conn.recv()
+                if message.get("op") == "stats":
+                    conn.send(("ok", self.stats()))
+                    continue
+                request = _EncodeRequest(list(message["texts"]))
+                if request.texts:
+                    self.requests.put(request)
+                    request.done.wait()
+                else:
+                    request.result = np.zeros((0, 0), dtype=np.float32)
+                if request.error is not None:
+                    conn.send(("error", request.error))
+                else:
+                    conn.send(("ok", request.result))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def serve_forever(self, address):
+        authkey = require_authkey()
+        listen_address = parse_address(address)
+        if not is_loopback(listen_address):
+            raise RuntimeError(f"Refusing to listen on {address}: the embedding service only binds to loopback or a local socket")
+        threading.Thread(target=self.batch_loop, name="embedding-batcher", daemon=True).start()
+        with Listener(listen_address, authkey=authkey) as listener:
+            print(f"[Embedding Service] Listening on {address} "
+                  f"(batch <= {self.max_batch_size}, wait <= {self.max_wait * 1000:.1f} ms)")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"[Embedding Service] Connection refused: {e}")
+                    continue
+                threading.Thread(target=self.handle_connection, args=(conn,), daemon=True).start()
+
+
+# =====================================================
+# CLIENT
+# =====================================================
+
+class EmbeddingServiceClient:
+    """One connection per calling thread, so concurrent encodes of a worker can be batched together."""
+
+    def __init__(self, address=EMBEDDING_SERVICE_ADDRESS):
+        self.address = parse_address(address)
+        self.authkey = require_authkey()
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self.local.conn = conn
+        return conn
+
+    def _call(self, message):
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(message)
+                status, payload = conn.recv()
+                break
+            except (EOFError, OSError):
+                # The service restarted: reconnect once
+                self.local.conn = None
+                if attempt:
+                    raise
+        if status != "ok":
+            raise RuntimeError(f"Embedding service error: {payload}")
+        return payload
+
+    def encode(self, texts):
+        return self._call({"op": "encode", "texts": list(texts)})
+
+    def stats(self):
+        return self._call({"op": "stats"})
+
+
+def serve():
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+    def encode(texts):
+        return model.encode(texts, batch_size=EMBEDDING_BATCH_SIZE)
+
+    EmbeddingServer(encode).serve_forever(EMBEDDING_SERVICE_ADDRESS or "localhost:6100")
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,201 @@
+import atexit
+import os
+import threading
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+# Délai avant de réessayer un bulk_write en échec
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5"))
+# Attente maximale d'un tour pour que ses messages soient écrits
+HISTORY_WRITE_TIMEOUT = float(os.getenv("HISTORY_WRITE_TIMEOUT", "10"))
+# Réapplications successives d'un ajout refusé (historique avancé par un autre worker) avant une pause
+HISTORY_CONFLICT_RETRIES = 5
+
+
+class HistoryDeleted(Exception):
+    """L'historique n'existe plus : les messages en attente ne peuvent pas être ajoutés."""
+
+
+class HistoryWriteBehind:
+    """
+    File d'écriture groupée des historiques : les nouveaux messages de chaque
+    historique sont ajoutés ($push) par un thread dédié, en un seul bulk_write
+    pour tous les historiques en attente (les ajouts arrivés pendant une
+    écriture partent ensemble à la suivante). Les ajouts d'un même historique
+    sont écrits dans l'ordre, un par bulk_write.
+
+    Chaque ajout porte la révision de l'historique qu'il prolonge et n'est
+    appliqué que si le document en est toujours là. Sinon (un autre worker a
+    écrit entre-temps), il est réappliqué à la suite, sur la révision courante :
+    les messages d'un tour restent contigus et ne sont jamais dupliqués (un
+    identifiant d'écriture rend le rejeu idempotent). `append` retourne un
+    Future résolu une fois l'ajout écrit, avec (révision, rebasé).
+    """
+
+    def __init__(self, flush_interval=HISTORY_FLUSH_INTERVAL, conflict_retries=HISTORY_CONFLICT_RETRIES):
+        self.flush_interval = flush_interval
+        self.conflict_retries = conflict_retries
+        self.pending = OrderedDict()  # history_id -> deque d'ajouts, dans l'ordre
+        self.cond = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.retry_delay = 0.0
+        self.thread = None
+        self.running = False
+        self.flushes = 0
+        self.written_updates = 0
+        self.written_messages = 0
+        self.conflicts = 0
+        self.failures = 0
+
+    def append(self, history_id, messages, fields, revision, revisions=1):
+        """
+        Ajoute `messages` à l'historique, qui doit être à `revision` (révision
+        connue par l'appelant, ajouts encore en attente compris).
+        """
+        future = Future()
+        entry = {
+            "messages": list(messages), "fields": dict(fields), "base": revision, "revisions": revisions,
+            "write_id": uuid.uuid4().hex, "rebased": False, "attempts": 0, "future": future,
+        }
+        with self.cond:
+            self.pending.setdefault(history_id, deque()).append(entry)
+            self.cond.notify()
+        return future
+
+    def _take(self, history_id=None):
+        """Premier ajout en attente de chaque historique (ou de `history_id`)."""
+        with self.cond:
+            ids = list(self.pending) if history_id is None else [history_id] if history_id in self.pending else []
+            batch = OrderedDict()
+            for hid in ids:
+                queue = self.pending[hid]
+                batch[hid] = queue.popleft()
+                if not queue:
+                    del self.pending[hid]
+            return batch
+
+    def _requeue(self, batch):
+        # Les ajouts à refaire repassent devant ceux arrivés entre-temps
+        with self.cond:
+            for history_id, entry in reversed(batch.items()):
+                self.pending.setdefault(history_id, deque()).appendleft(entry)
+                self.pending.move_to_end(history_id, last=False)
+
+    def _written(self, entry, revision, rebased):
+        self.written_updates += 1
+        self.written_messages += len(entry["messages"])
+        entry["future"].set_result((revision, rebased))
+
+    def _resolve(self, batch, unmatched):
+        """
+        Répartit le lot après écriture ; retourne les ajouts refusés, à réappliquer.
+        L'état des historiques `unmatched` est relu : ajout déjà présent (write_id
+        connu), historique avancé ailleurs (à réappliquer) ou supprimé.
+        """
+        from mongo import get_history_write_states
+
+        states = get_history_write_states(list(unmatched)) if unmatched else {}
+        retry = OrderedDict()
+        for history_id, entry in batch.items():
+            if history_id not in unmatched:
+                self._written(entry, entry["base"] + entry["revisions"], entry["rebased"])
+            elif history_id not in states:
+                entry["future"].set_exception(HistoryDeleted(history_id))
+            else:
+                revision, writes = states[history_id]
+                if entry["write_id"] in writes:
+                    # Appliqué (par ce lot, ou par une tentative dont la réponse a été perdue)
+                    applied = entry["base"] + entry["revisions"]
+                    self._written(entry, revision, entry["rebased"] or revision != applied)
+                else:
+                    self.conflicts += 1
+                    entry["base"] = revision
+                    entry["rebased"] = True
+                    entry["attempts"] += 1
+                    retry[history_id] = entry
+        return retry
+
+    def flush(self, history_id=None):
+        """Écrit maintenant ce qui est en attente (pour un historique ou pour tous). Retourne le nombre d'ajouts écrits."""
+        from mongo import bulk_append_histories
+
+        with self.flush_lock:
+            written = self.written_updates
+            while True:
+                batch = self._take(history_id)
+                if not batch:
+                    break
+                try:
+                    unmatched, failed = bulk_append_histories([
+                        (hid, entry["messages"], entry["fields"], entry["base"], entry["revisions"], entry["write_id"])
+                        for hid, entry in batch.items()
+                    ])
+                    retry = self._resolve(
+                        OrderedDict((hid, entry) for hid, entry in batch.items() if hid not in failed),
+                        unmatched,
+                    )
+                except Exception as e:
+                    # Ajouts peut-être appliqués : l'identifiant d'écriture rend leur rejeu sans effet
+                    self.failures += 1
+                    print(f"[History] Write-behind flush failed, will retry: {e}")
+                    self._requeue(batch)
+                    self.retry_delay = self.flush_interval
+                    break
+                self.flushes += 1
+                retry.update((hid, batch[hid]) for hid in batch if hid in failed)
+                self._requeue(retry)
+                if failed:
+                    self.failures += 1
+                    print(f"[History] {len(failed)} history appends failed, will retry")
+                if failed or any(entry["attempts"] > self.conflict_retries for entry in retry.values()):
+                    # Erreur d'écriture ou contention persistante : nouvel essai plus tard
+                    self.retry_delay = self.flush_interval
+                    break
+                self.retry_delay = 0.0
+            return self.written_updates - written
+
+    def _run(self):
+        while self.running:
+            with self.cond:
+                if self.retry_delay or not self.pending:
+                    self.cond.wait(timeout=self.retry_delay or self.flush_interval)
+            self.flush()
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="history-write-behind", daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Arrête le thread et écrit tout ce qui reste (shutdown)."""
+        if self.thread is not None:
+            self.running = False
+            with self.cond:
+                self.cond.notify()
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def stats(self):
+        with self.cond:
+            depth = sum(len(queue) for queue in self.pending.values())
+            messages = sum(len(entry["messages"]) for queue in self.pending.values() for entry in queue)
+        return {
+            "queue_depth": depth,
+            "pending_messages": messages,
+            "flushes": self.flushes,
+            "written_updates": self.written_updates,
+            "written_messages": self.written_messages,
+            "conflicts": self.conflicts,
+            "failures": self.failures,
+        }
+
+
+history_writer = HistoryWriteBehind()
@@ -1,6 +1,78 @@
 import os
+import re
 import google.generativeai as genai
-from search import find_best_image
+from search import find_best_images
+from utils.executors import run_blocking
+
+# Regex to find <<IMAGE: query>>
+IMAGE_MARKER_PATTERN = re.compile(r"<<IMAGE: (.*?)>>")
+IMAGE_MARKER_PREFIX = "<<IMAGE:"
+
+# Appended to the teaching prompt in streaming mode, so the markers come with the
+# explanation itself instead of requiring a second generation pass.
+STREAM_MARKER_INSTRUCTIONS = (
+    "While explaining, insert a visual aid marker in the format `<<IMAGE: search_query>>` "
+    "immediately after each sentence introducing a concept, physical object or system that "
+    "would benefit from a diagram or image. The `search_query` should be specific to that concept "
+    "(e.g., 'Transformer architecture', 'Neural network weights'). Do not use markdown code fences."
+)
+
+
+class MarkerStreamParser:
+    """
+    Incrementally splits streamed text into text pieces and image queries.
+
+    Text is released as soon as it cannot be part of a `<<IMAGE: ...>>` marker,
+    so the client gets it while the model is still generating.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, chunk):
+        """Consume a chunk and return the list of ("text", str) / ("image", query) events it completes."""
+        self.buffer += chunk
+        events = []
+        while self.buffer:
+            start = self.buffer.find("<<")
+            if start == -1:
+                # Keep a trailing "<" in case it opens a marker in the next chunk
+                keep = 1 if self.buffer.endswith("<") else 0
+                text, self.buffer = self.buffer[:len(self.buffer) - keep], self.buffer[len(self.buffer) - keep:]
+                if text:
+                    events.append(("text", text))
+                break
+
+            if start > 0:
+                events.append(("text", self.buffer[:start]))
+                self.buffer = self.buffer[start:]
+
+            candidate = self.buffer[:len(IMAGE_MARKER_PREFIX)]
+            if not IMAGE_MARKER_PREFIX.startswith(candidate):
+                # "<<" that is not a marker: release it as text
+                events.append(("text", self.buffer[:2]))
+                self.buffer = self.buffer[2:]
+                continue
+
+            end = self.buffer.find(">>")
+            if len(candidate) < len(IMAGE_MARKER_PREFIX) or end == -1:
+                # Incomplete marker, wait for more text
+                break
+
+            match = IMAGE_MARKER_PATTERN.match(self.buffer)
+            if match:
+                events.append(("image", match.group(1).strip()))
+                self.buffer = self.buffer[match.end():]
+            else:
+                events.append(("text", self.buffer[:end + 2]))
+                self.buffer = self.buffer[end + 2:]
+        return events
+
+    def close(self):
+        """Flush whatever is left once the stream is over."""
+        rest, self.buffer = self.buffer, ""
+        return [("text", rest)] if rest else []
+
 
 class ImageAgent:
     def __init__(self):
@@ -8,12 +80,12 @@ class ImageAgent:
         if not api_key:
             print("Error: GOOGLE_API_KEY not found in .env file.")
             return
-            
+
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel('gemini-2.0-flash')
 
-    def process_explanation(self, explanation):
-        prompt = (
+    def build_prompt(self, explanation):
+        return (
             f"Here is an explanation text: \"{explanation}\"\n"
             "Your task is to enhance this explanation by inserting visual aid markers where appropriate.\n"
             "Identify ALL distinct concepts, physical objects, or systems mentioned that would benefit from a visual diagram or image.\n"
@@ -26,53 +98,85 @@ class ImageAgent:
             "Do not remove or alter any part of the original text. Just insert the markers.\n"
             "If no images are needed, return the text exactly as is."
         )
-        
+
+    @staticmethod
+    def clean_markdown(text):
+        modified_text = text.strip()
+
+        # Clean up markdown if present
+        if modified_text.startswith("```"):
+            lines = modified_text.split('\n')
+            if lines[0].startswith("```"):
+                lines = lines[1:]
+            if lines and lines[-1].startswith("```"):
+                lines = lines[:-1]
+            modified_text = "\n".join(lines)
+        return modified_text
+
+    @staticmethod
+    def split_segments(modified_text):
+        """Parse the modified text into text segments and image queries (result not resolved yet)."""
+        segments = []
+        last_pos = 0
+
+        for match in IMAGE_MARKER_PATTERN.finditer(modified_text):
+            # Text before the marker
+            if match.start() > last_pos:
+                segments.append({"type": "text", "content": modified_text[last_pos:match.start()]})
+
+            # The image query
+            segments.append({
+                "type": "image",
+                "query": match.group(1).strip(),
+                "result": None
+            })
+
+            last_pos = match.end()
+
+        # Remaining text
+        if last_pos < len(modified_text):
+            segments.append({"type": "text", "content": modified_text[last_pos:]})
+
+        return segments
+
+    @staticmethod
+    def image_segments(segments):
+        image_segments = [segment for segment in segments if segment["type"] == "image"]
+        if image_segments:
+            queries = list(dict.fromkeys(segment["query"] for segment in image_segments))
+            print(f"[Image Agent] Searching for {len(queries)} image(s): {', '.join(queries)}")
+        return image_segments
+
+    @staticmethod
+    def attach_results(segments, image_segments, results):
+        for segment, result in zip(image_segments, results):
+            segment["result"] = result
+        return segments
+
+    def process_explanation(self, explanation):
         try:
-            response = self.model.generate_content(prompt)
-            modified_text = response.text.strip()
-            
-            # Clean up markdown if present
-            if modified_text.startswith("```"):
-                lines = modified_text.split('\n')
-                if lines[0].startswith("```"):
-                    lines = lines[1:]
-                if lines and lines[-1].startswith("```"):
-                    lines = lines[:-1]
-                modified_text = "\n".join(lines)
-
-            # Parse the modified text into segments
-            import re
-            segments = []
-            last_pos = 0
-            # Regex to find <<IMAGE: query>>
-            pattern = re.compile(r"<<IMAGE: (.*?)>>")
-            
-            for match in pattern.finditer(modified_text):
-                # Text before the marker
-                if match.start() > last_pos:
-                    segments.append({"type": "text", "content": modified_text[last_pos:match.start()]})
-                
-                # The image query
-                query = match.group(1).strip()
-                
-                # Perform search immediately
-                print(f"[Image Agent] Searching for: {query}")
-                img_result = find_best_image(query)
-                
-                segments.append({
-                    "type": "image", 
-                    "query": query,
-                    "result": img_result
-                })
-                
-                last_pos = match.end()
-            
-            # Remaining text
-            if last_pos < len(modified_text):
-                segments.append({"type": "text", "content": modified_text[last_pos:]})
-                
-            return segments
-            
+            response = self.model.generate_content(self.build_prompt(explanation))
+            segments = self.split_segments(self.clean_markdown(response.text))
+
+            image_segments = self.image_segments(segments)
+            results = find_best_images([segment["query"] for segment in image_segments])
+            return self.attach_results(segments, image_segments, results)
+
+        except Exception as e:
+            print(f"Image Agent Error: {e}")
+            # Fallback: return the original text as one segment
+            return [{"type": "text", "content": explanation}]
+
+    async def process_explanation_async(self, explanation):
+        """Same as process_explanation, without blocking the event loop (used by the API)."""
+        try:
+            response = await self.model.generate_content_async(self.build_prompt(explanation))
+            segments = self.split_segments(self.clean_markdown(response.text))
+
+            image_segments = self.image_segments(segments)
+            results = await run_blocking(find_best_images, [segment["query"] for segment in image_segments])
+            return self.attach_results(segments, image_segments, results)
+
         except Exception as e:
             print(f"Image Agent Error: {e}")
             # Fallback: return the original text as one segment
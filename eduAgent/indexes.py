@@ -0,0 +1,135 @@
+"""
+Index manager: declares the indexes every query of the API relies on and builds
+them idempotently (at API startup, or with `python indexes.py`).
+
+`python indexes.py --check` explains the representative queries and reports the
+ones that would still scan a whole collection.
+"""
+import argparse
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from utils.pagination import keyset_filter
+
+# =====================================================
+# DÉCLARATIONS
+# =====================================================
+
+INDEXES = {
+    "articles": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_desc"),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="category_created_at"),
+        IndexModel([("tags", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="tags_created_at"),
+        # Articles à réindexer pour la recherche sémantique (balayage d'article_search)
+        IndexModel([("search_pending", ASCENDING)], name="search_pending", sparse=True),
+        IndexModel(
+            [("title", TEXT), ("tags", TEXT), ("content", TEXT)],
+            name="articles_text",
+            weights={"title": 10, "tags": 5, "content": 1},
+            # Articles en plusieurs langues : pas de racinisation ni de mots vides
+            default_language="none",
+        ),
+    ],
+    "article_likes": [
+        IndexModel([("article_id", ASCENDING), ("user_id", ASCENDING)], name="article_user_unique", unique=True),
+    ],
+    "article_comments": [
+        IndexModel([("article_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="article_created_at"),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "histories": [
+        IndexModel([("updated_at", DESCENDING), ("_id", DESCENDING)], name="updated_at_desc"),
+        # Reprise d'une session du tuteur (les historiques du CLI n'ont pas de jeton)
+        IndexModel(
+            [("session_token", ASCENDING)],
+            name="session_token_unique",
+            unique=True,
+            partialFilterExpression={"session_token": {"$type": "string"}},
+        ),
+    ],
+}
+
+# Requêtes représentatives des routes (collection, filtre, tri)
+QUERIES = [
+    ("list_articles", "articles", {}, [("created_at", -1), ("_id", -1)]),
+    ("list_articles?category", "articles", {"category": "general"}, [("created_at", -1), ("_id", -1)]),
+    ("list_articles?tag", "articles", {"tags": "python"}, [("created_at", -1), ("_id", -1)]),
+    ("list_articles?cursor", "articles", keyset_filter("created_at", (datetime(2024, 1, 1), ObjectId("0" * 24))), [("created_at", -1), ("_id", -1)]),
+    ("search_articles", "articles", {"$text": {"$search": "python"}}, None),
+    ("article_search_sweep", "articles", {"search_pending": {"$lt": ObjectId("0" * 24)}}, None),
+    ("like_article", "article_likes", {"article_id": "0" * 24, "user_id": "0" * 24}, None),
+    ("like_states", "article_likes", {"article_id": {"$in": ["0" * 24, "1" * 24]}, "user_id": "0" * 24, "liked": {"$ne": False}}, None),
+    ("list_comments", "article_comments", {"article_id": "0" * 24}, [("created_at", 1), ("_id", 1)]),
+    ("get_user_by_email", "users", {"email": "someone@example.com"}, None),
+    ("list_histories", "histories", {}, [("updated_at", -1), ("_id", -1)]),
+    ("resume_session", "histories", {"session_token": "x" * 43}, None),
+    ("list_histories?cursor", "histories", keyset_filter("updated_at", (datetime(2024, 1, 1), ObjectId("0" * 24))), [("updated_at", -1), ("_id", -1)]),
+]
+
+
+def ensure_indexes(database=None):
+    """Crée les index manquants (sans effet sur ceux qui existent déjà)."""
+    if database is None:
+        from mongo import db as database
+
+    created = []
+    for collection, models in INDEXES.items():
+        for model in models:
+            try:
+                created.extend(database[collection].create_indexes([model]))
+            except OperationFailure as e:
+                # Ex. doublons existants pour un index unique, ou index homonyme différent
+                print(f"[Indexes] ✗ {collection}.{model.document['name']}: {e}")
+    print(f"[Indexes] ✓ {len(created)} index vérifiés")
+    return created
+
+
+def _stages(plan):
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from _stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+    if "queryPlan" in plan:
+        yield from _stages(plan["queryPlan"])
+
+
+def check_indexes(database=None):
+    """Retourne les requêtes représentatives dont le plan gagnant contient un COLLSCAN."""
+    if database is None:
+        from mongo import db as database
+
+    scans = []
+    for name, collection, query, sort in QUERIES:
+        command = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = dict(sort)
+        explain = database.command({"explain": command, "verbosity": "queryPlanner"})
+        winning = explain["queryPlanner"]["winningPlan"]
+        stages = [stage for stage in _stages(winning) if stage]
+        if "COLLSCAN" in stages:
+            scans.append(name)
+            print(f"[Indexes] ✗ {name}: COLLSCAN ({' <- '.join(stages)})")
+        else:
+            print(f"[Indexes] ✓ {name}: {' <- '.join(stages)}")
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or check the MongoDB indexes.")
+    parser.add_argument("--check", action="store_true", help="Only report queries that would scan a collection")
+    args = parser.parse_args()
+
+    if args.check:
+        scans = check_indexes()
+        raise SystemExit(1 if scans else 0)
+    ensure_indexes()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Bulk ingestion of an image catalog into Qdrant.
+
+Records come from a directory (description from a `<image>.txt` sidecar file,
+otherwise from the file name) or from a JSONL / CSV manifest with `path` and
+`description` fields. They are streamed, encoded in large batches (optionally
+across a process pool) and upserted in parallel chunks. Progress is checkpointed
+after every batch, so an interrupted run resumes where it stopped (a source
+edited since the checkpoint is ingested again from the start).
+
+    python ingest_images.py --manifest catalog.jsonl
+    python ingest_images.py --dir images/ --workers 4 --batch-size 512
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+import qdrant_utils
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp"}
+CHECKPOINT_DIR = os.path.join(".cache", "ingest")
+
+
+# =====================================================
+# SOURCES
+# =====================================================
+
+def iter_directory(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            stem, ext = os.path.splitext(name)
+            if ext.lower() not in IMAGE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            sidecar = os.path.join(root, stem + ".txt")
+            if os.path.exists(sidecar):
+                with open(sidecar, "r", encoding="utf-8") as f:
+                    description = f.read().strip()
+            else:
+                description = stem.replace("_", " ").replace("-", " ")
+            yield {"path": path.replace(os.sep, "/"), "description": description}
+
+
+def iter_manifest(manifest):
+    with open(manifest, "r", encoding="utf-8", newline="") as f:
+        if manifest.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            if row.get("path") and row.get("description"):
+                yield {"path": row["path"], "description": row["description"]}
+
+
+def iter_batches(records, size):
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+# =====================================================
+# CHECKPOINT
+# =====================================================
+
+def checkpoint_path(source):
+    name = os.path.basename(os.path.normpath(source)) or "catalog"
+    return os.path.join(CHECKPOINT_DIR, f"{name}.json")
+
+
+def source_fingerprint(source):
+    """
+    Hash of the source as it is now: size and mtime of the manifest, or of every
+    file of the directory. A checkpoint only applies to the source it was written for.
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                digest.update(f"{os.path.relpath(path, source)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    else:
+        stat = os.stat(source)
+        digest.update(f"{stat.st_size}\0{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_checkpoint(path, source, fingerprint):
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("source") != os.path.abspath(source):
+        return 0
+    if state.get("fingerprint") != fingerprint:
+        # Entries added, removed or edited since: the offset no longer points to the same record
+        if state.get("done"):
+            print("[Ingest] Source changed since the checkpoint, starting over")
+        return 0
+    return state.get("done", 0)
+
+
+def save_checkpoint(path, source, done, fingerprint):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "source": os.path.abspath(source),
+            "fingerprint": fingerprint,
+            "done": done,
+            "updated_at": time.time(),
+        }, f)
+    os.replace(tmp, path)
+
+
+# =====================================================
+# ENCODING
+# =====================================================
+
+_worker_model = None
+
+
+def _init_worker():
+    global _worker_model
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(qdrant_utils.EMBEDDING_MODEL_NAME)
+
+
+def _encode_in_worker(texts):
+    return _worker_model.encode(texts, batch_size=64)
+
+
+def encode_batches(batches, workers):
+    """Yield (records, vectors) in order; with workers > 0 the next batches are encoded ahead in a process pool."""
+    if workers <= 0:
+        for batch in batches:
+            yield batch, qdrant_utils.encode([r["description"] for r in batch])
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = []
+        for batch in batches:
+            pending.append((batch, pool.submit(_encode_in_worker, [r["description"] for r in batch])))
+            if len(pending) > workers:
+                records, future = pending.pop(0)
+                yield records, future.result()
+        for records, future in pending:
+            yield records, future.result()
+
+
+# =====================================================
+# INGESTION
+# =====================================================
+
+def ingest(records, source, batch_size=256, upsert_chunk=128, parallel=4, workers=0, checkpoint=None, restart=False):
+    qdrant_utils.setup_qdrant()
+    if not (qdrant_utils.qdrant_available and qdrant_utils.client is not None):
+        raise SystemExit("Qdrant is not available, aborting ingestion.")
+    vector_name = qdrant_utils.collection_vector_name()
+
+    checkpoint = checkpoint or checkpoint_path(source)
+    fingerprint = source_fingerprint(source)
+    done = 0 if restart else load_checkpoint(checkpoint, source, fingerprint)
+    if done:
+        print(f"[Ingest] Resuming after {done} records (checkpoint: {checkpoint})")
+        records = islice(records, done, None)
+
+    def upsert(points):
+        qdrant_utils.client.upsert(collection_name=qdrant_utils.collection_name, points=points, wait=True)
+
+    started = time.monotonic()
+    ingested = 0
+    with ThreadPoolExecutor(max_workers=parallel) as upserters:
+        for batch, vectors in encode_batches(iter_batches(records, batch_size), workers):
+            points = qdrant_utils.build_points(batch, vectors, source="ingest", vector_name=vector_name)
+            chunks = [points[i:i + upsert_chunk] for i in range(0, len(points), upsert_chunk)]
+            # Every chunk of the batch must be stored before the checkpoint moves forward
+            list(upserters.map(upsert, chunks))
+
+            done += len(batch)
+            ingested += len(batch)
+            save_checkpoint(checkpoint, source, done, fingerprint)
+            rate = ingested / max(time.monotonic() - started, 1e-6)
+            print(f"[Ingest] {done} records ingested ({rate:.0f} records/s)")
+
+    print(f"[Ingest] Done: {ingested} records in this run, {done} in total.")
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index a large image catalog into Qdrant.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="Directory of images (descriptions from <image>.txt or file names)")
+    source.add_argument("--manifest", help="JSONL or CSV manifest with path and description fields")
+    parser.add_argument("--batch-size", type=int, default=256, help="Records encoded per batch")
+    parser.add_argument("--upsert-chunk", type=int, default=128, help="Points per Qdrant upsert request")
+    parser.add_argument("--parallel", type=int, default=4, help="Concurrent upsert requests")
+    parser.add_argument("--workers", type=int, default=0, help="Encoding processes (0 = encode in this process)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: .cache/ingest/<source>.json)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from zero")
+    args = parser.parse_args()
+
+    if args.dir:
+        records, source_path = iter_directory(args.dir), args.dir
+    else:
+        records, source_path = iter_manifest(args.manifest), args.manifest
+
+    ingest(
+        records,
+        source_path,
+        batch_size=args.batch_size,
+        upsert_chunk=args.upsert_chunk,
+        parallel=args.parallel,
+        workers=args.workers,
+        checkpoint=args.checkpoint,
+        restart=args.restart,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+One-off migration of comments embedded in articles (`comments` array) to the
+`article_comments` collection.
+
+Each embedded comment keeps its id (comments without a valid id get one derived
+from the article id and their position), so the migration is idempotent:
+rerunning it after an interruption re-inserts nothing. Once an article's
+comments are copied, its `comment_count` is set and the embedded array removed.
+
+    python migrate_comments.py
+    python migrate_comments.py --dry-run
+"""
+import argparse
+import hashlib
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from mongo import db
+
+
+def migrate_article(article):
+    article_id = str(article["_id"])
+    operations = []
+    for index, comment in enumerate(article.get("comments") or []):
+        comment_id = comment.get("_id")
+        if ObjectId.is_valid(comment_id):
+            comment_id = ObjectId(comment_id)
+        else:
+            # Sans id utilisable : id dérivé de sa place dans l'article, le même à chaque exécution
+            comment_id = ObjectId(hashlib.sha1(f"{article_id}:{index}".encode()).digest()[:12])
+        doc = {key: value for key, value in comment.items() if key != "_id"}
+        doc["article_id"] = article_id
+        operations.append(UpdateOne({"_id": comment_id}, {"$setOnInsert": doc}, upsert=True))
+
+    if operations:
+        db["article_comments"].bulk_write(operations, ordered=False)
+    count = db["article_comments"].count_documents({"article_id": article_id})
+    db["articles"].update_one(
+        {"_id": article["_id"]},
+        {"$set": {"comment_count": count}, "$unset": {"comments": ""}}
+    )
+    return len(operations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move embedded article comments to their own collection.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated")
+    args = parser.parse_args()
+
+    articles = db["articles"].find({"comments": {"$exists": True}}, {"comments": 1})
+    migrated_articles = 0
+    migrated_comments = 0
+    for article in articles:
+        if args.dry_run:
+            migrated_comments += len(article.get("comments") or [])
+        else:
+            migrated_comments += migrate_article(article)
+        migrated_articles += 1
+
+    verb = "would migrate" if args.dry_run else "migrated"
+    print(f"[Comments] ✓ {verb} {migrated_comments} comments from {migrated_articles} articles")
+
+    if not args.dry_run:
+        # Articles créés sans commentaire ni compteur
+        result = db["articles"].update_many({"comment_count": {"$exists": False}}, {"$set": {"comment_count": 0}})
+        if result.modified_count:
+            print(f"[Comments] ✓ comment_count initialized on {result.modified_count} articles")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import os
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
 from datetime import datetime
 from dotenv import load_dotenv
@@ -20,48 +21,85 @@ except Exception as e:
 
 db = client["eduagent"]
 
+# Le jeton de session et les identifiants d'écriture ne sortent jamais de la couche de données
+HISTORY_PROJECTION = {"session_token": 0, "writes": 0}
+
 def save_full_history(tutor, status="in_progress"):
     """Créer un nouvel historique dans MongoDB et retourner son ID"""
     try:
-        result = db["histories"].insert_one({
+        doc = {
             "topic": tutor.topic,
             "plan": tutor.plan,
             "history": tutor.history,
             "status": status,
+            "current_part_index": tutor.current_part_index,
+            "state": tutor.state,
+            "revision": 1,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
-        })
+        }
+        # Sessions de l'API : jeton aléatoire qui permet de reprendre la session
+        if getattr(tutor, "session_token", None):
+            doc["session_token"] = tutor.session_token
+        result = db["histories"].insert_one(doc)
         print(f"[MongoDB] ✓ History créé: {result.inserted_id}")
         return str(result.inserted_id)
     except Exception as e:
         print(f"[MongoDB] ✗ Erreur save_history: {e}")
         raise
 
-def update_history(history_id, tutor, status="in_progress"):
-    """Mettre à jour un historique existant"""
+# Derniers identifiants d'écriture gardés sur un historique (rejeu idempotent d'un ajout)
+HISTORY_WRITE_IDS = 20
+
+def bulk_append_histories(updates):
+    """
+    Applique en un seul bulk_write des ajouts d'historique :
+    updates = [(history_id, nouveaux_messages, champs, révision_attendue, nb_révisions, write_id), ...]
+    Les messages sont ajoutés avec $push (jamais de réécriture de la transcription),
+    seulement si l'historique est encore à la révision attendue (sans upsert : un
+    ajout refusé n'écrit rien). Le résultat ne dit pas quels ajouts n'ont trouvé
+    aucun document : si certains ont échoué ainsi, tous ceux du lot sont renvoyés
+    comme « non appliqués » et l'appelant relit leur état (get_history_write_states)
+    pour distinguer ajout appliqué, historique avancé ailleurs et historique supprimé.
+    Retourne (non_appliqués, en_échec) : ensembles d'history_id.
+    """
+    operations = []
+    for history_id, messages, fields, expected, revisions, write_id in updates:
+        update = {
+            "$set": {**fields, "updated_at": datetime.utcnow()},
+            "$inc": {"revision": revisions},
+            "$push": {"writes": {"$each": [write_id], "$slice": -HISTORY_WRITE_IDS}},
+        }
+        if messages:
+            update["$push"]["history"] = {"$each": messages}
+        # Les anciens documents n'ont pas encore de champ revision
+        query = {"_id": ObjectId(history_id), "revision": expected if expected else {"$in": [0, None]}}
+        operations.append(UpdateOne(query, update))
+    if not operations:
+        return set(), set()
+
+    failed = set()
     try:
-        result = db["histories"].update_one(
-            {"_id": ObjectId(history_id)},
-            {
-                "$set": {
-                    "plan": tutor.plan,
-                    "history": tutor.history,
-                    "status": status,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        if result.modified_count > 0:
-            print(f"[MongoDB] ✓ History mis à jour: {history_id}")
-        return result.modified_count
-    except Exception as e:
-        print(f"[MongoDB] ✗ Erreur update_history: {e}")
-        raise
+        matched = db["histories"].bulk_write(operations, ordered=False).matched_count
+    except BulkWriteError as e:
+        failed = {updates[error["index"]][0] for error in e.details.get("writeErrors", [])}
+        matched = e.details.get("nMatched", 0)
+    if matched < len(operations) - len(failed):
+        return {update[0] for update in updates} - failed, failed
+    return set(), failed
+
+def get_history_write_states(history_ids):
+    """{history_id: (révision, derniers write_id)} des historiques demandés"""
+    cursor = db["histories"].find(
+        {"_id": {"$in": [ObjectId(history_id) for history_id in history_ids]}},
+        {"revision": 1, "writes": 1}
+    )
+    return {str(doc["_id"]): (doc.get("revision", 0), doc.get("writes") or []) for doc in cursor}
 
 def list_histories(limit=100):
     """Lister tous les historiques"""
     try:
-        histories = list(db["histories"].find().sort("updated_at", -1).limit(limit))
+        histories = list(db["histories"].find({}, HISTORY_PROJECTION).sort("updated_at", -1).limit(limit))
         for history in histories:
             history["_id"] = str(history["_id"])
         return histories
@@ -72,7 +110,7 @@ def list_histories(limit=100):
 def get_history_by_id(history_id):
     """Récupérer un historique par son ID"""
     try:
-        doc = db["histories"].find_one({"_id": ObjectId(history_id)})
+        doc = db["histories"].find_one({"_id": ObjectId(history_id)}, HISTORY_PROJECTION)
         if doc:
             doc["_id"] = str(doc["_id"])
         return doc
@@ -87,3 +125,32 @@ def get_user_by_email(email: str):
     except Exception as e:
         print(f"[MongoDB] ✗ Erreur get_user: {e}")
         return None
+
+def get_articles_for_index(article_ids):
+    """Articles à indexer pour la recherche sémantique (champs utiles seulement)"""
+    return list(db["articles"].find(
+        {"_id": {"$in": [ObjectId(article_id) for article_id in article_ids if ObjectId.is_valid(article_id)]}},
+        {"title": 1, "content": 1, "category": 1, "tags": 1, "search_pending": 1}
+    ))
+
+def mark_articles_indexed(articles):
+    """Retire le marqueur `search_pending` des articles indexés, sauf s'ils ont été modifiés depuis leur lecture"""
+    operations = [
+        UpdateOne({"_id": article["_id"], "search_pending": article["search_pending"]}, {"$unset": {"search_pending": ""}})
+        for article in articles if article.get("search_pending") is not None
+    ]
+    if operations:
+        db["articles"].bulk_write(operations, ordered=False)
+
+def list_pending_article_ids(marked_before: datetime):
+    """Articles marqués `search_pending` avant `marked_before` (UTC) et toujours pas indexés"""
+    query = {"search_pending": {"$lt": ObjectId.from_datetime(marked_before)}}
+    return [str(doc["_id"]) for doc in db["articles"].find(query, {"_id": 1})]
+
+def mark_all_articles_pending():
+    """
+    Marque tous les articles `search_pending` (indexation complète). Marqueur daté
+    de l'epoch : list_pending_article_ids les renvoie dès le prochain balayage.
+    """
+    result = db["articles"].update_many({}, {"$set": {"search_pending": ObjectId.from_datetime(datetime(1970, 1, 1))}})
+    return result.matched_count
@@ -1,161 +1,210 @@
+import hashlib
 import os
+import threading
+import uuid
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient
+from qdrant_client.http import models
 from qdrant_client.http.models import VectorParams, PointStruct
 from config import collection_name as default_collection, images
+from embedding_service import EMBEDDING_MODEL_NAME, EMBEDDING_SERVICE_ADDRESS, EmbeddingServiceClient
+from vector_index import NumpyVectorIndex
 
-model = SentenceTransformer("all-mpnet-base-v2")
+# Local model, loaded on first use (never loaded when the embedding service is used)
+model = None
+_model_lock = threading.Lock()
+embedding_client = EmbeddingServiceClient(EMBEDDING_SERVICE_ADDRESS) if EMBEDDING_SERVICE_ADDRESS else None
 
 qdrant_available = True
 qdrant_vectors_persisted = False
 client = None
+# Name of the collection's vector (None for the unnamed schema), read by setup_qdrant
+collection_vector = None
 
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 collection_name = os.getenv("QDRANT_COLLECTION", default_collection)
+SYNC_BATCH_SIZE = int(os.getenv("QDRANT_SYNC_BATCH_SIZE", "64"))
+
+# "qdrant" (default, with in-process fallback) or "numpy" (always serve from the in-process index)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+VECTOR_INDEX_SNAPSHOT = os.getenv("VECTOR_INDEX_SNAPSHOT")
+local_index = None
+_local_index_lock = threading.Lock()
+
+def get_model():
+    global model
+    with _model_lock:
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return model
+
+def encode(texts):
+    """Encode a list of texts (shape (len(texts), 768)), through the shared embedding service if configured."""
+    texts = list(texts)
+    if embedding_client is not None:
+        return embedding_client.encode(texts)
+    return np.asarray(get_model().encode(texts), dtype=np.float32)
+
+def qdrant_ready():
+    return VECTOR_BACKEND != "numpy" and qdrant_available and client is not None and qdrant_vectors_persisted
+
+def get_local_index():
+    """
+    In-process index used when Qdrant is down (or VECTOR_BACKEND=numpy).
+    Loaded from VECTOR_INDEX_SNAPSHOT if present, otherwise built from config.images.
+    A snapshot whose points no longer match config.images (point IDs derive from
+    the content hashes) is brought up to date, then saved again.
+    """
+    global local_index
+    with _local_index_lock:
+        if local_index is None:
+            desired = {catalog_point_id(img): img for img in images}
+            if VECTOR_INDEX_SNAPSHOT and NumpyVectorIndex.snapshot_exists(VECTOR_INDEX_SNAPSHOT):
+                index = NumpyVectorIndex.load(VECTOR_INDEX_SNAPSHOT)
+                print(f"[Vector Index] Loaded {len(index)} vectors from {VECTOR_INDEX_SNAPSHOT}")
+            else:
+                index = NumpyVectorIndex()
+            known = set(index.ids)
+            new_ids = [pid for pid in desired if pid not in known]
+            removed_ids = [pid for pid in index.ids if pid not in desired]
+            if new_ids:
+                entries = [desired[pid] for pid in new_ids]
+                index.upsert(new_ids, encode([img["description"] for img in entries]), [{"path": img["path"]} for img in entries])
+            if removed_ids:
+                index.delete(removed_ids)
+            if VECTOR_INDEX_SNAPSHOT and (new_ids or removed_ids):
+                index.save(VECTOR_INDEX_SNAPSHOT)
+                print(f"[Vector Index] Snapshot updated: {len(new_ids)} added, {len(removed_ids)} removed")
+            local_index = index
+            print(f"[Vector Index] Serving {len(local_index)} vectors in-process")
+    return local_index
 
 def setup_qdrant():
-    global client, qdrant_available
+    global client, qdrant_available, collection_vector
     try:
         client = QdrantClient(QDRANT_HOST, port=QDRANT_PORT)
         try:
-            if hasattr(client, 'collection_exists') and hasattr(client, 'create_collection'):
-                if not client.collection_exists(collection_name=collection_name):
-                    client.create_collection(
-                        collection_name=collection_name,
-                        vectors_config={"default": VectorParams(size=768, distance="Cosine")},
-                    )
-            else:
+            if not client.collection_exists(collection_name=collection_name):
                 client.create_collection(
                     collection_name=collection_name,
                     vectors_config={"default": VectorParams(size=768, distance="Cosine")},
                 )
+            # Existing collections keep their schema (named or unnamed vector): searches follow it
+            collection_vector = collection_vector_name()
         except Exception as e:
-            print("Warning: could not recreate/create collection:", e)
+            print("Warning: could not create collection:", e)
             qdrant_available = False
     except Exception as e:
-        print("Warning: could not create/recreate collection (Qdrant may not be running):", e)
+        print("Warning: could not create collection (Qdrant may not be running):", e)
         qdrant_available = False
 
-def prepare_points():
+def content_hash(img):
+    return hashlib.sha256(f"{img['path']}\n{img['description']}".encode("utf-8")).hexdigest()
+
+def catalog_point_id(img):
+    """Stable point ID derived from path + description: an edited entry gets a new ID."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"eduagent-image:{content_hash(img)}"))
+
+def prepare_points(entries=None, source="config", vector_name=None):
+    entries = images if entries is None else entries
+    vectors = encode([img["description"] for img in entries])
+    return build_points(entries, vectors, source=source, vector_name=vector_name)
+
+def build_points(entries, vectors, source="config", vector_name=None):
     points = []
-    for idx, img in enumerate(images):
-        vector = model.encode(img["description"])
+    for img, vector in zip(entries, vectors):
+        pid = catalog_point_id(img)
+        payload = {"path": img["path"], "description": img["description"], "content_hash": content_hash(img), "source": source}
+        if vector_name:
+            points.append(PointStruct(id=pid, vector={vector_name: list(map(float, vector.tolist()))}, payload=payload))
+            continue
         try:
-            points.append(PointStruct(id=idx, vector=vector.tolist(), payload={"path": img["path"]}))
+            points.append(PointStruct(id=pid, vector=vector.tolist(), payload=payload))
         except Exception:
-            points.append(PointStruct(id=idx, vector=list(map(float, vector.tolist())), payload={"path": img["path"]}))
+            points.append(PointStruct(id=pid, vector=list(map(float, vector.tolist())), payload=payload))
     return points
 
-def _try_upsert_points(pt_list):
+def collection_vector_name():
+    """Name of the vector if the collection uses named vectors, None for the unnamed schema."""
+    vectors = client.get_collection(collection_name=collection_name).config.params.vectors
+    if isinstance(vectors, dict):
+        return next(iter(vectors), None)
+    return None
+
+def _upsert_points(points):
+    """
+    Upsert `points`. Returns True on success. The collection is never recreated
+    on failure: it also holds ingested points that config.images cannot rebuild.
+    """
+    global qdrant_available
     try:
-        client.upsert(collection_name=collection_name, points=pt_list)
-        return True, None
-    except Exception as err:
-        return False, err
+        client.upsert(collection_name=collection_name, points=points)
+        return True
+    except Exception as e:
+        print("Warning: upsert to Qdrant failed:", e)
+        qdrant_available = False
+        return False
+
+def _existing_catalog_ids():
+    """IDs of the points owned by config.images (plus legacy points without content_hash)."""
+    catalog_filter = models.Filter(should=[
+        models.FieldCondition(key="source", match=models.MatchValue(value="config")),
+        models.IsEmptyCondition(is_empty=models.PayloadField(key="content_hash")),
+    ])
+    ids = set()
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=catalog_filter,
+            limit=SYNC_BATCH_SIZE * 4,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        ids.update(record.id for record in records)
+        if offset is None:
+            return ids
 
 def upsert_vectors():
+    """
+    Incremental sync of config.images: only new or edited entries are encoded
+    (in batches of SYNC_BATCH_SIZE) and upserted, removed entries are deleted,
+    and nothing is encoded when the catalog did not change.
+    """
     global qdrant_vectors_persisted, qdrant_available
     if not (qdrant_available and client is not None):
         return
-    points = prepare_points()
+    desired = {catalog_point_id(img): img for img in images}
     try:
-        count_result = client.count(collection_name=collection_name)
-        if count_result.count > 0:
-            qdrant_vectors_persisted = True
-            print("Vectors already persisted in Qdrant.")
-            return
-        # First try using PointStruct objects
-        ok, err = _try_upsert_points(points)
-        if ok:
-            qdrant_vectors_persisted = True
-            print("Upserted points to Qdrant.")
-        else:
-            print("Warning: initial upsert failed:", err)
-            # Try fallback using named 'vectors' dict (may fail if client enforces 'vector')
-            try:
-                fallback_points = []
-                for p in points:
-                    pid = getattr(p, 'id', None)
-                    payload = getattr(p, 'payload', None)
-                    vec = getattr(p, 'vector', None)
-                    if vec is None and isinstance(p, dict):
-                        vec = p.get('vector')
-                    if hasattr(vec, 'tolist'):
-                        vec_list = vec.tolist()
-                    else:
-                        vec_list = list(vec) if vec is not None else []
-                    fallback_points.append({
-                        "id": pid,
-                        "vectors": {"default": list(map(float, vec_list))},
-                        "payload": payload
-                    })
-                ok2, err2 = _try_upsert_points(fallback_points)
-                if ok2:
-                    qdrant_vectors_persisted = True
-                    print("Upserted points to Qdrant using fallback 'vectors' dict format.")
-                else:
-                    # Fallback failed; inspect error to decide next action
-                    print("Fallback upsert also failed:", err2)
-                    msg = str(err2)
-                    # If the client complains about 'points.x.vectors' being extra, it expects top-level 'vector' field
-                    if 'points.0.vectors' in msg or 'points.0.vector\n  Field required' in msg or 'Extra inputs are not permitted' in msg:
-                        print("Detected client-side validation that forbids 'vectors' and requires top-level 'vector'. Recreating collection with unnamed vector schema and retrying upsert...")
-                        try:
-                            # Try deleting and recreating collection with unnamed vector schema (legacy format)
-                            try:
-                                if hasattr(client, 'delete_collection'):
-                                    client.delete_collection(collection_name=collection_name)
-                            except Exception:
-                                pass
-                            # Create collection with unnamed VectorParams (not dict)
-                            if hasattr(client, 'create_collection'):
-                                client.create_collection(collection_name=collection_name, vectors_config=VectorParams(size=768, distance="Cosine"))
-                            else:
-                                # Fall back to recreate_collection if older client
-                                client.recreate_collection(collection_name=collection_name, vectors_config=VectorParams(size=768, distance="Cosine"))
-                            # Prepare plain points with top-level 'vector' field
-                            plain_points = []
-                            for p in points:
-                                pid = getattr(p, 'id', None)
-                                payload = getattr(p, 'payload', None)
-                                vec = getattr(p, 'vector', None)
-                                if hasattr(vec, 'tolist'):
-                                    vec_list = vec.tolist()
-                                else:
-                                    vec_list = list(vec) if vec is not None else []
-                                plain_points.append({"id": pid, "vector": list(map(float, vec_list)), "payload": payload})
-                            ok3, err3 = _try_upsert_points(plain_points)
-                            if ok3:
-                                qdrant_vectors_persisted = True
-                                print("Upserted points using top-level 'vector' after recreating collection with unnamed vectors.")
-                            else:
-                                print("Retry with plain 'vector' failed:", err3)
-                                raw = getattr(err3, 'raw', None) or getattr(err3, 'response', None)
-                                if raw is not None:
-                                    try:
-                                        body = getattr(raw, 'text', None) or getattr(raw, 'content', None) or raw
-                                        print("Raw response content:", body)
-                                    except Exception:
-                                        print("Response present but could not extract body.")
-                                qdrant_available = False
-                        except Exception as e3:
-                            print("Error while recreating collection and retrying upsert:", e3)
-                            qdrant_available = False
-                    else:
-                        # Other unexpected error: print raw response if available and disable Qdrant
-                        raw = getattr(err2, 'raw', None) or getattr(err2, 'response', None)
-                        if raw is not None:
-                            try:
-                                body = getattr(raw, 'text', None) or getattr(raw, 'content', None) or raw
-                                print("Raw response content:", body)
-                            except Exception:
-                                print("Response present but could not extract body.")
-                        qdrant_available = False
-            except Exception as inner_e:
-                print("Error during fallback upsert preparation:", inner_e)
-                qdrant_available = False
+        existing = _existing_catalog_ids()
+        # Same schema as ingest_images: named vector when the collection declares one
+        vector_name = collection_vector_name()
     except Exception as e:
-        print("Error checking count:", e)
-        qdrant_available = False
\ No newline at end of file
+        print("Error checking existing vectors:", e)
+        qdrant_available = False
+        return
+
+    new_ids = [pid for pid in desired if pid not in existing]
+    removed_ids = [pid for pid in existing if pid not in desired]
+    if not new_ids and not removed_ids:
+        qdrant_vectors_persisted = True
+        print("Vectors already persisted in Qdrant (catalog unchanged).")
+        return
+
+    for start in range(0, len(new_ids), SYNC_BATCH_SIZE):
+        batch = [desired[pid] for pid in new_ids[start:start + SYNC_BATCH_SIZE]]
+        if not _upsert_points(prepare_points(batch, vector_name=vector_name)):
+            return
+
+    if removed_ids:
+        try:
+            client.delete(collection_name=collection_name, points_selector=models.PointIdsList(points=removed_ids))
+        except Exception as e:
+            print("Warning: could not delete removed catalog entries:", e)
+
+    qdrant_vectors_persisted = True
+    print(f"Synced catalog to Qdrant: {len(new_ids)} upserted, {len(removed_ids)} deleted, "
+          f"{len(desired) - len(new_ids)} unchanged.")
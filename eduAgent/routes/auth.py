@@ -3,12 +3,13 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
-import bcrypt
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from typing import Optional
-from bson import ObjectId
-from mongo import db, get_user_by_email
+import async_mongo
+from auth_cache import principal_cache, token_cache
+from utils.executors import PasswordQueueFull, run_password
+from utils.passwords import hash_password, verify_password
 
 router = APIRouter()
 
@@ -18,6 +19,8 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# Pour les routes publiques qui tiennent compte de l'utilisateur s'il est connecté
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
 # ============ MODÈLES ============
 class UserRegister(BaseModel):
@@ -39,51 +42,36 @@ class RegisterResponse(BaseModel):
     token_type: str
 
 # ============ FONCTIONS UTILITAIRES ============
-def hash_password(password: str) -> str:
-    """
-    Hash a password using bcrypt.
-    Bcrypt has a 72-byte limit, so we truncate if necessary.
-    """
-    # Convert to bytes and truncate to 72 bytes if needed
-    password_bytes = password.encode('utf-8')
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-    
-    # Generate salt and hash
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """
-    Verify a password against a bcrypt hash.
-    Bcrypt has a 72-byte limit, so we truncate if necessary.
-    """
-    try:
-        # Convert to bytes and truncate to 72 bytes if needed
-        password_bytes = plain_password.encode('utf-8')
-        if len(password_bytes) > 72:
-            password_bytes = password_bytes[:72]
-        
-        # Verify password
-        hashed_bytes = hashed_password.encode('utf-8')
-        return bcrypt.checkpw(password_bytes, hashed_bytes)
-    except Exception as e:
-        print(f"Password verification error: {e}")
-        return False
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def authenticate_user(email: str, password: str):
-    user = get_user_by_email(email)
-    if not user or not verify_password(password, user["password"]):
+async def authenticate_user(email: str, password: str):
+    user = await async_mongo.get_user_by_email(email)
+    if not user or not await run_password(verify_password, password, user["password"]):
         return False
     return user
 
+def decode_token(token: str) -> dict:
+    """Payload d'un token valide, mis en cache jusqu'à son expiration. Lève JWTError sinon."""
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if "exp" in payload:
+            token_cache.put(token, payload, expires_at=payload["exp"])
+    return payload
+
+def token_subject(token: Optional[str]) -> Optional[str]:
+    """ID utilisateur d'un token valide, sans lecture en base (None si absent ou invalide)"""
+    if not token:
+        return None
+    try:
+        return decode_token(token).get("sub")
+    except JWTError:
+        return None
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=401,
@@ -91,37 +79,41 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = db["users"].find_one({"_id": ObjectId(user_id)})
+    user = principal_cache.get(user_id)
     if user is None:
-        raise credentials_exception
-    return user
+        user = await async_mongo.get_user_by_id(user_id)
+        if user is None:
+            raise credentials_exception
+        principal_cache.put(user_id, user)
+    # Copie : une route qui modifie l'utilisateur ne touche pas au cache
+    return dict(user)
 
 # ============ ROUTES ============
 
 @router.post("/register", response_model=RegisterResponse, tags=["Authentication"])
-def register(user: UserRegister):
+async def register(user: UserRegister):
     """
     Register a new user and return access token immediately
     """
     # Vérifier si l'utilisateur existe
-    if get_user_by_email(user.email):
+    if await async_mongo.get_user_by_email(user.email):
         raise HTTPException(status_code=400, detail="User already exists")
 
     # Créer l'utilisateur
     try:
-        hashed_pw = hash_password(user.password)
-        user_id = db["users"].insert_one({
+        hashed_pw = await run_password(hash_password, user.password)
+        user_id = await async_mongo.create_user({
             "email": user.email,
             "password": hashed_pw,
             "created_at": datetime.utcnow()
-        }).inserted_id
+        })
         
         # ✨ NOUVEAU : Créer le token automatiquement
         access_token = create_access_token(
@@ -137,17 +129,22 @@ def register(user: UserRegister):
             "access_token": access_token,
             "token_type": "bearer"
         }
+    except PasswordQueueFull:
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
     except Exception as e:
         print(f"✗ Registration failed: {e}")
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
 
 @router.post("/login", response_model=Token, tags=["Authentication"])
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Login with email/password and get access token
     """
-    user = authenticate_user(form_data.username, form_data.password)
+    try:
+        user = await authenticate_user(form_data.username, form_data.password)
+    except PasswordQueueFull:
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
     if not user:
         raise HTTPException(
             status_code=401,
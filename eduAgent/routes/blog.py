@@ -1,14 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel, HttpUrl
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 
-from mongo import db
-from routes.auth import get_current_user
+import async_mongo
+from view_counter import view_counter
+from taxonomy import record_change, taxonomy_cache
+from trending import FEEDS, TRENDING_FEED_SIZE, trending_feeds
+import article_search
+from article_search import article_index, semantic_search
+from utils.executors import run_blocking
+from routes.auth import get_current_user, optional_oauth2_scheme, token_subject
+from utils.pagination import decode_cursor
+from utils.projection import parse_fields
+from utils.text_search import search_terms, text_query, highlight, snippet
 
 router = APIRouter()
 
+MAX_PAGE_SIZE = 100
+
 # ============ MODÈLES ============
 class ArticleCreate(BaseModel):
     title: str
@@ -50,6 +61,23 @@ class CommentResponse(BaseModel):
 
 # ============ ARTICLES ============
 
+COUNTERS = ("likes", "views", "unique_viewers", "comment_count")
+
+def format_article(article: dict, fields=None) -> dict:
+    """Prépare un document article pour la réponse (id, dates ISO, compteurs)"""
+    article["id"] = str(article.pop("_id"))
+    for key in ("created_at", "updated_at"):
+        if key in article:
+            article[key] = article[key].isoformat()
+    for counter in COUNTERS:
+        if fields is None or counter in fields:
+            article.setdefault(counter, 0)
+    if "views" in article:
+        # Vues encore en mémoire (view_counter)
+        article["views"] += view_counter.pending_views(article["id"])
+    return article
+
+
 @router.post("/articles", response_model=ArticleResponse, tags=["Blog"])
 async def create_article(
     article: ArticleCreate,
@@ -66,13 +94,16 @@ async def create_article(
         "links": article.links,
         "likes": 0,
         "views": 0,
-        "comments": [],
+        "unique_viewers": 0,
+        "comment_count": 0,
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
     
-    result = db["articles"].insert_one(article_data)
-    article_data["_id"] = str(result.inserted_id)
+    inserted_id = await async_mongo.insert_article(article_data)
+    article_data["_id"] = str(inserted_id)
+    await record_change(None, article_data)
+    article_index.enqueue(article_data["_id"])
     
     return {
         "id": article_data["_id"],
@@ -94,9 +125,15 @@ async def list_articles(
     category: Optional[str] = None,
     tag: Optional[str] = None,
     limit: int = 20,
-    skip: int = 0
+    skip: int = 0,
+    cursor: Optional[str] = None
 ):
-    """Lister tous les articles avec filtres optionnels"""
+    """
+    Lister tous les articles avec filtres optionnels (résumés : extrait, compteurs, dates).
+    Avec `cursor` (vide pour la première page), la réponse est paginée par clé :
+    {"articles": [...], "next_cursor": ...}. Sans `cursor`, pagination par skip (liste).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
     query = {}
     
     if category:
@@ -104,41 +141,130 @@ async def list_articles(
     if tag:
         query["tags"] = tag
     
-    articles = list(
-        db["articles"]
-        .find(query)
-        .sort("created_at", -1)
-        .skip(skip)
-        .limit(limit)
+    if cursor is None:
+        articles = await async_mongo.find_articles(query, async_mongo.ARTICLE_ORDER, limit=limit, skip=skip)
+        next_cursor = None
+    else:
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        articles, next_cursor = await async_mongo.find_articles_page(query, limit=limit, cursor=after)
+    
+    articles = [format_article(article) for article in articles]
+    
+    if cursor is None:
+        return articles
+    return {"articles": articles, "next_cursor": next_cursor}
+
+# ============ TENDANCES ============
+
+@router.get("/trending", tags=["Blog"])
+async def get_trending(
+    feed: str = "trending",
+    category: Optional[str] = None,
+    limit: int = 20
+):
+    """
+    Articles tendance (engagement amorti dans le temps) ou populaires (engagement total),
+    globalement ou pour une catégorie. Servis depuis les flux précalculés en mémoire.
+    """
+    if feed not in FEEDS:
+        raise HTTPException(status_code=400, detail=f"Unknown feed, expected one of: {', '.join(FEEDS)}")
+    limit = max(1, min(limit, TRENDING_FEED_SIZE))
+    articles, computed_at = await trending_feeds.get(feed, category)
+    return {
+        "feed": feed,
+        "category": category,
+        "computed_at": computed_at.isoformat() if computed_at else None,
+        "articles": articles[:limit],
+    }
+
+# ============ RECHERCHE ============
+# Déclarée avant /articles/{article_id}, sinon "search" serait pris pour un ID
+
+@router.get("/articles/search", tags=["Blog"])
+async def search_articles(q: str, limit: int = 20, page: int = 1):
+    """Rechercher des articles (index texte, tri par pertinence, extraits surlignés)"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    page = max(1, page)
+    terms = search_terms(q)
+    if not terms:
+        return {"articles": [], "total": 0, "page": page, "limit": limit}
+    
+    articles, total = await async_mongo.text_search_articles(
+        text_query(terms),
+        limit=limit,
+        skip=(page - 1) * limit
     )
     
     for article in articles:
-        article["id"] = str(article.pop("_id"))
-        article["created_at"] = article["created_at"].isoformat()
-        article["updated_at"] = article["updated_at"].isoformat()
+        format_article(article)
+        article["highlights"] = {
+            "title": highlight(article.get("title", ""), terms),
+            "snippet": snippet(article.pop("content", ""), terms),
+        }
+    
+    return {"articles": articles, "total": total, "page": page, "limit": limit}
+
+@router.get("/articles/semantic-search", tags=["Blog"])
+async def semantic_search_articles(
+    q: str,
+    limit: int = 10,
+    category: Optional[str] = None,
+    tag: Optional[str] = None
+):
+    """Recherche sémantique (embeddings des articles dans Qdrant), avec le passage le plus proche"""
+    if not article_search.collection_ready:
+        raise HTTPException(status_code=503, detail="Semantic search unavailable")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if not q.strip():
+        return {"articles": []}
+    
+    hits = await run_blocking(semantic_search, q, limit=limit, category=category, tag=tag)
+    articles = await async_mongo.find_articles_by_ids([hit["article_id"] for hit in hits])
+    by_id = {hit["article_id"]: hit for hit in hits}
+    # Points d'articles supprimés dont la suppression n'a pas été indexée (worker arrêté entre-temps)
+    for article_id in by_id.keys() - {str(article["_id"]) for article in articles}:
+        article_index.enqueue(article_id, op="delete")
+    
+    for article in articles:
+        format_article(article)
+        article["score"] = by_id[article["id"]]["score"]
+        article["passage"] = by_id[article["id"]]["passage"]
     
-    return articles
+    return {"articles": articles}
+
+def viewer_key(request: Request, token: Optional[str]) -> str:
+    """Identité d'un lecteur pour le comptage des lecteurs uniques"""
+    user_id = token_subject(token)
+    if user_id:
+        return f"user:{user_id}"
+    client = request.client.host if request.client else ""
+    return f"anon:{client}|{request.headers.get('user-agent', '')}"
 
 @router.get("/articles/{article_id}", tags=["Blog"])
-async def get_article(article_id: str):
-    """Récupérer un article spécifique et incrémenter les vues"""
-    article = db["articles"].find_one({"_id": ObjectId(article_id)})
+async def get_article(
+    article_id: str,
+    request: Request,
+    fields: Optional[str] = None,
+    token: Optional[str] = Depends(optional_oauth2_scheme)
+):
+    """Récupérer un article spécifique (ou seulement `fields=title,content,...`) et incrémenter les vues"""
+    try:
+        selected = parse_fields(fields, async_mongo.ARTICLE_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    article = await async_mongo.get_article(article_id, fields=selected)
     
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
     
-    # Incrémenter les vues
-    db["articles"].update_one(
-        {"_id": ObjectId(article_id)},
-        {"$inc": {"views": 1}}
-    )
-    
-    article["id"] = str(article.pop("_id"))
-    article["views"] += 1
-    article["created_at"] = article["created_at"].isoformat()
-    article["updated_at"] = article["updated_at"].isoformat()
+    # Vue et lecteur comptés en mémoire, écrits plus tard par lot (view_counter)
+    view_counter.record(article_id, viewer=viewer_key(request, token))
     
-    return article
+    return format_article(article, fields=selected)
 
 @router.put("/articles/{article_id}", tags=["Blog"])
 async def update_article(
@@ -147,7 +273,7 @@ async def update_article(
     current_user: dict = Depends(get_current_user)
 ):
     """Modifier un article (seulement par l'auteur)"""
-    article = db["articles"].find_one({"_id": ObjectId(article_id)})
+    article = await async_mongo.get_article(article_id)
     
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
@@ -161,10 +287,13 @@ async def update_article(
     }
     update_data["updated_at"] = datetime.utcnow()
     
-    db["articles"].update_one(
-        {"_id": ObjectId(article_id)},
-        {"$set": update_data}
-    )
+    previous = await async_mongo.update_article(article_id, update_data)
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Article not found")
+    if "category" in update_data or "tags" in update_data:
+        # Écarts calculés depuis la version remplacée, pas depuis la lecture ci-dessus
+        await record_change(previous, {**previous, **update_data})
+    article_index.enqueue(article_id)
     
     return {"message": "Article updated successfully"}
 
@@ -174,7 +303,7 @@ async def delete_article(
     current_user: dict = Depends(get_current_user)
 ):
     """Supprimer un article (seulement par l'auteur)"""
-    article = db["articles"].find_one({"_id": ObjectId(article_id)})
+    article = await async_mongo.get_article(article_id)
     
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
@@ -182,7 +311,11 @@ async def delete_article(
     if article["author_id"] != str(current_user["_id"]):
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    db["articles"].delete_one({"_id": ObjectId(article_id)})
+    deleted = await async_mongo.delete_article(article_id)
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Article not found")
+    await record_change(deleted, None)
+    article_index.enqueue(article_id, op="delete")
     
     return {"message": "Article deleted successfully"}
 
@@ -193,40 +326,29 @@ async def like_article(
     article_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """Liker un article"""
+    """Liker / unliker un article (le like est créé ou supprimé, sans lecture préalable)"""
+    if not ObjectId.is_valid(article_id):
+        raise HTTPException(status_code=404, detail="Article not found")
     user_id = str(current_user["_id"])
     
-    # Vérifier si déjà liké
-    article = db["articles"].find_one({"_id": ObjectId(article_id)})
-    if not article:
+    liked = await async_mongo.toggle_like(article_id, user_id)
+    if not await async_mongo.increment_article_likes(article_id, 1 if liked else -1):
+        await async_mongo.delete_like(article_id, user_id)
         raise HTTPException(status_code=404, detail="Article not found")
     
-    likes_collection = db["article_likes"]
-    existing_like = likes_collection.find_one({
-        "article_id": article_id,
-        "user_id": user_id
-    })
-    
-    if existing_like:
-        # Unlike
-        likes_collection.delete_one({"_id": existing_like["_id"]})
-        db["articles"].update_one(
-            {"_id": ObjectId(article_id)},
-            {"$inc": {"likes": -1}}
-        )
-        return {"message": "Article unliked", "liked": False}
-    else:
-        # Like
-        likes_collection.insert_one({
-            "article_id": article_id,
-            "user_id": user_id,
-            "created_at": datetime.utcnow()
-        })
-        db["articles"].update_one(
-            {"_id": ObjectId(article_id)},
-            {"$inc": {"likes": 1}}
-        )
+    if liked:
         return {"message": "Article liked", "liked": True}
+    return {"message": "Article unliked", "liked": False}
+
+@router.get("/likes", tags=["Blog"])
+async def get_like_states(
+    ids: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """État des likes de l'utilisateur pour une page d'articles (`ids` séparés par des virgules)"""
+    article_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))[:MAX_PAGE_SIZE]
+    liked = await async_mongo.liked_article_ids(str(current_user["_id"]), article_ids)
+    return {"liked": {article_id: article_id in liked for article_id in article_ids}}
 
 # ============ COMMENTAIRES ============
 
@@ -237,26 +359,25 @@ async def add_comment(
     current_user: dict = Depends(get_current_user)
 ):
     """Ajouter un commentaire"""
-    article = db["articles"].find_one({"_id": ObjectId(article_id)})
-    
-    if not article:
+    if not ObjectId.is_valid(article_id) or not await async_mongo.increment_comment_count(article_id, 1):
         raise HTTPException(status_code=404, detail="Article not found")
     
     comment_data = {
-        "_id": str(ObjectId()),
+        "article_id": article_id,
         "content": comment.content,
         "author_id": str(current_user["_id"]),
         "author_email": current_user["email"],
         "created_at": datetime.utcnow()
     }
     
-    db["articles"].update_one(
-        {"_id": ObjectId(article_id)},
-        {"$push": {"comments": comment_data}}
-    )
+    try:
+        comment_id = await async_mongo.insert_comment(comment_data)
+    except Exception:
+        await async_mongo.increment_comment_count(article_id, -1)
+        raise
     
     return {
-        "id": comment_data["_id"],
+        "id": str(comment_id),
         "content": comment_data["content"],
         "author_id": comment_data["author_id"],
         "author_email": comment_data["author_email"],
@@ -264,56 +385,48 @@ async def add_comment(
     }
 
 @router.get("/articles/{article_id}/comments", tags=["Blog"])
-async def get_comments(article_id: str):
-    """Récupérer tous les commentaires d'un article"""
-    article = db["articles"].find_one({"_id": ObjectId(article_id)})
-    
-    if not article:
+async def get_comments(
+    article_id: str,
+    limit: int = 50,
+    skip: int = 0,
+    cursor: Optional[str] = None
+):
+    """
+    Récupérer les commentaires d'un article (du plus ancien au plus récent).
+    Avec `cursor` (vide pour la première page) : {"comments": [...], "next_cursor": ...}.
+    """
+    if not ObjectId.is_valid(article_id):
         raise HTTPException(status_code=404, detail="Article not found")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
+    if cursor is None:
+        comments = await async_mongo.find_comments(article_id, limit=limit, skip=skip)
+        next_cursor = None
+    else:
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        comments, next_cursor = await async_mongo.find_comments_page(article_id, limit=limit, cursor=after)
     
-    comments = article.get("comments", [])
     for comment in comments:
-        comment["id"] = comment.pop("_id")
+        comment["id"] = str(comment.pop("_id"))
         comment["created_at"] = comment["created_at"].isoformat()
     
-    return comments
+    if cursor is None:
+        return comments
+    return {"comments": comments, "next_cursor": next_cursor}
 
 # ============ CATÉGORIES ET TAGS ============
 
 @router.get("/categories", tags=["Blog"])
 async def get_categories():
-    """Récupérer toutes les catégories"""
-    categories = db["articles"].distinct("category")
-    return {"categories": categories}
+    """Récupérer toutes les catégories, des plus utilisées aux moins utilisées, avec leur nombre d'articles"""
+    entries = (await taxonomy_cache.get())["category"]
+    return {"categories": [name for name, _ in entries], "counts": dict(entries)}
 
 @router.get("/tags", tags=["Blog"])
 async def get_tags():
-    """Récupérer tous les tags"""
-    tags = db["articles"].distinct("tags")
-    return {"tags": tags}
-
-# ============ RECHERCHE ============
-
-@router.get("/articles/search", tags=["Blog"])
-async def search_articles(q: str, limit: int = 20):
-    """Rechercher des articles"""
-    articles = list(
-        db["articles"]
-        .find({
-            "$or": [
-                {"title": {"$regex": q, "$options": "i"}},
-                {"content": {"$regex": q, "$options": "i"}},
-                {"tags": {"$regex": q, "$options": "i"}}
-            ]
-        })
-        .sort("created_at", -1)
-        .limit(limit)
-    )
-    
-    for article in articles:
-        article["id"] = str(article.pop("_id"))
-        article["created_at"] = article["created_at"].isoformat()
-        article["updated_at"] = article["updated_at"].isoformat()
-    
-    return articles
-
+    """Récupérer tous les tags, des plus utilisés aux moins utilisés, avec leur nombre d'articles"""
+    entries = (await taxonomy_cache.get())["tags"]
+    return {"tags": [name for name, _ in entries], "counts": dict(entries)}
@@ -1,41 +1,67 @@
 import qdrant_utils
+from embedding_cache import normalize_query, query_cache
 
-def find_best_image(explanation):
-    qvec = qdrant_utils.model.encode(explanation)
-    
-    # Check if Qdrant is available, but don't crash if it's not. Just return None.
-    if not (qdrant_utils.qdrant_available and qdrant_utils.client is not None and qdrant_utils.qdrant_vectors_persisted):
-        print("Warning: Qdrant is not ready. Skipping image search.")
-        return None
+def _first_hit(res):
+    if res:
+        hits = getattr(res, 'points', getattr(res, 'result', res))
+        if hits:
+            try:
+                return {'path': hits[0].payload.get("path"), 'score': getattr(hits[0], 'score', None)}
+            except Exception:
+                return None
+    return None
+
+def _search_batch(qvecs):
+    """One Qdrant round trip for all the vectors, against the collection's vector (named or not)."""
+    from qdrant_client.http import models
+
+    requests = [
+        models.QueryRequest(query=qvec.tolist(), using=qdrant_utils.collection_vector, limit=1, with_payload=True)
+        for qvec in qvecs
+    ]
+    responses = qdrant_utils.client.query_batch_points(collection_name=qdrant_utils.collection_name, requests=requests)
+    return [_first_hit(res) for res in responses]
+
+def _search_local(qvecs):
+    index = qdrant_utils.get_local_index()
+    results = []
+    for hits in index.search(qvecs, limit=1):
+        results.append({'path': hits[0]["payload"].get("path"), 'score': hits[0]["score"]} if hits else None)
+    return results
+
+def find_best_images(queries):
+    """
+    Resolve several image queries at once: duplicates are removed, embeddings come
+    from the query cache (misses are encoded in a single batch) and all vectors are
+    searched with a single Qdrant request (or the in-process index if Qdrant is down).
+    Returns one result (or None) per query, in the same order.
+    """
+    if not queries:
+        return []
 
+    unique_queries = list(dict.fromkeys(normalize_query(query) for query in queries))
     try:
-        if hasattr(qdrant_utils.client, 'query_points'):
-            res = qdrant_utils.client.query_points(collection_name=qdrant_utils.collection_name, query=qvec.tolist(), limit=1, with_payload=True)
-            if res:
-                hits = getattr(res, 'points', getattr(res, 'result', res))
-                if hits:
-                    try:
-                        return {'path': hits[0].payload.get("path"), 'score': getattr(hits[0], 'score', None)}
-                    except Exception:
-                        return None
-        if hasattr(qdrant_utils.client, 'search'):
-            res = qdrant_utils.client.search(collection_name=qdrant_utils.collection_name, query_vector=qvec.tolist(), limit=1)
-            if res:
-                hits = getattr(res, 'points', getattr(res, 'result', res))
-                if hits:
-                    try:
-                        return {'path': hits[0].payload.get("path"), 'score': getattr(hits[0], 'score', None)}
-                    except Exception:
-                        return None
-        elif hasattr(qdrant_utils.client, 'search_points'):
-            res = qdrant_utils.client.search_points(collection_name=qdrant_utils.collection_name, query_vector=qvec.tolist(), limit=1)
-            if res:
-                hits = getattr(res, 'points', getattr(res, 'result', res))
-                if hits:
-                    try:
-                        return {'path': hits[0].payload.get("path"), 'score': getattr(hits[0], 'score', None)}
-                    except Exception:
-                        return None
+        qvecs = query_cache.encode(unique_queries, qdrant_utils.encode)
     except Exception as e:
-        print(f"Qdrant search failed: {e}")
-        return None
\ No newline at end of file
+        print(f"Query encoding failed: {e}")
+        return [None] * len(queries)
+
+    results = None
+    if qdrant_utils.qdrant_ready():
+        try:
+            results = _search_batch(qvecs)
+        except Exception as e:
+            print(f"Qdrant search failed, using in-process index: {e}")
+    if results is None:
+        # Qdrant is down (or VECTOR_BACKEND=numpy): serve from the in-process index
+        try:
+            results = _search_local(qvecs)
+        except Exception as e:
+            print(f"In-process search failed: {e}")
+            return [None] * len(queries)
+
+    by_query = dict(zip(unique_queries, results))
+    return [by_query.get(normalize_query(query)) for query in queries]
+
+def find_best_image(explanation):
+    return find_best_images([explanation])[0]
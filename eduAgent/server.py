@@ -1,15 +1,34 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import uuid
+import asyncio
+import json
+from concurrent.futures import TimeoutError as FutureTimeout
 from datetime import datetime
 from routes.blog import router as blog_router
 
-from mongo import save_full_history, update_history, list_histories, get_history_by_id
+import async_mongo
+import auth_cache
+from mongo import save_full_history
+from history_writer import HISTORY_WRITE_TIMEOUT, HistoryDeleted, history_writer
+from view_counter import view_counter
+from taxonomy import ensure_taxonomy, taxonomy_cache
+from trending import trending_feeds
+from article_search import article_index, setup_article_collection
+from indexes import ensure_indexes
+import qdrant_utils
 from qdrant_utils import setup_qdrant, upsert_vectors
 from main import AITutor
+from image_agent import MarkerStreamParser, STREAM_MARKER_INSTRUCTIONS
+from search import find_best_image
+from embedding_cache import query_cache
+from session_store import SessionStore, create_backend, new_session_token
 from routes.auth import router as auth_router
+from utils.executors import password_executor, run_blocking, shutdown_executors
+from utils.pagination import decode_cursor
+from utils.projection import parse_fields
 
 app = FastAPI(
     title="EduAgent API",
@@ -38,8 +57,9 @@ app.include_router(auth_router, prefix="/auth")
 app.include_router(blog_router, prefix="/blog")
 
 
-# Sessions
-sessions: Dict[str, "APIAITutor"] = {}
+# Sessions (bornées : LRU + TTL d'inactivité, sauvegardées avant éviction,
+# reprises depuis MongoDB sur n'importe quel worker)
+sessions = SessionStore(backend=create_backend(lambda doc: APIAITutor.from_history(doc)))
 
 # Models
 class StartRequest(BaseModel):
@@ -65,11 +85,16 @@ async def startup_event():
     print("=" * 50)
     
     try:
-        from mongo import client
-        client.admin.command('ping')
+        await async_mongo.ping()
         print("✓ MongoDB: Connected")
+        await run_blocking(ensure_indexes)
     except Exception as e:
         print(f"✗ MongoDB: Connection failed - {e}")
+
+    try:
+        await ensure_taxonomy()
+    except Exception as e:
+        print(f"✗ Taxonomy: Initialization failed - {e}")
     
     try:
         setup_qdrant()
@@ -78,12 +103,78 @@ async def startup_event():
     except Exception as e:
         print(f"✗ Qdrant: Initialization failed - {e}")
     
+    try:
+        if await run_blocking(setup_article_collection):
+            # Collection neuve : tous les articles existants sont marqués, puis indexés en tâche de fond
+            queued = await run_blocking(article_index.backfill)
+            print(f"✓ Article search: indexing {queued} articles")
+    except Exception as e:
+        print(f"✗ Article search: Initialization failed - {e}")
+    
+    if not qdrant_utils.qdrant_ready():
+        try:
+            qdrant_utils.get_local_index()
+            print("✓ Vector index: serving image search in-process")
+        except Exception as e:
+            print(f"✗ Vector index: Initialization failed - {e}")
+    
+    sessions.start()
+    history_writer.start()
+    view_counter.start()
+    trending_feeds.start()
+    article_index.start()
+    
     print("=" * 50)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await sessions.stop()
+    await trending_feeds.stop()
+    # Écriture garantie des historiques et des vues en attente
+    await run_blocking(history_writer.stop)
+    await view_counter.stop()
+    await run_blocking(article_index.stop)
+    await async_mongo.close()
+    shutdown_executors()
+
 @app.get("/", tags=["Health"])
 async def root():
     return {"status": "ok", "message": "EduAgent API running"}
 
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    stats = {
+        "embedding_cache": query_cache.stats(),
+        "sessions": sessions.stats(),
+        "history_writer": history_writer.stats(),
+        "view_counter": view_counter.stats(),
+        "auth_cache": auth_cache.stats(),
+        "password_hashing": password_executor.stats(),
+        "taxonomy_cache": taxonomy_cache.stats(),
+        "trending": trending_feeds.stats(),
+        "article_search": article_index.stats(),
+    }
+    if qdrant_utils.embedding_client is not None:
+        try:
+            stats["embedding_service"] = await run_blocking(qdrant_utils.embedding_client.stats)
+        except Exception as e:
+            stats["embedding_service"] = {"error": str(e)}
+    return stats
+
+def gemini_history(history):
+    """Convertit l'historique sauvegardé en contenu Gemini (rôles user/model alternés)"""
+    contents = []
+    for entry in history:
+        role = "model" if entry.get("role") == "assistant" else "user"
+        text = entry.get("message") or ""
+        if contents and contents[-1]["role"] == role:
+            contents[-1]["parts"][0] += "\n\n" + text
+        else:
+            contents.append({"role": role, "parts": [text]})
+    if contents and contents[0]["role"] != "user":
+        contents.insert(0, {"role": "user", "parts": ["Let's continue the course."]})
+    return contents
+
 # APIAITutor wrapper
 class APIAITutor(AITutor):
     def __init__(self):
@@ -91,22 +182,153 @@ class APIAITutor(AITutor):
         self.last_response = ""
         self.last_segments = []
         self.history_id = None  # ← NOUVEAU: ID de l'historique dans MongoDB
+        # Identifiant de session remis au client : aléatoire, distinct de l'ID (public) de l'historique
+        self.session_token = new_session_token()
         self.history_persisted = False
+        self.status = "in_progress"
+        self.revision = 0  # révision du document MongoDB connue par ce worker
+        self.persisted_messages = 0  # messages de self.history déjà envoyés à MongoDB
+        self.persisted_fields = None  # status / current_part_index / state déjà envoyés
+        self.pending_write = None  # (Future, nb_messages, champs) de l'ajout en file non confirmé
+        # Sérialise les messages d'une même session (les handlers sont async)
+        self.lock = asyncio.Lock()
+
+    def _create_history(self, status):
+        """Première sauvegarde : crée le document (insertion bloquante)."""
+        self.history_id = save_full_history(self, status=status)
+        self.revision = 1
+        self.persisted_messages = len(self.history)
+        self.persisted_fields = {"status": status, "current_part_index": self.current_part_index, "state": self.state}
+        print(f"[History] Created with ID: {self.history_id}")
+
+    def _queue_append(self, status):
+        """
+        Met en file les messages pas encore écrits (file d'écriture groupée), à
+        condition que le document soit toujours à la révision connue ici.
+        Retourne (future, nb_messages, champs) de l'ajout, ou None s'il n'y a rien de nouveau.
+        """
+        messages = self.history[self.persisted_messages:]
+        fields = {"status": status, "current_part_index": self.current_part_index, "state": self.state}
+        if not messages and fields == self.persisted_fields:
+            # Rien de nouveau (sauvegarde à l'éviction ou à l'arrêt)
+            return None
+        written = history_writer.append(self.history_id, messages, fields, self.revision)
+        return written, len(self.history), fields
+
+    def _written(self, result, count, fields):
+        # Compteurs avancés seulement une fois l'ajout écrit : un ajout perdu repart au tour suivant
+        revision, rebased = result
+        self.persisted_messages = count
+        self.persisted_fields = fields
+        # Rebasé : un autre worker a écrit dans cet historique entre-temps. Nos messages
+        # sont à la suite des siens, mais absents d'ici : révision 0 = rechargement au prochain tour
+        self.revision = 0 if rebased else revision
+
+    def _history_deleted(self):
+        # Historique supprimé pendant la session : elle repart dans un nouveau document
+        print(f"[History] {self.history_id} was deleted, saving the session in a new history")
+        self.history_id = None
+        self.revision = 0
+        self.persisted_messages = 0
+        self.persisted_fields = None
 
     def save_to_db(self, status="in_progress"):
-        """Sauvegarde ou met à jour l'historique dans MongoDB"""
+        """
+        Version synchrone de save_to_db_async (hors boucle d'événements, ex.
+        persist_history) : attend l'écriture sur le thread appelant.
+        """
+        self.status = status
         try:
+            if self.pending_write is not None:
+                # Ajout précédent toujours en file : la suite partira après lui
+                self._written(self.pending_write[0].result(timeout=HISTORY_WRITE_TIMEOUT), *self.pending_write[1:])
+                self.pending_write = None
             if self.history_id is None:
-                # Première sauvegarde - créer un nouveau document
-                self.history_id = save_full_history(self, status=status)
-                print(f"[History] Created with ID: {self.history_id}")
-            else:
-                # Mise à jour du document existant
-                update_history(self.history_id, self, status=status)
-                print(f"[History] Updated ID: {self.history_id}")
+                self._create_history(status)
+                return
+            self.pending_write = self._queue_append(status)
+            if self.pending_write is not None:
+                self._written(self.pending_write[0].result(timeout=HISTORY_WRITE_TIMEOUT), *self.pending_write[1:])
+                self.pending_write = None
+        except HistoryDeleted:
+            self.pending_write = None
+            self._history_deleted()
+            self.save_to_db(status)
+        except FutureTimeout:
+            print(f"[History] Write of {self.history_id} still pending after {HISTORY_WRITE_TIMEOUT}s")
         except Exception as e:
+            self.pending_write = None
             print(f"[History] Save failed: {e}")
 
+    async def save_to_db_async(self, status="in_progress"):
+        """
+        Sauvegarde ou met à jour l'historique dans MongoDB. Après la création,
+        seuls les nouveaux messages sont ajoutés, via la file d'écriture groupée.
+        Le tour attend que l'ajout soit écrit (un autre worker qui reprend la
+        session relit alors un historique complet), sans occuper de thread du
+        pool : le Future de la file est attendu sur la boucle d'événements.
+        Un ajout toujours en file après HISTORY_WRITE_TIMEOUT reste en attente
+        (la file le réessaie) ; la sauvegarde suivante l'attend avant d'envoyer
+        la suite, qui part alors après lui.
+        """
+        self.status = status
+        if self.pending_write is not None and not await self._await_write():
+            return
+        try:
+            if self.history_id is None:
+                await run_blocking(self._create_history, status)
+                return
+            self.pending_write = self._queue_append(status)
+        except Exception as e:
+            print(f"[History] Save failed: {e}")
+            return
+        if self.pending_write is not None and await self._await_write() and self.history_id is None:
+            try:
+                await run_blocking(self._create_history, status)
+            except Exception as e:
+                print(f"[History] Save failed: {e}")
+
+    async def _await_write(self):
+        """Attend l'ajout en file (au plus HISTORY_WRITE_TIMEOUT). Retourne False s'il est toujours en attente."""
+        written, count, fields = self.pending_write
+        try:
+            # shield : l'expiration du délai ne doit pas annuler le Future de la file
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(written)), HISTORY_WRITE_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"[History] Write of {self.history_id} still pending after {HISTORY_WRITE_TIMEOUT}s")
+            return False
+        except HistoryDeleted:
+            self.pending_write = None
+            self._history_deleted()
+            return True
+        except Exception as e:
+            self.pending_write = None
+            print(f"[History] Save failed: {e}")
+            return True
+        self.pending_write = None
+        self._written(result, count, fields)
+        return True
+
+    @classmethod
+    def from_history(cls, doc):
+        """Reconstruit une session (et la conversation Gemini) depuis un historique MongoDB"""
+        tutor = cls()
+        tutor.topic = doc.get("topic")
+        tutor.plan = doc.get("plan") or []
+        tutor.history = doc.get("history") or []
+        tutor.current_part_index = doc.get("current_part_index", 0)
+        tutor.state = doc.get("state") or "Q_AND_A"
+        tutor.status = doc.get("status", "in_progress")
+        tutor.history_id = str(doc["_id"])
+        tutor.session_token = doc["session_token"]
+        tutor.revision = doc.get("revision", 0)
+        tutor.persisted_messages = len(tutor.history)
+        tutor.persisted_fields = {"status": tutor.status, "current_part_index": tutor.current_part_index, "state": tutor.state}
+        tutor.chat = tutor.model.start_chat(history=gemini_history(tutor.history))
+        if tutor.history and tutor.history[-1]["role"] == "assistant":
+            tutor.last_response = tutor.history[-1]["message"]
+        return tutor
+
     def persist_history(self, status="completed"):
         """Sauvegarde finale"""
         if not self.history_persisted:
@@ -116,7 +338,25 @@ class APIAITutor(AITutor):
             except Exception as e:
                 print(f"Warning: Failed to save history: {e}")
 
-    def generate_plan(self):
+    def teaching_prompt(self, part_index=None):
+        current_part = self.plan[self.current_part_index if part_index is None else part_index]
+        return (
+            f"You are an expert AI tutor teaching {self.topic} to a complete beginner. "
+            f"Explain the current part: '{current_part}' in a very simple and clear way. "
+            "Use analogies and real-world examples to make concepts easy to understand. "
+            "Avoid complex jargon where possible, or explain it simply if necessary. "
+            "Keep the tone encouraging and friendly. Focus only on this specific part."
+        )
+
+    def answer_prompt(self, question):
+        return (
+            f"The student, who is a beginner, has a question about the current part: {question}. "
+            "Answer the question simply and clearly, using examples if helpful. "
+            "Ensure the explanation is easy to grasp for someone with no prior knowledge. "
+            "Encourage them to continue learning."
+        )
+
+    async def generate_plan(self):
         prompt = (
             f"You are an expert AI tutor designed to help beginners. "
             f"Create a simple and structured course plan for the topic: {self.topic}. "
@@ -124,7 +364,7 @@ class APIAITutor(AITutor):
             "that cover the absolute basics in a logical order. "
             "Return ONLY the list of parts, one per line, numbered."
         )
-        response = self.model.generate_content(prompt)
+        response = await self.model.generate_content_async(prompt)
         lines = response.text.strip().split('\n')
         self.plan = [line.strip() for line in lines if line.strip()]
         
@@ -133,34 +373,31 @@ class APIAITutor(AITutor):
         self.chat = self.model.start_chat(history=[])
         
         # ✅ NOUVEAU: Sauvegarder dès que le plan est créé
-        self.save_to_db(status="in_progress")
+        await self.save_to_db_async(status="in_progress")
         
         return self.plan
 
-    def teach_current_part(self):
-        if self.current_part_index >= len(self.plan):
+    async def teach_current_part(self, advance=False):
+        """
+        Enseigne la partie courante (la suivante avec `advance`). L'index n'avance
+        qu'une fois la partie reçue : une erreur de Gemini ne fait pas sauter de partie.
+        """
+        part_index = self.current_part_index + 1 if advance else self.current_part_index
+        if part_index >= len(self.plan):
+            self.current_part_index = part_index
             self.state = "FINISHED"
             self.last_response = "Congratulations! You have completed the course."
             self.last_segments = []
             # ✅ Sauvegarder comme terminé
-            self.save_to_db(status="completed")
+            await self.save_to_db_async(status="completed")
             return
 
-        current_part = self.plan[self.current_part_index]
-        
-        prompt = (
-            f"You are an expert AI tutor teaching {self.topic} to a complete beginner. "
-            f"Explain the current part: '{current_part}' in a very simple and clear way. "
-            "Use analogies and real-world examples to make concepts easy to understand. "
-            "Avoid complex jargon where possible, or explain it simply if necessary. "
-            "Keep the tone encouraging and friendly. Focus only on this specific part."
-        )
-        
-        response = self.chat.send_message(prompt)
+        response = await self.chat.send_message_async(self.teaching_prompt(part_index))
+        self.current_part_index = part_index
         self.history.append({"role": "assistant", "message": response.text})
         
         # Process with image agent
-        self.last_segments = self.image_agent.process_explanation(response.text)
+        self.last_segments = await self.image_agent.process_explanation_async(response.text)
         
         # Build text response
         text_response = ""
@@ -172,38 +409,127 @@ class APIAITutor(AITutor):
         self.state = "Q_AND_A"
         
         # ✅ NOUVEAU: Sauvegarder après chaque partie
-        self.save_to_db(status="in_progress")
+        await self.save_to_db_async(status="in_progress")
 
-    def answer_question(self, question):
-        prompt = (
-            f"The student, who is a beginner, has a question about the current part: {question}. "
-            "Answer the question simply and clearly, using examples if helpful. "
-            "Ensure the explanation is easy to grasp for someone with no prior knowledge. "
-            "Encourage them to continue learning."
-        )
+    async def answer_question(self, question):
+        response = await self.chat.send_message_async(self.answer_prompt(question))
         self.history.append({"role": "user", "message": question})
-        response = self.chat.send_message(prompt)
         self.history.append({"role": "assistant", "message": response.text})
         
         self.last_response = response.text
         self.last_segments = [{'type': 'text', 'content': response.text}]
         
         # ✅ NOUVEAU: Sauvegarder après chaque réponse
-        self.save_to_db(status="in_progress")
+        await self.save_to_db_async(status="in_progress")
+
+    # ---------- Streaming (SSE) ----------
+
+    async def stream_current_part(self, advance=False):
+        """
+        Version streamée de teach_current_part : produit les segments (avec leur
+        `index` dans la liste finale) au fur et à mesure. Le texte part dès
+        réception (chaque événement `text` complète le segment `index`), les
+        images dès que leur recherche est résolue. L'index de partie et
+        l'historique ne changent qu'une fois le flux terminé : un client qui se
+        déconnecte ou une erreur de Gemini en cours de route laissent la session
+        telle qu'elle était.
+        """
+        part_index = self.current_part_index + 1 if advance else self.current_part_index
+        if part_index >= len(self.plan):
+            await self.teach_current_part(advance=advance)
+            return
+
+        prompt = f"{self.teaching_prompt(part_index)} {STREAM_MARKER_INSTRUCTIONS}"
+        response = await self.chat.send_message_async(prompt, stream=True)
+
+        parser = MarkerStreamParser()
+        segments = []
+        pending = {}
+
+        def handle(events):
+            for kind, value in events:
+                if kind == "text":
+                    # Les morceaux de texte consécutifs complètent le même segment
+                    if segments and segments[-1]["type"] == "text":
+                        segments[-1]["content"] += value
+                    else:
+                        segments.append({"type": "text", "content": value})
+                    yield {"index": len(segments) - 1, "type": "text", "content": value}
+                else:
+                    index = len(segments)
+                    print(f"[Image Agent] Searching for: {value}")
+                    segments.append({"type": "image", "query": value, "result": None})
+                    task = asyncio.create_task(run_blocking(find_best_image, value))
+                    pending[task] = index
+
+        def resolved(tasks):
+            for task in tasks:
+                index = pending.pop(task)
+                try:
+                    segments[index]["result"] = task.result()
+                except Exception as e:
+                    print(f"[Image Agent] Search failed: {e}")
+                yield {"index": index, **segments[index]}
+
+        try:
+            async for chunk in response:
+                for event in handle(parser.feed(chunk.text)):
+                    yield event
+                for event in resolved([t for t in pending if t.done()]):
+                    yield event
+            for event in handle(parser.close()):
+                yield event
+            while pending:
+                done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+                for event in resolved(done):
+                    yield event
+        finally:
+            for task in pending:
+                task.cancel()
+
+        text_response = "".join(seg["content"] for seg in segments if seg["type"] == "text")
+        self.current_part_index = part_index
+        self.history.append({"role": "assistant", "message": text_response})
+        self.last_segments = segments
+        self.last_response = text_response
+        self.state = "Q_AND_A"
+
+        await self.save_to_db_async(status="in_progress")
+
+    async def stream_answer(self, question):
+        """
+        Version streamée de answer_question (texte uniquement). La question n'entre
+        dans l'historique qu'avec sa réponse complète.
+        """
+        response = await self.chat.send_message_async(self.answer_prompt(question), stream=True)
+
+        text_response = ""
+        async for chunk in response:
+            text_response += chunk.text
+            yield {"index": 0, "type": "text", "content": chunk.text}
+
+        self.history.append({"role": "user", "message": question})
+        self.history.append({"role": "assistant", "message": text_response})
+        self.last_response = text_response
+        self.last_segments = [{'type': 'text', 'content': text_response}]
+
+        await self.save_to_db_async(status="in_progress")
 
 # Routes
 @app.post("/chat/start", tags=["Chat"])
 async def start_chat(request: StartRequest):
-    session_id = str(uuid.uuid4())
     tutor = APIAITutor()
-    sessions[session_id] = tutor
     
     tutor.topic = request.topic
     tutor.state = "PLANNING"
     tutor.history.append({"role": "user", "message": request.topic})
     
-    tutor.generate_plan()
-    tutor.teach_current_part()
+    async with tutor.lock:
+        await tutor.generate_plan()
+        # Le jeton est enregistré sur l'historique : la session peut être reprise sur n'importe quel worker
+        session_id = tutor.session_token
+        sessions.put(session_id, tutor)
+        await tutor.teach_current_part()
     
     return ChatResponse(
         message=tutor.last_response,
@@ -216,28 +542,28 @@ async def start_chat(request: StartRequest):
 
 @app.post("/chat/message", tags=["Chat"])
 async def send_message(request: MessageRequest):
-    if request.sessionId not in sessions:
+    tutor = await sessions.load(request.sessionId)
+    if tutor is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    tutor = sessions[request.sessionId]
     user_input = request.message
     
-    if user_input.lower() in ["stop", "quit", "exit"]:
-        tutor.save_to_db(status="stopped")
-        return ChatResponse(
-            message="Course stopped.",
-            sessionId=request.sessionId,
-            state="FINISHED",
-            topic=tutor.topic,
-            segments=[]
-        )
-    
-    if tutor.state == "Q_AND_A":
-        if user_input.lower() in ["next", "continue", "ok", "n"]:
-            tutor.current_part_index += 1
-            tutor.teach_current_part()
-        else:
-            tutor.answer_question(user_input)
+    async with tutor.lock:
+        if user_input.lower() in ["stop", "quit", "exit"]:
+            await tutor.save_to_db_async(status="stopped")
+            return ChatResponse(
+                message="Course stopped.",
+                sessionId=request.sessionId,
+                state="FINISHED",
+                topic=tutor.topic,
+                segments=[]
+            )
+        
+        if tutor.state == "Q_AND_A":
+            if user_input.lower() in ["next", "continue", "ok", "n"]:
+                await tutor.teach_current_part(advance=True)
+            else:
+                await tutor.answer_question(user_input)
     
     return ChatResponse(
         message=tutor.last_response,
@@ -247,13 +573,107 @@ async def send_message(request: MessageRequest):
         segments=tutor.last_segments
     )
 
+# Streaming (Server-Sent Events)
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def sse_response(generator):
+    return StreamingResponse(
+        generator,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def final_event(tutor, session_id, include_plan=False):
+    response = ChatResponse(
+        message=tutor.last_response,
+        sessionId=session_id,
+        state=tutor.state,
+        topic=tutor.topic,
+        plan=tutor.plan if include_plan else None,
+    )
+    return sse_event("done", response.model_dump(exclude={"segments"}))
+
+@app.post("/chat/start/stream", tags=["Chat"])
+async def start_chat_stream(request: StartRequest):
+    tutor = APIAITutor()
+
+    tutor.topic = request.topic
+    tutor.state = "PLANNING"
+    tutor.history.append({"role": "user", "message": request.topic})
+
+    async def events():
+        async with tutor.lock:
+            try:
+                await tutor.generate_plan()
+                session_id = tutor.session_token
+                sessions.put(session_id, tutor)
+                async for segment in tutor.stream_current_part():
+                    yield sse_event("segment", segment)
+            except Exception as e:
+                print(f"[Stream] start failed: {e}")
+                yield sse_event("error", {"detail": str(e)})
+                return
+            yield final_event(tutor, session_id, include_plan=True)
+
+    return sse_response(events())
+
+@app.post("/chat/message/stream", tags=["Chat"])
+async def send_message_stream(request: MessageRequest):
+    tutor = await sessions.load(request.sessionId)
+    if tutor is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    user_input = request.message
+
+    async def events():
+        async with tutor.lock:
+            if user_input.lower() in ["stop", "quit", "exit"]:
+                await tutor.save_to_db_async(status="stopped")
+                tutor.last_response = "Course stopped."
+                tutor.state = "FINISHED"
+                yield final_event(tutor, request.sessionId)
+                return
+
+            try:
+                if tutor.state == "Q_AND_A":
+                    if user_input.lower() in ["next", "continue", "ok", "n"]:
+                        stream = tutor.stream_current_part(advance=True)
+                    else:
+                        stream = tutor.stream_answer(user_input)
+                    async for segment in stream:
+                        yield sse_event("segment", segment)
+            except Exception as e:
+                print(f"[Stream] message failed: {e}")
+                yield sse_event("error", {"detail": str(e)})
+                return
+            yield final_event(tutor, request.sessionId, include_plan=True)
+
+    return sse_response(events())
+
 @app.get("/chat/history", tags=["History"])
-async def get_history_list():
-    return list_histories(limit=100)
+async def get_history_list(limit: int = 100, skip: int = 0, cursor: Optional[str] = None):
+    # Résumés (topic, status, part_count, dates) ; le détail complet est sur /chat/history/{id}
+    # Avec `cursor` (vide pour la première page) : pagination par clé sur (updated_at, _id)
+    limit = max(1, min(limit, 100))
+    if cursor is None:
+        return await async_mongo.list_histories(limit=limit, skip=skip)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    histories, next_cursor = await async_mongo.list_histories_page(limit=limit, cursor=after)
+    return {"histories": histories, "next_cursor": next_cursor}
 
 @app.get("/chat/history/{history_id}", tags=["History"])
-async def get_history_entry(history_id: str):
-    doc = get_history_by_id(history_id)
+async def get_history_entry(history_id: str, fields: Optional[str] = None):
+    # `fields=topic,status,...` pour ne récupérer qu'une partie du document
+    try:
+        selected = parse_fields(fields, async_mongo.HISTORY_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await run_blocking(history_writer.flush, history_id)
+    doc = await async_mongo.get_history_by_id(history_id, fields=selected)
     if not doc:
         raise HTTPException(status_code=404, detail="History not found")
     return doc
@@ -0,0 +1,255 @@
+import asyncio
+import os
+import secrets
+import time
+from collections import OrderedDict
+
+import async_mongo
+from history_writer import history_writer
+from utils.executors import run_blocking
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+# "mongo" : sessions reprises depuis les historiques sur n'importe quel worker ; "memory" : worker local uniquement
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "mongo").lower()
+SESSION_TOKEN_MAX_LENGTH = 128
+
+
+# =====================================================
+# BACKENDS
+# =====================================================
+
+class SessionBackend:
+    """Stockage partagé des sessions. Le backend par défaut ne partage rien."""
+
+    async def load(self, session_id):
+        return None
+
+    async def revision(self, session_id):
+        return None
+
+
+class MongoSessionBackend(SessionBackend):
+    """
+    Sessions persistées dans `histories`. La clé de session est un jeton aléatoire
+    stocké sur l'historique (`session_token`), jamais renvoyé par les routes
+    d'historique : connaître l'ID public d'un historique ne permet pas d'y écrire.
+    `rehydrate(doc)` reconstruit un tuteur (et sa conversation Gemini) depuis le document.
+    """
+
+    def __init__(self, rehydrate):
+        self.rehydrate = rehydrate
+
+    async def load(self, session_id):
+        if not valid_token(session_id):
+            return None
+        doc = await async_mongo.get_history_by_session(session_id)
+        if not doc:
+            return None
+        # Les écritures différées de ce worker doivent être visibles avant la reprise
+        if await run_blocking(history_writer.flush, doc["_id"]):
+            doc = await async_mongo.get_history_by_session(session_id)
+        return self.rehydrate(doc)
+
+    async def revision(self, session_id):
+        if not valid_token(session_id):
+            return None
+        return await async_mongo.get_session_revision(session_id)
+
+
+def new_session_token():
+    return secrets.token_urlsafe(32)
+
+
+def valid_token(session_id):
+    return isinstance(session_id, str) and 0 < len(session_id) <= SESSION_TOKEN_MAX_LENGTH
+
+
+def create_backend(rehydrate):
+    if SESSION_BACKEND == "mongo":
+        return MongoSessionBackend(rehydrate)
+    return SessionBackend()
+
+
+class SessionStore:
+    """
+    Sessions du tuteur en mémoire, bornées : taille maximale (éviction LRU),
+    TTL d'inactivité et balayage périodique en tâche de fond.
+    Chaque session évincée est sauvegardée dans MongoDB ; une requête qui la
+    redemande pendant cette sauvegarde attend qu'elle soit terminée avant de la
+    recharger. Une session absente (autre worker, redémarrage) ou modifiée
+    ailleurs est rechargée depuis le backend. À l'arrêt, toutes les sessions
+    encore en mémoire sont sauvegardées.
+    """
+
+    def __init__(self, backend=None, max_sessions=SESSION_MAX, idle_ttl=SESSION_IDLE_TTL, sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.backend = backend or SessionBackend()
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.sessions = OrderedDict()  # session_id -> (tutor, last_access)
+        self.sweeper = None
+        self.evicting = {}  # session_id -> tâche de sauvegarde de la session évincée
+        self.loading = {}  # session_id -> rechargement en cours, partagé par les requêtes concurrentes
+        self.created = 0
+        self.rehydrated = 0
+        self.stale_reloads = 0
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+        self.flush_failures = 0
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def get(self, session_id):
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            return None
+        tutor, last_access = entry
+        now = time.monotonic()
+        if now - last_access > self.idle_ttl and not tutor.lock.locked():
+            self._evict(session_id, reason="idle")
+            return None
+        self.sessions[session_id] = (tutor, now)
+        self.sessions.move_to_end(session_id)
+        return tutor
+
+    async def load(self, session_id):
+        """
+        Comme get, mais recharge la session depuis le backend si elle est absente
+        ou périmée. Un seul rechargement par session à la fois : les requêtes
+        concurrentes obtiennent le même tuteur (et donc le même verrou).
+        """
+        tutor = self.get(session_id)
+        if tutor is not None:
+            try:
+                revision = await self.backend.revision(session_id)
+            except Exception as e:
+                print(f"[Sessions] Revision check failed: {e}")
+                return tutor
+            if revision is None or revision <= tutor.revision:
+                return tutor
+            current = self.get(session_id)
+            if current is not None and current is not tutor:
+                # Déjà rechargée par une requête concurrente
+                return current
+            # Un autre worker a fait avancer cette session
+            self.stale_reloads += 1
+
+        loading = self.loading.get(session_id)
+        if loading is None:
+            loading = asyncio.get_running_loop().create_task(self._rehydrate(session_id))
+            self.loading[session_id] = loading
+            loading.add_done_callback(lambda done: self.loading.pop(session_id, None))
+        return await asyncio.shield(loading)
+
+    async def _rehydrate(self, session_id):
+        evicting = self.evicting.get(session_id)
+        if evicting is not None:
+            # Ses derniers messages doivent être dans MongoDB avant la relecture
+            await asyncio.shield(evicting)
+
+        try:
+            tutor = await self.backend.load(session_id)
+        except Exception as e:
+            print(f"[Sessions] Rehydration failed: {e}")
+            return None
+        if tutor is not None:
+            self.put(session_id, tutor, rehydrated=True)
+            print(f"[Sessions] Rehydrated session of history {getattr(tutor, 'history_id', None)}")
+        return tutor
+
+    def put(self, session_id, tutor, rehydrated=False):
+        self.sessions[session_id] = (tutor, time.monotonic())
+        self.sessions.move_to_end(session_id)
+        if rehydrated:
+            self.rehydrated += 1
+        else:
+            self.created += 1
+        # Éviction LRU (les sessions en cours de traitement sont épargnées)
+        for candidate in list(self.sessions):
+            if len(self.sessions) <= self.max_sessions:
+                break
+            if candidate != session_id and not self.sessions[candidate][0].lock.locked():
+                self._evict(candidate, reason="lru")
+
+    def _evict(self, session_id, reason):
+        tutor, _ = self.sessions.pop(session_id)
+        if reason == "idle":
+            self.evicted_idle += 1
+        else:
+            self.evicted_lru += 1
+        # Le jeton de session est un secret : on journalise l'ID de l'historique
+        print(f"[Sessions] Evicted session of history {getattr(tutor, 'history_id', None)} ({reason})")
+        task = asyncio.get_running_loop().create_task(self._flush(tutor))
+        self.evicting[session_id] = task
+        task.add_done_callback(lambda done: self._flushed(session_id, done))
+
+    def _flushed(self, session_id, task):
+        if self.evicting.get(session_id) is task:
+            del self.evicting[session_id]
+
+    async def _flush(self, tutor):
+        try:
+            async with tutor.lock:
+                await tutor.save_to_db_async(status=tutor.status)
+        except Exception as e:
+            self.flush_failures += 1
+            print(f"[Sessions] Flush failed: {e}")
+
+    def sweep(self):
+        now = time.monotonic()
+        expired = [
+            session_id for session_id, (tutor, last_access) in self.sessions.items()
+            if now - last_access > self.idle_ttl and not tutor.lock.locked()
+        ]
+        for session_id in expired:
+            self._evict(session_id, reason="idle")
+        return len(expired)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[Sessions] Sweep failed: {e}")
+
+    def start(self):
+        if self.sweeper is None:
+            self.sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def stop(self):
+        """Arrête le balayage et sauvegarde les sessions en mémoire et celles en cours d'éviction (shutdown)."""
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+            self.sweeper = None
+        live = [tutor for tutor, _ in self.sessions.values()]
+        self.sessions.clear()
+        await asyncio.gather(
+            *(self._flush(tutor) for tutor in live),
+            *self.evicting.values(),
+            return_exceptions=True,
+        )
+
+    def stats(self):
+        return {
+            "live": len(self.sessions),
+            "max": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "backend": type(self.backend).__name__,
+            "created": self.created,
+            "rehydrated": self.rehydrated,
+            "stale_reloads": self.stale_reloads,
+            "evicted_lru": self.evicted_lru,
+            "evicted_idle": self.evicted_idle,
+            "flush_failures": self.flush_failures,
+        }
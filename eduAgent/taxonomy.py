@@ -0,0 +1,136 @@
+"""
+Category and tag counts of the blog, maintained in the `taxonomy` collection.
+
+Counts are updated incrementally when an article is created, updated or deleted,
+and served from an in-memory cache refreshed every TAXONOMY_CACHE_TTL seconds.
+The collection can be rebuilt from the articles (done at startup when it is
+empty, or on demand):
+
+    python taxonomy.py --rebuild
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import async_mongo
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+TAXONOMY_CACHE_TTL = float(os.getenv("TAXONOMY_CACHE_TTL", "30"))
+KINDS = ("category", "tags")
+
+
+def article_terms(article) -> set:
+    """Clés de taxonomie d'un article : ("category", nom) et une par tag distinct."""
+    if not article:
+        return set()
+    terms = set()
+    if article.get("category"):
+        terms.add(("category", article["category"]))
+    for tag in article.get("tags") or []:
+        terms.add(("tags", tag))
+    return terms
+
+
+def taxonomy_deltas(old_article=None, new_article=None) -> dict:
+    """Variations de compteurs entre deux versions d'un article (None = inexistant)."""
+    old_terms = article_terms(old_article)
+    new_terms = article_terms(new_article)
+    deltas = {term: 1 for term in new_terms - old_terms}
+    deltas.update({term: -1 for term in old_terms - new_terms})
+    return deltas
+
+
+class TaxonomyCache:
+    """Copie en mémoire de la collection `taxonomy`, relue au plus toutes les `ttl` secondes."""
+
+    def __init__(self, ttl=TAXONOMY_CACHE_TTL):
+        self.ttl = ttl
+        self.data = None
+        self.loaded_at = 0.0
+        self.lock = asyncio.Lock()
+        self.hits = 0
+        self.refreshes = 0
+
+    async def get(self):
+        """{"category": [(nom, nombre), ...], "tags": [...]}, triés par popularité."""
+        if self.data is not None and time.monotonic() - self.loaded_at < self.ttl:
+            self.hits += 1
+            return self.data
+        async with self.lock:
+            if self.data is None or time.monotonic() - self.loaded_at >= self.ttl:
+                docs = await async_mongo.list_taxonomy()
+                data = {kind: [] for kind in KINDS}
+                for doc in docs:
+                    if doc.get("count", 0) > 0 and doc.get("kind") in data:
+                        data[doc["kind"]].append((doc["name"], doc["count"]))
+                for entries in data.values():
+                    entries.sort(key=lambda entry: (-entry[1], entry[0]))
+                self.data = data
+                self.loaded_at = time.monotonic()
+                self.refreshes += 1
+            return self.data
+
+    def invalidate(self):
+        self.data = None
+
+    def stats(self):
+        return {
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "categories": len(self.data["category"]) if self.data else None,
+            "tags": len(self.data["tags"]) if self.data else None,
+        }
+
+
+taxonomy_cache = TaxonomyCache()
+
+
+async def record_change(old_article=None, new_article=None):
+    """Répercute la création / modification / suppression d'un article sur les compteurs."""
+    deltas = taxonomy_deltas(old_article, new_article)
+    if not deltas:
+        return
+    try:
+        await async_mongo.apply_taxonomy_deltas(deltas)
+    except Exception as e:
+        # Les compteurs dérivent jusqu'au prochain `python taxonomy.py --rebuild`
+        print(f"[Taxonomy] ✗ Update failed: {e}")
+        return
+    taxonomy_cache.invalidate()
+
+
+async def ensure_taxonomy():
+    """
+    Construit la collection au premier démarrage (articles existants, taxonomie vide).
+    Plusieurs workers peuvent la construire en même temps : chaque reconstruction
+    remplace la collection entière, d'un seul coup.
+    """
+    if not await async_mongo.taxonomy_is_empty():
+        return
+    count = await async_mongo.rebuild_taxonomy()
+    print(f"[Taxonomy] ✓ Built {count} entries from existing articles")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the category/tag counts from the articles.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every count from the articles")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    async def rebuild():
+        count = await async_mongo.rebuild_taxonomy()
+        print(f"[Taxonomy] ✓ Rebuilt {count} entries")
+        await async_mongo.close()
+
+    asyncio.run(rebuild())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import sys
+import types
+
+# async_mongo (via mongo.py) se connecte à MongoDB dès l'import : les tests
+# unitaires le remplacent par un module vide, complété au besoin par monkeypatch
+sys.modules.setdefault("async_mongo", types.ModuleType("async_mongo"))
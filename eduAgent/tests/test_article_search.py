@@ -0,0 +1,148 @@
+import sys
+import types
+from datetime import datetime
+
+from bson import ObjectId
+
+import article_search
+from article_search import ArticleIndexQueue, chunk_article, chunk_point_id
+
+
+def words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_short_article_is_one_chunk_with_title():
+    assert chunk_article({"title": " Intro ", "content": "a b c"}) == ["Intro\na b c"]
+
+
+def test_chunks_overlap_and_cover_every_word():
+    chunks = chunk_article({"content": words(25)}, words_per_chunk=10, overlap=4)
+    assert [chunk.split()[0] for chunk in chunks] == ["w0", "w6", "w12", "w18"]
+    assert all(len(chunk.split()) <= 10 for chunk in chunks)
+    assert chunks[-1].split()[-1] == "w24"
+    # Les 4 derniers mots d'un morceau ouvrent le suivant
+    assert chunks[0].split()[-4:] == chunks[1].split()[:4]
+
+
+def test_empty_article():
+    assert chunk_article({"title": "", "content": ""}) == []
+    assert chunk_article({"title": "Only title"}) == ["Only title"]
+
+
+def test_overlap_larger_than_window_still_advances():
+    chunks = chunk_article({"content": words(5)}, words_per_chunk=2, overlap=5)
+    assert len(chunks) == 4
+
+
+def test_chunk_point_ids_are_stable_and_distinct():
+    assert chunk_point_id("a1", 0) == chunk_point_id("a1", 0)
+    assert len({chunk_point_id("a1", 0), chunk_point_id("a1", 1), chunk_point_id("a2", 0)}) == 3
+
+
+class FakeArticles:
+    """Collection `articles` réduite à ce qu'utilisent process / sweep."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def write(self, article_id, **fields):
+        self.docs[article_id] = {"_id": article_id, **fields, "search_pending": ObjectId()}
+
+    def module(self):
+        mongo = types.ModuleType("mongo")
+
+        def get_articles_for_index(ids):
+            return [dict(self.docs[article_id]) for article_id in ids if article_id in self.docs]
+
+        def mark_articles_indexed(articles):
+            for article in articles:
+                doc = self.docs.get(article["_id"])
+                if doc is not None and doc.get("search_pending") == article.get("search_pending"):
+                    doc.pop("search_pending")
+
+        def list_pending_article_ids(marked_before):
+            bound = ObjectId.from_datetime(marked_before)
+            return [article_id for article_id, doc in self.docs.items() if doc.get("search_pending", bound) < bound]
+
+        def mark_all_articles_pending():
+            for doc in self.docs.values():
+                doc["search_pending"] = ObjectId.from_datetime(datetime(1970, 1, 1))
+            return len(self.docs)
+
+        mongo.get_articles_for_index = get_articles_for_index
+        mongo.mark_all_articles_pending = mark_all_articles_pending
+        mongo.mark_articles_indexed = mark_articles_indexed
+        mongo.list_pending_article_ids = list_pending_article_ids
+        return mongo
+
+
+def setup_queue(monkeypatch, articles, **kwargs):
+    indexed, deleted = [], []
+    monkeypatch.setitem(sys.modules, "mongo", articles.module())
+    monkeypatch.setattr(article_search, "collection_ready", True)
+    monkeypatch.setattr(article_search, "index_articles", lambda docs: indexed.extend(d["_id"] for d in docs) or len(docs))
+    monkeypatch.setattr(article_search, "delete_articles", deleted.extend)
+    return ArticleIndexQueue(**kwargs), indexed, deleted
+
+
+def test_indexing_clears_pending_marker(monkeypatch):
+    articles = FakeArticles()
+    articles.write("a1", title="T", content="x")
+    queue, indexed, deleted = setup_queue(monkeypatch, articles)
+    queue.enqueue("a1")
+    queue.enqueue("gone", op="delete")
+    assert queue.drain() == 2
+    assert indexed == ["a1"] and deleted == ["gone"]
+    assert "search_pending" not in articles.docs["a1"]
+
+
+def test_marker_of_a_newer_version_is_kept(monkeypatch):
+    articles = FakeArticles()
+    articles.write("a1", content="v1")
+    queue, indexed, _ = setup_queue(monkeypatch, articles)
+    read = sys.modules["mongo"].get_articles_for_index(["a1"])
+    articles.write("a1", content="v2")  # modifié pendant l'encodage
+    sys.modules["mongo"].mark_articles_indexed(read)
+    assert "search_pending" in articles.docs["a1"]
+
+
+def test_sweep_requeues_work_lost_by_a_stopped_worker(monkeypatch):
+    articles = FakeArticles()
+    articles.write("old", content="x")
+    articles.docs["old"]["search_pending"] = ObjectId.from_datetime(datetime(2020, 1, 1))
+    articles.write("recent", content="y")
+    queue, indexed, _ = setup_queue(monkeypatch, articles, sweep_interval=60)
+    queue.enqueue("queued")
+    assert queue.sweep() == 1
+    assert list(queue.pending) == ["queued", "old"]
+    queue.drain()
+    assert indexed == ["old"]
+    assert queue.sweep() == 0
+
+
+def test_sweep_waits_for_the_collection(monkeypatch):
+    articles = FakeArticles()
+    articles.write("old", content="x")
+    queue, _, _ = setup_queue(monkeypatch, articles, sweep_interval=0)
+    monkeypatch.setattr(article_search, "collection_ready", False)
+    assert queue.sweep() == 0
+
+
+def test_backfill_survives_a_stopped_worker(monkeypatch):
+    articles = FakeArticles()
+    for article_id in ("a1", "a2", "a3"):
+        articles.write(article_id, content=article_id)
+        articles.docs[article_id].pop("search_pending")
+    queue, indexed, _ = setup_queue(monkeypatch, articles, batch_size=2, sweep_interval=60)
+    assert queue.backfill() == 3
+    assert list(queue.pending) == ["a1", "a2", "a3"]
+
+    # Arrêté après un lot : le worker suivant reprend les articles encore marqués
+    queue.process(queue._take())
+    assert indexed == ["a1", "a2"]
+    restarted = ArticleIndexQueue(sweep_interval=60)
+    assert restarted.sweep() == 1
+    restarted.drain()
+    assert indexed == ["a1", "a2", "a3"]
+    assert not any("search_pending" in doc for doc in articles.docs.values())
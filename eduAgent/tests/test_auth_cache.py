@@ -0,0 +1,59 @@
+import asyncio
+
+import async_mongo
+import auth_cache
+from auth_cache import TTLCache
+from routes import auth
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth_cache.time, "time", clock)
+    cache = TTLCache(ttl=60)
+    cache.put("user", {"email": "a@b.c"})
+    cache.put("token", {"sub": "user"}, expires_at=clock.now + 5)
+
+    clock.now += 10
+    assert cache.get("token") is None
+    assert cache.get("user") == {"email": "a@b.c"}
+    clock.now += 60
+    assert cache.get("user") is None
+    assert not cache.entries
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_size_is_bounded_by_least_recent_use():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.get("b") is None
+
+
+def test_current_user_is_a_copy_of_the_cached_one(monkeypatch):
+    reads = []
+
+    async def get_user_by_id(user_id):
+        reads.append(user_id)
+        return {"_id": user_id, "email": "a@b.c"}
+
+    monkeypatch.setattr(async_mongo, "get_user_by_id", get_user_by_id, raising=False)
+    monkeypatch.setattr(auth, "principal_cache", TTLCache(ttl=60))
+    monkeypatch.setattr(auth, "token_cache", TTLCache())
+    token = auth.create_access_token({"sub": "u1"})
+
+    user = asyncio.run(auth.get_current_user(token))
+    user["email"] = "changed@b.c"
+    again = asyncio.run(auth.get_current_user(token))
+    assert again["email"] == "a@b.c"
+    assert reads == ["u1"]
@@ -0,0 +1,86 @@
+import numpy as np
+
+from embedding_cache import DiskEmbeddingStore, EmbeddingCache, normalize_query
+
+DIM = 4
+
+
+def vec(value):
+    return np.full(DIM, value, dtype=np.float32)
+
+
+def test_normalize_query():
+    assert normalize_query("  Neural   NETWORK\n") == "neural network"
+
+
+def test_encode_only_sends_missing_normalized_texts():
+    calls = []
+
+    def encoder(texts):
+        calls.append(list(texts))
+        return [vec(len(text)) for text in texts]
+
+    cache = EmbeddingCache(max_size=10, disk_dir=None, dim=DIM)
+    first = cache.encode(["Cat", "dog", "cat "], encoder)
+    assert calls == [["cat", "dog"]]
+    assert first.shape == (3, DIM)
+    np.testing.assert_array_equal(first[0], first[2])
+
+    cache.encode(["DOG", "bird"], encoder)
+    assert calls[-1] == ["bird"]
+    assert cache.stats()["hits"] >= 1
+
+
+def test_memory_lru_is_bounded():
+    cache = EmbeddingCache(max_size=2, disk_dir=None, dim=DIM)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, vec(i))
+    assert cache.get("a") is None
+    np.testing.assert_array_equal(cache.get("c"), vec(2))
+
+
+def test_disk_store_survives_restart(tmp_path):
+    store = DiskEmbeddingStore(tmp_path, dim=DIM)
+    store.put("a", vec(1))
+    store.put("b", vec(2))
+
+    reopened = DiskEmbeddingStore(tmp_path, dim=DIM)
+    assert len(reopened) == 2
+    np.testing.assert_array_equal(reopened.get("b"), vec(2))
+
+
+def test_disk_store_shared_by_two_processes(tmp_path):
+    # Two instances on one directory stand for two uvicorn workers
+    first = DiskEmbeddingStore(tmp_path, dim=DIM)
+    second = DiskEmbeddingStore(tmp_path, dim=DIM)
+    first.put("a", vec(1))
+    second.put("b", vec(2))
+    first.put("c", vec(3))
+    second.put("a", vec(9))  # already written by the other worker: ignored
+
+    for store in (first, second):
+        for key, value in (("a", 1), ("b", 2), ("c", 3)):
+            np.testing.assert_array_equal(store.get(key), vec(value))
+
+    # A worker starting later neither rewrites nor misaligns the shared files
+    third = DiskEmbeddingStore(tmp_path, dim=DIM)
+    second.put("d", vec(4))
+    np.testing.assert_array_equal(third.get("d"), vec(4))
+    np.testing.assert_array_equal(first.get("d"), vec(4))
+    assert len(third) == 4
+
+
+def test_disk_store_repairs_a_torn_append(tmp_path):
+    store = DiskEmbeddingStore(tmp_path, dim=DIM)
+    store.put("a", vec(1))
+    # Crash after the vector was written, before its key
+    with open(store.vectors_path, "ab") as f:
+        f.write(vec(7).tobytes()[:6])
+    with open(store.keys_path, "ab") as f:
+        f.write(b'"half')
+
+    reopened = DiskEmbeddingStore(tmp_path, dim=DIM)
+    reopened.put("b", vec(2))
+    np.testing.assert_array_equal(reopened.get("a"), vec(1))
+    np.testing.assert_array_equal(reopened.get("b"), vec(2))
+    np.testing.assert_array_equal(DiskEmbeddingStore(tmp_path, dim=DIM).get("b"), vec(2))
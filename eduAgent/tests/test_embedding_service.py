@@ -0,0 +1,58 @@
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+import embedding_service
+from embedding_service import EmbeddingServer, EmbeddingServiceClient, is_loopback, parse_address
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("localhost:6100", True),
+    ("127.0.0.1:6100", True),
+    ("[::1]:6100", True),
+    ("/tmp/embeddings.sock", True),
+    ("0.0.0.0:6100", False),
+    ("10.0.0.5:6100", False),
+    ("embeddings.internal:6100", False),
+])
+def test_is_loopback(address, expected):
+    assert is_loopback(parse_address(address)) is expected
+
+
+def test_authkey_is_required(monkeypatch):
+    monkeypatch.setattr(embedding_service, "EMBEDDING_SERVICE_AUTHKEY", None)
+    with pytest.raises(RuntimeError):
+        EmbeddingServiceClient("localhost:6100")
+    with pytest.raises(RuntimeError):
+        EmbeddingServer(lambda texts: texts).serve_forever("localhost:6100")
+
+
+def test_refuses_non_loopback_address(monkeypatch):
+    monkeypatch.setattr(embedding_service, "EMBEDDING_SERVICE_AUTHKEY", "secret")
+    with pytest.raises(RuntimeError):
+        EmbeddingServer(lambda texts: texts).serve_forever("0.0.0.0:6100")
+
+
+def test_encode_round_trip(monkeypatch):
+    monkeypatch.setattr(embedding_service, "EMBEDDING_SERVICE_AUTHKEY", "secret")
+    server = EmbeddingServer(lambda texts: [[float(len(text))] * 3 for text in texts], max_wait_ms=1)
+    address = f"127.0.0.1:{free_port()}"
+    threading.Thread(target=server.serve_forever, args=(address,), daemon=True).start()
+
+    client = EmbeddingServiceClient(address)
+    for _ in range(50):
+        try:
+            vectors = client.encode(["a", "abc"])
+            break
+        except (ConnectionRefusedError, OSError):
+            threading.Event().wait(0.05)
+    np.testing.assert_array_equal(vectors, [[1.0] * 3, [3.0] * 3])
+    assert client.stats()["texts"] == 2
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.executors import PasswordExecutor, PasswordQueueFull
+
+
+def test_cancelled_call_keeps_its_slot_until_the_job_ends():
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    async def scenario():
+        executor = PasswordExecutor(kind="thread", workers=1, queue_max=10)
+        try:
+            first = asyncio.create_task(executor.run(slow))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            assert executor.semaphore.locked()
+            assert executor.running == 1
+
+            # Le hachage annulé tourne encore : le suivant attend sa place
+            second = asyncio.create_task(executor.run(lambda: "next"))
+            await asyncio.sleep(0.05)
+            assert not second.done()
+            assert executor.running == 1
+
+            release.set()
+            assert await asyncio.wait_for(second, 5) == "next"
+            assert executor.running == 0
+            assert executor.completed == 2
+        finally:
+            release.set()
+            executor.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_queue_full():
+    async def scenario():
+        executor = PasswordExecutor(kind="thread", workers=1, queue_max=0)
+        with pytest.raises(PasswordQueueFull):
+            await executor.run(lambda: None)
+        assert executor.rejected == 1
+
+    asyncio.run(scenario())
+
+
+def test_process_pool_runs_importable_function():
+    from utils.passwords import hash_password, verify_password
+
+    async def scenario():
+        executor = PasswordExecutor(kind="process", workers=1)
+        try:
+            hashed = await executor.run(hash_password, "secret")
+            assert await executor.run(verify_password, "secret", hashed)
+        finally:
+            executor.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,116 @@
+import sys
+import types
+
+import pytest
+
+from history_writer import HistoryDeleted, HistoryWriteBehind
+
+
+class FakeHistories:
+    """Collection `histories` en mémoire, avec la sémantique de mongo.bulk_append_histories."""
+
+    def __init__(self):
+        self.docs = {}
+        self.lose_next_response = False
+
+    def bulk_append_histories(self, updates):
+        matched = 0
+        for history_id, messages, fields, expected, revisions, write_id in updates:
+            doc = self.docs.get(history_id)
+            if doc is not None and doc["revision"] == expected:
+                doc["history"].extend(messages)
+                doc.update(fields)
+                doc["revision"] += revisions
+                doc["writes"] = (doc["writes"] + [write_id])[-20:]
+                matched += 1
+        if self.lose_next_response:
+            self.lose_next_response = False
+            raise ConnectionError("connection reset")
+        # Comme matched_count : on sait seulement qu'au moins un ajout n'a rien trouvé
+        if matched < len(updates):
+            return {update[0] for update in updates}, set()
+        return set(), set()
+
+    def get_history_write_states(self, history_ids):
+        return {hid: (self.docs[hid]["revision"], list(self.docs[hid]["writes"])) for hid in history_ids if hid in self.docs}
+
+
+@pytest.fixture
+def histories(monkeypatch):
+    fake = FakeHistories()
+    module = types.ModuleType("mongo")
+    module.bulk_append_histories = fake.bulk_append_histories
+    module.get_history_write_states = fake.get_history_write_states
+    monkeypatch.setitem(sys.modules, "mongo", module)
+    fake.docs["h1"] = {"history": [{"role": "user", "message": "topic"}], "revision": 1, "writes": []}
+    return fake
+
+
+def turn(label):
+    return [{"role": "user", "message": f"{label}?"}, {"role": "assistant", "message": f"{label}!"}]
+
+
+def test_append_is_written_with_the_next_revision(histories):
+    writer = HistoryWriteBehind()
+    written = writer.append("h1", turn("a"), {"state": "Q_AND_A"}, revision=1)
+    assert writer.flush() == 1
+    assert written.result(timeout=0) == (2, False)
+    assert histories.docs["h1"]["history"][1:] == turn("a")
+    assert histories.docs["h1"]["state"] == "Q_AND_A"
+
+
+def test_appends_of_one_history_are_written_in_order(histories):
+    writer = HistoryWriteBehind()
+    first = writer.append("h1", turn("a"), {}, revision=1)
+    second = writer.append("h1", turn("b"), {}, revision=2)
+    writer.flush()
+    assert first.result(timeout=0) == (2, False)
+    assert second.result(timeout=0) == (3, False)
+    assert histories.docs["h1"]["history"][1:] == turn("a") + turn("b")
+
+
+def test_concurrent_turns_from_two_workers_stay_contiguous(histories):
+    worker_a, worker_b = HistoryWriteBehind(), HistoryWriteBehind()
+    # Les deux workers ont repris la session à la révision 1
+    written_a = worker_a.append("h1", turn("a"), {}, revision=1)
+    written_b = worker_b.append("h1", turn("b"), {}, revision=1)
+    worker_a.flush()
+    worker_b.flush()
+
+    assert written_a.result(timeout=0) == (2, False)
+    # Refusé puis réappliqué à la suite : le tuteur de B devra recharger la session
+    assert written_b.result(timeout=0) == (3, True)
+    assert histories.docs["h1"]["history"][1:] == turn("a") + turn("b")
+    assert worker_b.conflicts == 1
+
+
+def test_replay_after_a_lost_response_does_not_duplicate(histories):
+    writer = HistoryWriteBehind()
+    written = writer.append("h1", turn("a"), {}, revision=1)
+    histories.lose_next_response = True
+    assert writer.flush() == 0
+    assert writer.failures == 1 and not written.done()
+
+    writer.flush()
+    assert written.result(timeout=0) == (2, False)
+    assert histories.docs["h1"]["history"][1:] == turn("a")
+
+
+def test_append_to_a_deleted_history_fails(histories):
+    writer = HistoryWriteBehind()
+    written = writer.append("gone", turn("a"), {}, revision=3)
+    writer.flush()
+    with pytest.raises(HistoryDeleted):
+        written.result(timeout=0)
+
+
+def test_unmatched_batch_tells_applied_from_conflicting(histories):
+    histories.docs["h2"] = {"history": [], "revision": 4, "writes": []}
+    writer = HistoryWriteBehind()
+    applied = writer.append("h1", turn("a"), {}, revision=1)
+    stale = writer.append("h2", turn("b"), {}, revision=2)
+    writer.flush()
+    assert applied.result(timeout=0) == (2, False)
+    assert stale.result(timeout=0) == (5, True)
+    assert histories.docs["h2"]["history"] == turn("b")
+    assert writer.conflicts == 1
@@ -0,0 +1,56 @@
+import pytest
+
+from utils.hyperloglog import HyperLogLog
+
+
+def sketch(items):
+    hll = HyperLogLog()
+    for item in items:
+        hll.add(item)
+    return hll
+
+
+def test_empty_sketch():
+    hll = HyperLogLog()
+    assert not hll
+    assert hll.count() == 0
+
+
+def test_duplicates_do_not_change_registers():
+    hll = HyperLogLog()
+    assert hll.add("visitor-1")
+    assert not hll.add("visitor-1")
+    assert hll.count() == 1
+
+
+@pytest.mark.parametrize("n", [100, 1000, 20000])
+def test_count_within_error_bound(n):
+    estimate = sketch(f"visitor-{i}" for i in range(n)).count()
+    # 2.3 % d'erreur type : 5 % de marge
+    assert abs(estimate - n) <= 0.05 * n
+
+
+def test_merge_is_union():
+    a = sketch(f"a-{i}" for i in range(500))
+    b = sketch(f"b-{i}" for i in range(500))
+    both = sketch([f"a-{i}" for i in range(500)] + [f"b-{i}" for i in range(500)])
+    a.merge(b)
+    assert a.registers == both.registers
+    assert a.covers(b)
+    assert not b.covers(a)
+
+
+def test_merge_is_idempotent():
+    a = sketch(f"a-{i}" for i in range(200))
+    before = a.to_bytes()
+    a.merge(HyperLogLog.from_bytes(before))
+    assert a.to_bytes() == before
+
+
+def test_bytes_round_trip_and_validation():
+    a = sketch(["x", "y", "z"])
+    assert HyperLogLog.from_bytes(a.to_bytes()).count() == a.count()
+    with pytest.raises(ValueError):
+        HyperLogLog.from_bytes(b"\0" * 10)
+    with pytest.raises(ValueError):
+        a.merge(HyperLogLog(precision=10))
@@ -0,0 +1,56 @@
+import json
+import os
+
+from ingest_images import iter_batches, iter_manifest, load_checkpoint, save_checkpoint, source_fingerprint
+
+
+def write_manifest(path, entries):
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+
+
+def test_iter_manifest_skips_incomplete_rows(tmp_path):
+    manifest = tmp_path / "catalog.jsonl"
+    write_manifest(manifest, [{"path": "a.png", "description": "a"}, {"path": "b.png"}])
+    assert list(iter_manifest(str(manifest))) == [{"path": "a.png", "description": "a"}]
+
+
+def test_iter_batches():
+    assert list(iter_batches(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_checkpoint_resumes_unchanged_source(tmp_path):
+    manifest = tmp_path / "catalog.jsonl"
+    write_manifest(manifest, [{"path": f"{i}.png", "description": str(i)} for i in range(10)])
+    checkpoint = str(tmp_path / "checkpoint.json")
+    save_checkpoint(checkpoint, str(manifest), 4, source_fingerprint(str(manifest)))
+    assert load_checkpoint(checkpoint, str(manifest), source_fingerprint(str(manifest))) == 4
+
+
+def test_checkpoint_ignored_after_manifest_edit(tmp_path):
+    manifest = tmp_path / "catalog.jsonl"
+    write_manifest(manifest, [{"path": f"{i}.png", "description": str(i)} for i in range(10)])
+    checkpoint = str(tmp_path / "checkpoint.json")
+    save_checkpoint(checkpoint, str(manifest), 4, source_fingerprint(str(manifest)))
+
+    # An entry inserted at the top shifts every offset
+    write_manifest(manifest, [{"path": "new.png", "description": "new"}] + [{"path": f"{i}.png", "description": str(i)} for i in range(10)])
+    assert load_checkpoint(checkpoint, str(manifest), source_fingerprint(str(manifest))) == 0
+
+
+def test_checkpoint_ignored_after_directory_edit(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    for name in ("a.png", "b.png"):
+        (images / name).write_bytes(b"png")
+    checkpoint = str(tmp_path / "checkpoint.json")
+    save_checkpoint(checkpoint, str(images), 1, source_fingerprint(str(images)))
+    assert load_checkpoint(checkpoint, str(images), source_fingerprint(str(images))) == 1
+
+    (images / "a.txt").write_text("a better description", encoding="utf-8")
+    assert load_checkpoint(checkpoint, str(images), source_fingerprint(str(images))) == 0
+
+    os.remove(images / "a.txt")
+    (images / "0.png").write_bytes(b"png")
+    assert load_checkpoint(checkpoint, str(images), source_fingerprint(str(images))) == 0
@@ -0,0 +1,56 @@
+from image_agent import MarkerStreamParser
+
+
+def parse(chunks):
+    parser = MarkerStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.close())
+    return events
+
+
+def merged(events):
+    """Consecutive text events joined, as the client renders them."""
+    result = []
+    for kind, value in events:
+        if kind == "text" and result and result[-1][0] == "text":
+            result[-1] = ("text", result[-1][1] + value)
+        else:
+            result.append((kind, value))
+    return result
+
+
+def test_marker_in_one_chunk():
+    assert parse(["Intro <<IMAGE: a cat>> outro"]) == [
+        ("text", "Intro "),
+        ("image", "a cat"),
+        ("text", " outro"),
+    ]
+
+
+def test_marker_split_across_chunks():
+    text = "Intro <<IMAGE: neural network diagram>> then more text."
+    for size in (1, 2, 3, 7):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert merged(parse(chunks)) == [
+            ("text", "Intro "),
+            ("image", "neural network diagram"),
+            ("text", " then more text."),
+        ]
+
+
+def test_text_is_released_before_the_stream_ends():
+    parser = MarkerStreamParser()
+    assert parser.feed("Hello wor") == [("text", "Hello wor")]
+    # A trailing "<" may open a marker: held back until the next chunk
+    assert parser.feed("ld <") == [("text", "ld ")]
+    assert parser.feed("3") == [("text", "<3")]
+
+
+def test_angle_brackets_that_are_not_markers_stay_text():
+    assert merged(parse(["if a << b and c >> d"])) == [("text", "if a << b and c >> d")]
+
+
+def test_unterminated_marker_is_flushed_as_text_on_close():
+    assert merged(parse(["Intro <<IMAGE: never closed"])) == [("text", "Intro <<IMAGE: never closed")]
@@ -0,0 +1,56 @@
+import importlib
+import sys
+import types
+
+import pytest
+from bson import ObjectId
+
+
+class FakeCollection:
+    def __init__(self, docs=None):
+        self.docs = {doc["_id"]: doc for doc in docs or []}
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            query, update = operation._filter, operation._doc
+            if query["_id"] not in self.docs:
+                self.docs[query["_id"]] = {"_id": query["_id"], **update["$setOnInsert"]}
+
+    def count_documents(self, query):
+        return sum(all(doc.get(key) == value for key, value in query.items()) for doc in self.docs.values())
+
+    def update_one(self, query, update):
+        doc = self.docs[query["_id"]]
+        doc.update(update.get("$set", {}))
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+
+
+@pytest.fixture
+def migration(monkeypatch):
+    db = {"articles": FakeCollection(), "article_comments": FakeCollection()}
+    monkeypatch.setitem(sys.modules, "mongo", types.SimpleNamespace(db=db))
+    monkeypatch.delitem(sys.modules, "migrate_comments", raising=False)
+    module = importlib.import_module("migrate_comments")
+    return module, db
+
+
+def test_rerun_after_an_interruption_inserts_nothing(migration):
+    module, db = migration
+    kept = ObjectId()
+    article = {"_id": ObjectId(), "comments": [
+        {"_id": str(kept), "content": "first"},
+        {"content": "no id"},
+        {"_id": "legacy-id", "content": "invalid id"},
+    ]}
+    db["articles"].docs[article["_id"]] = dict(article)
+
+    # Première exécution interrompue avant la mise à jour de l'article, puis relancée
+    module.migrate_article(article)
+    ids = set(db["article_comments"].docs)
+    assert module.migrate_article(article) == 3
+
+    assert set(db["article_comments"].docs) == ids
+    assert kept in ids and len(ids) == 3
+    migrated = db["articles"].docs[article["_id"]]
+    assert migrated["comment_count"] == 3 and "comments" not in migrated
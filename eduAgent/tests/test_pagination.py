@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from utils.pagination import decode_cursor, encode_cursor, keyset_filter, keyset_page
+
+
+def test_cursor_round_trip():
+    when = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    doc_id = ObjectId()
+    assert decode_cursor(encode_cursor(when, doc_id)) == (when, doc_id)
+
+
+@pytest.mark.parametrize("token", ["", "not-a-cursor", "eyJ0IjoieCJ9"])
+def test_decode_cursor_rejects_invalid_tokens(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+def test_keyset_filter_descending():
+    when, doc_id = datetime(2024, 1, 1), ObjectId()
+    assert keyset_filter("date", (when, doc_id)) == {
+        "date": {"$lte": when},
+        "$or": [{"date": {"$lt": when}}, {"_id": {"$lt": doc_id}}],
+    }
+
+
+def test_keyset_filter_ascending():
+    when, doc_id = datetime(2024, 1, 1), ObjectId()
+    assert keyset_filter("date", (when, doc_id), direction=1) == {
+        "date": {"$gte": when},
+        "$or": [{"date": {"$gt": when}}, {"_id": {"$gt": doc_id}}],
+    }
+
+
+def docs(n):
+    return [{"_id": ObjectId(), "date": datetime(2024, 1, 1 + i)} for i in range(n)]
+
+
+def test_keyset_page_with_next_page():
+    items = docs(4)
+    page, cursor = keyset_page(items, 3, "date")
+    assert page == items[:3]
+    assert decode_cursor(cursor) == (items[2]["date"], items[2]["_id"])
+
+
+def test_keyset_page_last_page():
+    items = docs(3)
+    assert keyset_page(items, 3, "date") == (items, None)
+    assert keyset_page([], 3, "date") == ([], None)
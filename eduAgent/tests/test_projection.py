@@ -0,0 +1,19 @@
+import pytest
+
+from utils.projection import parse_fields
+
+ALLOWED = {"title", "content", "author"}
+
+
+@pytest.mark.parametrize("fields", [None, "", " , ,"])
+def test_no_fields_requested(fields):
+    assert parse_fields(fields, ALLOWED) is None
+
+
+def test_fields_trimmed_and_deduplicated_in_order():
+    assert parse_fields(" content,title , content", ALLOWED) == ["content", "title"]
+
+
+def test_unknown_field_rejected():
+    with pytest.raises(ValueError, match="password"):
+        parse_fields("title,password", ALLOWED)
@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import qdrant_utils
+from qdrant_utils import catalog_point_id
+
+
+class FakeQdrant:
+    """Collection à vecteur nommé "default" ; refuse les points sans nom, comme Qdrant."""
+
+    def __init__(self, points=None, vector_name="default"):
+        self.vector_name = vector_name
+        self.points = dict(points or {})  # id -> payload
+        self.upserted = []
+        self.deleted = []
+
+    def get_collection(self, collection_name):
+        vectors = {self.vector_name: object()} if self.vector_name else object()
+        return SimpleNamespace(config=SimpleNamespace(params=SimpleNamespace(vectors=vectors)))
+
+    def scroll(self, collection_name, scroll_filter, limit, offset=None, **kwargs):
+        # Filtre du catalogue : source="config" ou pas de content_hash (anciens points)
+        ids = sorted(
+            (pid for pid, payload in self.points.items() if payload.get("source") == "config" or "content_hash" not in payload),
+            key=str,
+        )
+        start = offset or 0
+        page = ids[start:start + limit]
+        next_offset = start + limit if start + limit < len(ids) else None
+        return [SimpleNamespace(id=pid) for pid in page], next_offset
+
+    def upsert(self, collection_name, points, **kwargs):
+        for point in points:
+            named = isinstance(point.vector, dict)
+            if named != bool(self.vector_name):
+                raise ValueError("Wrong vector schema")
+            self.points[point.id] = point.payload
+        self.upserted.extend(point.id for point in points)
+
+    def delete(self, collection_name, points_selector, **kwargs):
+        for pid in points_selector.points:
+            self.points.pop(pid, None)
+        self.deleted.extend(points_selector.points)
+
+
+def img(name, description=None):
+    return {"path": f"images/{name}.png", "description": description or f"a {name}"}
+
+
+@pytest.fixture
+def sync(monkeypatch):
+    encoded = []
+
+    def encode(texts):
+        encoded.extend(texts)
+        return np.ones((len(texts), 768), dtype=np.float32)
+
+    monkeypatch.setattr(qdrant_utils, "encode", encode)
+    monkeypatch.setattr(qdrant_utils, "qdrant_available", True)
+    monkeypatch.setattr(qdrant_utils, "qdrant_vectors_persisted", False)
+    monkeypatch.setattr(qdrant_utils, "SYNC_BATCH_SIZE", 2)
+
+    def run(catalog, client):
+        monkeypatch.setattr(qdrant_utils, "images", catalog)
+        monkeypatch.setattr(qdrant_utils, "client", client)
+        encoded.clear()
+        qdrant_utils.upsert_vectors()
+        return list(encoded)
+
+    return run
+
+
+def test_fresh_collection_gets_named_vectors(sync):
+    client = FakeQdrant()
+    catalog = [img("cat"), img("dog"), img("owl")]
+    assert sync(catalog, client) == ["a cat", "a dog", "a owl"]
+    assert set(client.points) == {catalog_point_id(entry) for entry in catalog}
+    assert qdrant_utils.qdrant_vectors_persisted
+
+
+def test_unchanged_catalog_encodes_nothing(sync):
+    client = FakeQdrant()
+    catalog = [img("cat"), img("dog")]
+    sync(catalog, client)
+    client.upserted.clear()
+    assert sync(catalog, client) == []
+    assert client.upserted == [] and client.deleted == []
+
+
+def test_new_changed_removed_and_legacy_points(sync):
+    client = FakeQdrant()
+    sync([img("cat"), img("dog"), img("owl")], client)
+    # Anciens points à ID entier, sans content_hash ; et un point ingéré, hors catalogue
+    client.points[0] = {"path": "images/cat.png", "description": "a cat"}
+    client.points["ingested"] = {"path": "x.png", "content_hash": "h", "source": "ingest"}
+
+    catalog = [img("cat"), img("dog", "a small dog"), img("fox")]
+    encoded = sync(catalog, client)
+
+    assert sorted(encoded) == ["a fox", "a small dog"]
+    assert sorted(client.deleted, key=str) == sorted([0, catalog_point_id(img("dog")), catalog_point_id(img("owl"))], key=str)
+    assert set(client.points) == {catalog_point_id(entry) for entry in catalog} | {"ingested"}
+
+
+def test_unnamed_collection_gets_unnamed_vectors(sync):
+    client = FakeQdrant(vector_name=None)
+    sync([img("cat")], client)
+    assert set(client.points) == {catalog_point_id(img("cat"))}
+
+
+def test_failed_upsert_keeps_the_collection(sync, monkeypatch):
+    client = FakeQdrant()
+    client.points["ingested"] = {"path": "x.png", "content_hash": "h", "source": "ingest"}
+    client.vector_name = None  # schéma inattendu : l'upsert nommé échoue
+    client.get_collection = FakeQdrant().get_collection
+    client.delete_collection = lambda **kwargs: pytest.fail("collection deleted")
+    sync([img("cat")], client)
+    assert not qdrant_utils.qdrant_available
+    assert not qdrant_utils.qdrant_vectors_persisted
+    assert "ingested" in client.points
@@ -0,0 +1,99 @@
+import hashlib
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import qdrant_utils
+import search
+from embedding_cache import EmbeddingCache
+from vector_index import NumpyVectorIndex
+
+
+def fake_vector(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "big")
+    vector = np.random.default_rng(seed).standard_normal(768).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        texts = list(texts)
+        self.calls.append(texts)
+        return np.stack([fake_vector(text) for text in texts])
+
+
+class FakeClient:
+    """Retourne, pour chaque requête, le chemin associé au texte dont le vecteur a été envoyé."""
+
+    def __init__(self, paths, fail=False):
+        self.by_vector = {tuple(np.round(fake_vector(text), 5)): path for text, path in paths.items()}
+        self.fail = fail
+        self.batches = []
+
+    def query_batch_points(self, collection_name, requests, **kwargs):
+        if self.fail:
+            raise RuntimeError("qdrant down")
+        self.batches.append(requests)
+        responses = []
+        for request in requests:
+            # Collection à vecteur nommé : la requête doit le désigner
+            assert request.using == "default"
+            path = self.by_vector.get(tuple(np.round(np.asarray(request.query, dtype=np.float32), 5)))
+            points = [SimpleNamespace(payload={"path": path}, score=0.9)] if path else []
+            responses.append(SimpleNamespace(points=points))
+        return responses
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    encoder = FakeEncoder()
+    monkeypatch.setattr(search, "query_cache", EmbeddingCache(disk_dir=None))
+    monkeypatch.setattr(qdrant_utils, "encode", encoder)
+    return encoder
+
+
+def use_client(monkeypatch, client):
+    monkeypatch.setattr(qdrant_utils, "client", client)
+    monkeypatch.setattr(qdrant_utils, "collection_vector", "default")
+    monkeypatch.setattr(qdrant_utils, "qdrant_ready", lambda: True)
+
+
+def test_duplicate_queries_are_encoded_and_searched_once(monkeypatch, encoder):
+    client = FakeClient({"a cat": "cat.png", "a dog": "dog.png"})
+    use_client(monkeypatch, client)
+
+    results = search.find_best_images(["A  Cat", "a dog", "a cat"])
+
+    assert encoder.calls == [["a cat", "a dog"]]
+    assert len(client.batches) == 1 and len(client.batches[0]) == 2
+    assert [r["path"] for r in results] == ["cat.png", "dog.png", "cat.png"]
+
+
+def test_results_follow_input_order_with_misses(monkeypatch, encoder):
+    use_client(monkeypatch, FakeClient({"b": "b.png", "a": "a.png"}))
+    results = search.find_best_images(["b", "unknown", "a"])
+    assert [r and r["path"] for r in results] == ["b.png", None, "a.png"]
+    assert search.find_best_images([]) == []
+
+
+def test_local_index_serves_when_qdrant_search_fails(monkeypatch, encoder):
+    use_client(monkeypatch, FakeClient({}, fail=True))
+    index = NumpyVectorIndex()
+    index.upsert(["p1", "p2"], np.stack([fake_vector("a cat"), fake_vector("a dog")]), [{"path": "cat.png"}, {"path": "dog.png"}])
+    monkeypatch.setattr(qdrant_utils, "get_local_index", lambda: index)
+
+    results = search.find_best_images(["a dog", "a cat"])
+    assert [r["path"] for r in results] == ["dog.png", "cat.png"]
+
+
+def test_encoding_failure_returns_none_per_query(monkeypatch):
+    def broken(texts):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(search, "query_cache", EmbeddingCache(disk_dir=None))
+    monkeypatch.setattr(qdrant_utils, "encode", broken)
+    assert search.find_best_images(["a", "b"]) == [None, None]
@@ -0,0 +1,184 @@
+import asyncio
+
+from session_store import SessionBackend, SessionStore
+
+
+class FakeTutor:
+    def __init__(self, name, revision=1):
+        self.name = name
+        self.revision = revision
+        self.status = "in_progress"
+        self.lock = asyncio.Lock()
+        self.saves = 0
+
+    async def save_to_db_async(self, status="in_progress"):
+        await asyncio.sleep(0.01)
+        self.saves += 1
+
+
+class FakeBackend(SessionBackend):
+    """Rend une nouvelle instance à chaque chargement, après `delay` secondes."""
+
+    def __init__(self, delay=0.0, revisions=None):
+        self.delay = delay
+        self.revisions = revisions or {}
+        self.loads = 0
+        self.saved_before_load = []
+        self.evicted = {}
+
+    async def load(self, session_id):
+        self.loads += 1
+        evicted = self.evicted.get(session_id)
+        self.saved_before_load.append(evicted.saves if evicted else None)
+        await asyncio.sleep(self.delay)
+        return FakeTutor(session_id, revision=self.revisions.get(session_id, 1))
+
+    async def revision(self, session_id):
+        return self.revisions.get(session_id)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_lru_eviction_saves_the_session():
+    async def scenario():
+        store = SessionStore(max_sessions=2, idle_ttl=60)
+        tutors = [FakeTutor(str(i)) for i in range(3)]
+        for i, tutor in enumerate(tutors):
+            store.put(str(i), tutor)
+        assert "0" not in store and len(store) == 2
+        await store.stop()
+        return tutors
+
+    tutors = run(scenario())
+    assert tutors[0].saves == 1
+
+
+def test_reload_waits_for_the_eviction_save():
+    async def scenario():
+        backend = FakeBackend()
+        store = SessionStore(backend=backend, max_sessions=1, idle_ttl=60)
+        first = FakeTutor("a")
+        backend.evicted["a"] = first
+        store.put("a", first)
+        store.put("b", FakeTutor("b"))  # évince "a", sauvegarde en cours
+        reloaded = await store.load("a")
+        await store.stop()
+        return backend, reloaded
+
+    backend, reloaded = run(scenario())
+    # La relecture n'a eu lieu qu'après la sauvegarde de la session évincée
+    assert backend.saved_before_load == [1]
+    assert reloaded.name == "a"
+
+
+def test_stop_saves_live_sessions():
+    async def scenario():
+        store = SessionStore(max_sessions=10, idle_ttl=60)
+        tutors = [FakeTutor(str(i)) for i in range(3)]
+        for i, tutor in enumerate(tutors):
+            store.put(str(i), tutor)
+        await store.stop()
+        return store, tutors
+
+    store, tutors = run(scenario())
+    assert [tutor.saves for tutor in tutors] == [1, 1, 1]
+    assert len(store) == 0
+
+
+def test_idle_sessions_are_swept():
+    async def scenario():
+        store = SessionStore(max_sessions=10, idle_ttl=0)
+        tutor = FakeTutor("a")
+        store.put("a", tutor)
+        await asyncio.sleep(0.001)
+        assert store.sweep() == 1
+        await store.stop()
+        return store, tutor
+
+    store, tutor = run(scenario())
+    assert store.evicted_idle == 1 and tutor.saves == 1
+
+
+def test_concurrent_loads_share_one_rehydration():
+    async def scenario():
+        backend = FakeBackend(delay=0.02)
+        store = SessionStore(backend=backend, max_sessions=10, idle_ttl=60)
+        tutors = await asyncio.gather(*(store.load("a") for _ in range(5)))
+        await store.stop()
+        return backend, tutors
+
+    backend, tutors = run(scenario())
+    assert backend.loads == 1
+    assert all(tutor is tutors[0] for tutor in tutors)
+
+
+def test_concurrent_stale_reloads_share_one_rehydration():
+    async def scenario():
+        backend = FakeBackend(delay=0.02, revisions={"a": 1})
+        store = SessionStore(backend=backend, max_sessions=10, idle_ttl=60)
+        stale = FakeTutor("a", revision=1)
+        store.put("a", stale)
+        backend.revisions["a"] = 3  # un autre worker a avancé la session
+        tutors = await asyncio.gather(*(store.load("a") for _ in range(4)))
+        await store.stop()
+        return backend, stale, tutors
+
+    backend, stale, tutors = run(scenario())
+    assert backend.loads == 1
+    assert tutors[0] is not stale and tutors[0].revision == 3
+    assert all(tutor is tutors[0] for tutor in tutors)
+
+
+def test_fresh_session_is_not_reloaded():
+    async def scenario():
+        backend = FakeBackend(revisions={"a": 2})
+        store = SessionStore(backend=backend, max_sessions=10, idle_ttl=60)
+        tutor = FakeTutor("a", revision=2)
+        store.put("a", tutor)
+        loaded = await store.load("a")
+        await store.stop()
+        return backend, tutor, loaded
+
+    backend, tutor, loaded = run(scenario())
+    assert loaded is tutor and backend.loads == 0
+
+
+def test_mongo_backend_resumes_by_session_token_only(monkeypatch):
+    import async_mongo
+    import session_store
+    from session_store import MongoSessionBackend, new_session_token
+
+    token = new_session_token()
+    history = {"_id": "65f000000000000000000001", "session_token": token, "revision": 4}
+    lookups = []
+
+    async def get_history_by_session(session_token):
+        lookups.append(session_token)
+        return dict(history) if session_token == token else None
+
+    async def get_session_revision(session_token):
+        return history["revision"] if session_token == token else None
+
+    monkeypatch.setattr(async_mongo, "get_history_by_session", get_history_by_session, raising=False)
+    monkeypatch.setattr(async_mongo, "get_session_revision", get_session_revision, raising=False)
+    monkeypatch.setattr(session_store.history_writer, "flush", lambda history_id=None: 0)
+
+    backend = MongoSessionBackend(rehydrate=lambda doc: doc)
+
+    async def scenario():
+        return (
+            await backend.load(token),
+            await backend.load(history["_id"]),
+            await backend.load(""),
+            await backend.revision(token),
+        )
+
+    by_token, by_history_id, empty, revision = run(scenario())
+    assert by_token["_id"] == history["_id"]
+    # L'ID public de l'historique ne permet pas de reprendre la session
+    assert by_history_id is None
+    assert empty is None
+    assert revision == 4
+    assert len(token) >= 40 and token != new_session_token()
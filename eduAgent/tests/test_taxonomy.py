@@ -0,0 +1,56 @@
+import asyncio
+
+import async_mongo
+import taxonomy
+from taxonomy import article_terms, record_change, taxonomy_deltas
+
+
+def test_article_terms_ignores_empty_category_and_repeated_tags():
+    assert article_terms({"category": "", "tags": ["ai", "ai", "ml"]}) == {("tags", "ai"), ("tags", "ml")}
+    assert article_terms(None) == set()
+
+
+def test_deltas_on_create_and_delete():
+    article = {"category": "Tech", "tags": ["ai", "ml"]}
+    assert taxonomy_deltas(None, article) == {("category", "Tech"): 1, ("tags", "ai"): 1, ("tags", "ml"): 1}
+    assert taxonomy_deltas(article, None) == {("category", "Tech"): -1, ("tags", "ai"): -1, ("tags", "ml"): -1}
+
+
+def test_deltas_on_update_only_cover_changes():
+    old = {"category": "Tech", "tags": ["ai", "ml"]}
+    new = {"category": "Science", "tags": ["ml", "nlp"]}
+    assert taxonomy_deltas(old, new) == {
+        ("category", "Tech"): -1,
+        ("category", "Science"): 1,
+        ("tags", "ai"): -1,
+        ("tags", "nlp"): 1,
+    }
+    assert taxonomy_deltas(old, dict(old)) == {}
+
+
+def test_record_change_applies_deltas_and_invalidates_cache(monkeypatch):
+    applied = []
+
+    async def apply_taxonomy_deltas(deltas):
+        applied.append(deltas)
+
+    monkeypatch.setattr(async_mongo, "apply_taxonomy_deltas", apply_taxonomy_deltas, raising=False)
+    monkeypatch.setattr(taxonomy.taxonomy_cache, "data", {"category": [], "tags": []})
+
+    asyncio.run(record_change({"tags": ["ai"]}, {"tags": ["ai"]}))
+    assert applied == []
+    assert taxonomy.taxonomy_cache.data is not None
+
+    asyncio.run(record_change({"tags": ["ai"]}, None))
+    assert applied == [{("tags", "ai"): -1}]
+    assert taxonomy.taxonomy_cache.data is None
+
+
+def test_record_change_failure_keeps_cache(monkeypatch):
+    async def apply_taxonomy_deltas(deltas):
+        raise RuntimeError("down")
+
+    monkeypatch.setattr(async_mongo, "apply_taxonomy_deltas", apply_taxonomy_deltas, raising=False)
+    monkeypatch.setattr(taxonomy.taxonomy_cache, "data", {"category": [], "tags": []})
+    asyncio.run(record_change(None, {"category": "Tech"}))
+    assert taxonomy.taxonomy_cache.data is not None
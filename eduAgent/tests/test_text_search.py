@@ -0,0 +1,56 @@
+from utils.text_search import MAX_QUERY_TERMS, highlight, search_terms, snippet, text_query
+
+
+def test_search_terms_strips_text_operators():
+    assert search_terms('"Réseaux" -neurones (.*)') == ["réseaux", "neurones"]
+
+
+def test_search_terms_deduplicates_and_caps():
+    assert search_terms("Python python PYTHON") == ["python"]
+    words = " ".join(f"w{i}" for i in range(MAX_QUERY_TERMS + 5))
+    assert len(search_terms(words)) == MAX_QUERY_TERMS
+
+
+def test_text_query():
+    assert text_query(["a", "b"]) == {"$text": {"$search": "a b"}}
+
+
+def test_highlight_escapes_html_and_marks_terms():
+    assert highlight("<b>Python</b> & python", ["python"]) == (
+        "&lt;b&gt;<mark>Python</mark>&lt;/b&gt; &amp; <mark>python</mark>"
+    )
+
+
+def test_highlight_prefers_longest_term():
+    assert highlight("networking", ["net", "networking"]) == "<mark>networking</mark>"
+
+
+def test_highlight_matches_whole_words_only():
+    assert highlight("Start the article", ["art"]) == "Start the <mark>article</mark>"
+    assert highlight("réseaux de neurones", ["réseau"]) == "<mark>réseaux</mark> de neurones"
+
+
+def test_highlight_treats_terms_literally():
+    assert highlight("a.b axb", ["a.b"]) == "<mark>a.b</mark> axb"
+
+
+def test_highlight_without_terms():
+    assert highlight("<i>x</i>", []) == "&lt;i&gt;x&lt;/i&gt;"
+    assert highlight(None, ["x"]) == ""
+
+
+def test_snippet_centers_on_first_match():
+    text = "a" * 100 + " python " + "b" * 100
+    result = snippet(text, ["python"], radius=10)
+    assert result.startswith("…") and result.endswith("…")
+    assert "<mark>python</mark>" in result
+
+
+def test_snippet_skips_matches_inside_words():
+    text = "restart " + "x" * 50 + " art"
+    assert snippet(text, ["art"], radius=5) == "…xxxx <mark>art</mark>"
+
+
+def test_snippet_without_match():
+    assert snippet("short text", ["absent"], radius=10) == "short text"
+    assert snippet("x" * 30, ["absent"], radius=10) == "x" * 20 + "…"
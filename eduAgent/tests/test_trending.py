@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import async_mongo
+from trending import TrendingFeeds, engagement, feed_key, trending_score
+
+
+def article(n, category=None, views=0, likes=0, age_hours=0):
+    doc = {
+        "_id": f"a{n}", "title": f"Article {n}", "views": views, "likes": likes,
+        "created_at": datetime.utcnow() - timedelta(hours=age_hours),
+    }
+    if category is not None:
+        doc["category"] = category
+    return doc
+
+
+def compute(monkeypatch, articles, size=50):
+    async def iter_article_summaries():
+        for doc in articles:
+            yield doc
+
+    monkeypatch.setattr(async_mongo, "iter_article_summaries", iter_article_summaries, raising=False)
+    feeds, _ = asyncio.run(TrendingFeeds(size=size).compute())
+    return feeds
+
+
+def ids(feed):
+    return [summary["id"] for summary in feed]
+
+
+def test_feed_key():
+    assert feed_key("trending") == feed_key("trending", "") == feed_key("trending", None) == "trending:global"
+    assert feed_key("popular", "Tech") == "popular:category:Tech"
+
+
+def test_trending_score_decays_with_half_life():
+    now = datetime.utcnow()
+    doc = {"views": 10, "created_at": now - timedelta(hours=48)}
+    assert engagement(doc) == 10
+    assert abs(trending_score(doc, now, half_life_hours=48) - 5) < 1e-9
+
+
+def test_uncategorized_articles_appear_once_in_global_feed(monkeypatch):
+    feeds = compute(monkeypatch, [
+        article(1, views=10),
+        article(2, category="", views=5),
+        article(3, category="Tech", views=1),
+    ])
+    assert ids(feeds["popular:global"]) == ["a1", "a2", "a3"]
+    assert ids(feeds["trending:global"]) == ["a1", "a2", "a3"]
+    assert ids(feeds["popular:category:Tech"]) == ["a3"]
+    assert set(feeds) == {"popular:global", "trending:global", "popular:category:Tech", "trending:category:Tech"}
+
+
+def test_feeds_keep_top_n_and_skip_unengaged(monkeypatch):
+    feeds = compute(monkeypatch, [article(n, views=n) for n in range(6)], size=3)
+    assert ids(feeds["popular:global"]) == ["a5", "a4", "a3"]
+    assert "a0" not in ids(feeds["trending:global"])
+
+
+def test_trending_prefers_recent_engagement(monkeypatch):
+    feeds = compute(monkeypatch, [article(1, views=100, age_hours=480), article(2, views=20)])
+    assert ids(feeds["trending:global"]) == ["a2", "a1"]
+    assert ids(feeds["popular:global"]) == ["a1", "a2"]
+
+
+def test_staleness_measured_from_computation(monkeypatch):
+    feeds = TrendingFeeds(max_staleness=900)
+    refreshes = []
+
+    async def refresh(requested_at=None):
+        refreshes.append(requested_at)
+
+    monkeypatch.setattr(feeds, "refresh", refresh)
+    # Relus à l'instant, mais calculés il y a une heure
+    feeds.computed_at = datetime.utcnow() - timedelta(hours=1)
+    feeds.loaded_at = 10 ** 9
+    assert feeds.is_stale()
+    asyncio.run(feeds.get("trending"))
+    assert len(refreshes) == 1
+
+    feeds.computed_at = datetime.utcnow()
+    assert not feeds.is_stale()
+    asyncio.run(feeds.get("trending"))
+    assert len(refreshes) == 1
+
+
+def test_concurrent_stale_requests_reload_once(monkeypatch):
+    feeds = TrendingFeeds(max_staleness=900)
+    loads = []
+
+    async def load_feeds():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return datetime.utcnow(), {"trending:global": [{"id": "a1"}]}
+
+    async def acquire_feeds_lease(owner, ttl):
+        return False
+
+    monkeypatch.setattr(async_mongo, "load_feeds", load_feeds, raising=False)
+    monkeypatch.setattr(async_mongo, "acquire_feeds_lease", acquire_feeds_lease, raising=False)
+
+    async def scenario():
+        return await asyncio.gather(*(feeds.get("trending") for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(loads) == 1
+    assert all(articles == [{"id": "a1"}] for articles, _ in results)
+
+
+def test_missing_computation_is_computed_once_under_the_lease(monkeypatch):
+    feeds = TrendingFeeds(max_staleness=900)
+    loads, saved = [], []
+    leases = iter([False, True])
+
+    async def load_feeds():
+        loads.append(1)
+        return (saved[-1] if saved else None), {}
+
+    async def acquire_feeds_lease(owner, ttl):
+        return next(leases)
+
+    async def save_feeds(feeds, computed_at):
+        saved.append(computed_at)
+
+    async def iter_article_summaries():
+        return
+        yield
+
+    for name, fn in [("load_feeds", load_feeds), ("acquire_feeds_lease", acquire_feeds_lease),
+                     ("save_feeds", save_feeds), ("iter_article_summaries", iter_article_summaries)]:
+        monkeypatch.setattr(async_mongo, name, fn, raising=False)
+
+    # Bail détenu ailleurs : une seule relecture, pas une par requête
+    for _ in range(3):
+        asyncio.run(feeds.get("trending"))
+    assert len(loads) == 1 and feeds.computed_at is None
+
+    # Intervalle écoulé : calculés sous le bail, même sans aucun article
+    feeds.loaded_at -= feeds.refresh_interval + 1
+    for _ in range(3):
+        assert asyncio.run(feeds.get("trending")) == ([], saved[0])
+    assert len(loads) == 2 and len(saved) == 1
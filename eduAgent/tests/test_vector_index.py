@@ -0,0 +1,79 @@
+import numpy as np
+
+import qdrant_utils
+from vector_index import NumpyVectorIndex
+
+DIM = 3
+
+
+def test_search_ranks_by_cosine():
+    index = NumpyVectorIndex(dim=DIM)
+    index.upsert(["x", "y", "xy"], [[1, 0, 0], [0, 1, 0], [1, 1, 0]], [{"n": "x"}, {"n": "y"}, {"n": "xy"}])
+    hits = index.search([[2, 0.1, 0]], limit=2)[0]
+    assert [hit["id"] for hit in hits] == ["x", "xy"]
+    assert hits[0]["payload"] == {"n": "x"}
+    assert hits[0]["score"] > hits[1]["score"]
+
+
+def test_upsert_replaces_and_delete_removes():
+    index = NumpyVectorIndex(dim=DIM)
+    index.upsert(["a", "b"], [[1, 0, 0], [0, 1, 0]], [{}, {}])
+    index.upsert(["a"], [[0, 0, 1]], [{"v": 2}])
+    assert len(index) == 2
+    assert index.search([[0, 0, 1]])[0][0] == {"id": "a", "score": 1.0, "payload": {"v": 2}}
+    index.delete(["a"])
+    assert index.ids == ["b"]
+    assert index.search([[0, 0, 1]])[0][0]["id"] == "b"
+
+
+def test_upsert_does_not_modify_a_matrix_being_searched():
+    index = NumpyVectorIndex(dim=DIM)
+    index.upsert(["a"], [[1, 0, 0]], [{}])
+    in_use = index.matrix
+    index.upsert(["a", "b"], [[0, 1, 0], [0, 0, 1]], [{}, {}])
+    np.testing.assert_array_equal(in_use, [[1, 0, 0]])
+    np.testing.assert_array_equal(index.matrix, [[0, 1, 0], [0, 0, 1]])
+
+
+def test_loaded_snapshot_accepts_upserts(tmp_path):
+    path = str(tmp_path / "index")
+    index = NumpyVectorIndex(dim=DIM)
+    index.upsert(["a", "b"], [[1, 0, 0], [0, 1, 0]], [{"p": 1}, {"p": 2}])
+    index.save(path)
+
+    loaded = NumpyVectorIndex.load(path)
+    loaded.upsert(["a"], [[0, 0, 1]], [{"p": 3}])
+    assert loaded.search([[0, 0, 1]])[0][0]["payload"] == {"p": 3}
+
+
+def test_local_index_snapshot_follows_the_catalog(tmp_path, monkeypatch):
+    encoded = []
+
+    def fake_encode(texts):
+        encoded.extend(texts)
+        return np.array([[len(text), 1.0] + [0.0] * 766 for text in texts], dtype=np.float32)
+
+    catalog = [
+        {"path": "a.png", "description": "first image"},
+        {"path": "b.png", "description": "second image"},
+    ]
+    monkeypatch.setattr(qdrant_utils, "encode", fake_encode)
+    monkeypatch.setattr(qdrant_utils, "images", catalog)
+    monkeypatch.setattr(qdrant_utils, "VECTOR_INDEX_SNAPSHOT", str(tmp_path / "snapshot"))
+    monkeypatch.setattr(qdrant_utils, "local_index", None)
+    assert len(qdrant_utils.get_local_index()) == 2
+
+    # Catalog edited after the snapshot was written: only the changes are encoded
+    encoded.clear()
+    catalog[1] = {"path": "b.png", "description": "second image, redrawn"}
+    catalog.append({"path": "c.png", "description": "third image"})
+    monkeypatch.setattr(qdrant_utils, "local_index", None)
+    index = qdrant_utils.get_local_index()
+    assert sorted(encoded) == ["second image, redrawn", "third image"]
+    assert sorted(index.ids) == sorted(qdrant_utils.catalog_point_id(img) for img in catalog)
+
+    # The updated snapshot is reused as is
+    encoded.clear()
+    monkeypatch.setattr(qdrant_utils, "local_index", None)
+    assert len(qdrant_utils.get_local_index()) == 3
+    assert encoded == []
@@ -0,0 +1,147 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import async_mongo
+import view_counter as view_counter_module
+from utils.hyperloglog import HyperLogLog
+from view_counter import ViewCounter
+
+
+class FakeArticles:
+    """Vues et sketchs de lecteurs des articles, avec la sémantique d'async_mongo."""
+
+    def __init__(self, *article_ids):
+        self.views = dict.fromkeys(article_ids, 0)
+        self.sketches = {article_id: (None, 0) for article_id in article_ids}
+        self.fail_next_write = False
+        self.before_sketch_write = None  # écriture concurrente d'un autre worker
+        self.sketch_writes = 0
+
+    async def bulk_increment_views(self, deltas):
+        if self.fail_next_write:
+            self.fail_next_write = False
+            raise ConnectionError("connection reset")
+        for article_id, delta in deltas.items():
+            self.views[article_id] += delta
+
+    async def get_viewer_sketches(self, article_ids):
+        return {article_id: self.sketches[article_id] for article_id in article_ids if article_id in self.sketches}
+
+    async def bulk_set_viewer_sketches(self, updates):
+        if self.before_sketch_write:
+            self.before_sketch_write()
+        for article_id, version, data, estimate in updates:
+            self.sketch_writes += 1
+            if self.sketches[article_id][1] == version:
+                self.sketches[article_id] = (data, version + 1)
+
+    def viewers(self, article_id):
+        data, _ = self.sketches[article_id]
+        return HyperLogLog.from_bytes(data).count() if data else 0
+
+
+@pytest.fixture
+def articles(monkeypatch):
+    fake = FakeArticles("a1", "a2")
+    for name in ("bulk_increment_views", "get_viewer_sketches", "bulk_set_viewer_sketches"):
+        monkeypatch.setattr(async_mongo, name, getattr(fake, name), raising=False)
+    return fake
+
+
+def test_views_are_buffered_until_flush(articles):
+    counter = ViewCounter()
+    for _ in range(3):
+        counter.record("a1")
+    counter.record("a2", views=2)
+    assert articles.views == {"a1": 0, "a2": 0}
+    assert counter.pending_views("a1") == 3
+
+    assert asyncio.run(counter.flush()) == 2
+    assert articles.views == {"a1": 3, "a2": 2}
+    assert counter.pending_views("a1") == 0
+    assert asyncio.run(counter.flush()) == 0
+
+
+def test_failed_write_requeues_views(articles):
+    counter = ViewCounter()
+    counter.record("a1", viewer="v1", views=2)
+    articles.fail_next_write = True
+    assert asyncio.run(counter.flush()) == 0
+    assert counter.failures == 1
+    # Les vues perdues par l'écriture s'ajoutent à celles arrivées depuis
+    counter.record("a1", viewer="v2")
+    assert counter.pending_views("a1") == 3
+
+    asyncio.run(counter.flush())
+    assert articles.views["a1"] == 3
+    assert articles.viewers("a1") == 2
+
+
+def test_pending_views_are_added_to_responses(articles, monkeypatch):
+    from routes import blog
+
+    counter = ViewCounter()
+    monkeypatch.setattr(blog, "view_counter", counter)
+    counter.record("a1", views=4)
+    counter.in_flight = {"a1": 1}
+    doc = {"_id": "a1", "views": 10, "created_at": datetime(2024, 1, 1)}
+    assert blog.format_article(doc)["views"] == 15
+    # Champ non demandé (?fields=) : pas de compteur ajouté
+    assert "views" not in blog.format_article({"_id": "a1", "title": "T"}, fields={"title"})
+
+
+def test_max_delta_wakes_the_flush_early(articles):
+    async def scenario():
+        counter = ViewCounter(flush_interval=60, max_delta=3)
+        counter.start()
+        counter.record("a1", views=2)
+        await asyncio.sleep(0.01)
+        assert articles.views["a1"] == 0
+        counter.record("a1")
+        await asyncio.sleep(0.01)
+        assert articles.views["a1"] == 3
+        await counter.stop()
+
+    asyncio.run(scenario())
+
+
+def test_sketch_merge_retries_when_another_worker_wrote(articles):
+    other = HyperLogLog()
+    other.add("other-reader")
+
+    def concurrent_write():
+        # Un autre worker fusionne son sketch entre notre lecture et notre écriture
+        articles.before_sketch_write = None
+        data, version = articles.sketches["a1"]
+        articles.sketches["a1"] = (other.to_bytes(), version + 1)
+
+    articles.before_sketch_write = concurrent_write
+    counter = ViewCounter()
+    counter.record("a1", viewer="reader")
+    asyncio.run(counter.flush())
+
+    assert articles.sketch_writes == 2
+    assert counter.sketch_conflicts == 1
+    assert articles.viewers("a1") == 2
+    assert not counter.sketches
+
+
+def test_sketch_contention_is_retried_at_next_flush(articles, monkeypatch):
+    monkeypatch.setattr(view_counter_module, "SKETCH_MERGE_ATTEMPTS", 1)
+
+    def concurrent_write():
+        data, version = articles.sketches["a1"]
+        articles.sketches["a1"] = (data, version + 1)
+
+    articles.before_sketch_write = concurrent_write
+    counter = ViewCounter()
+    counter.record("a1", viewer="reader")
+    asyncio.run(counter.flush())
+    assert "a1" in counter.sketches
+
+    articles.before_sketch_write = None
+    asyncio.run(counter.flush())
+    assert articles.viewers("a1") == 1
+    assert not counter.sketches
@@ -0,0 +1,171 @@
+import asyncio
+import heapq
+import os
+import time
+import uuid
+from datetime import datetime
+
+import async_mongo
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+TRENDING_REFRESH_INTERVAL = float(os.getenv("TRENDING_REFRESH_INTERVAL", "300"))
+TRENDING_MAX_STALENESS = float(os.getenv("TRENDING_MAX_STALENESS", "900"))
+TRENDING_FEED_SIZE = int(os.getenv("TRENDING_FEED_SIZE", "50"))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "48"))
+
+# Poids de l'engagement : une vue, un like, un commentaire
+VIEW_WEIGHT = 1.0
+LIKE_WEIGHT = 5.0
+COMMENT_WEIGHT = 3.0
+
+FEEDS = ("trending", "popular")
+
+
+def engagement(article) -> float:
+    return (
+        VIEW_WEIGHT * article.get("views", 0)
+        + LIKE_WEIGHT * article.get("likes", 0)
+        + COMMENT_WEIGHT * article.get("comment_count", 0)
+    )
+
+
+def trending_score(article, now: datetime, half_life_hours=TRENDING_HALF_LIFE_HOURS) -> float:
+    """Engagement divisé par deux toutes les `half_life_hours` heures d'ancienneté."""
+    age_hours = max(0.0, (now - article["created_at"]).total_seconds() / 3600)
+    return engagement(article) * 0.5 ** (age_hours / half_life_hours)
+
+
+def feed_key(feed: str, category: str = None) -> str:
+    return f"{feed}:category:{category}" if category else f"{feed}:global"
+
+
+def _summary(article, score) -> dict:
+    summary = {key: value for key, value in article.items() if key != "_id"}
+    summary["id"] = str(article["_id"])
+    summary["score"] = round(score, 4)
+    for key in ("created_at", "updated_at"):
+        if isinstance(summary.get(key), datetime):
+            summary[key] = summary[key].isoformat()
+    return summary
+
+
+class TrendingFeeds:
+    """
+    Flux d'articles précalculés : "trending" (engagement amorti dans le temps)
+    et "popular" (engagement total), global et par catégorie, limités à
+    TRENDING_FEED_SIZE articles.
+
+    Un seul worker à la fois les recalcule (bail dans la collection `feeds`) et
+    les enregistre ; chaque worker les garde en mémoire et les relit toutes les
+    TRENDING_REFRESH_INTERVAL secondes. Une requête qui trouve des flux plus
+    vieux que TRENDING_MAX_STALENESS attend leur rafraîchissement.
+    """
+
+    def __init__(self, refresh_interval=TRENDING_REFRESH_INTERVAL, max_staleness=TRENDING_MAX_STALENESS, size=TRENDING_FEED_SIZE):
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.size = size
+        self.owner = uuid.uuid4().hex
+        self.feeds = {}  # feed_key -> [résumés d'articles]
+        self.computed_at = None
+        self.loaded_at = 0.0
+        self.lock = asyncio.Lock()
+        self.task = None
+        self.computations = 0
+        self.reloads = 0
+        self.failures = 0
+
+    async def compute(self):
+        """Parcourt les articles une fois et retient le top N de chaque flux."""
+        now = datetime.utcnow()
+        heaps = {}
+        async for article in async_mongo.iter_article_summaries():
+            scores = {"trending": trending_score(article, now), "popular": engagement(article)}
+            article_id = str(article["_id"])
+            for feed, score in scores.items():
+                if score <= 0:
+                    continue
+                # Sans catégorie, les deux clés sont celles du flux global : une seule entrée
+                for key in {feed_key(feed), feed_key(feed, article.get("category"))}:
+                    heap = heaps.setdefault(key, [])
+                    entry = (score, article_id, article)
+                    if len(heap) < self.size:
+                        heapq.heappush(heap, entry)
+                    elif entry[:2] > heap[0][:2]:
+                        heapq.heapreplace(heap, entry)
+
+        feeds = {}
+        for key, heap in heaps.items():
+            ranked = sorted(heap, key=lambda entry: entry[:2], reverse=True)
+            feeds[key] = [_summary(article, score) for score, _, article in ranked]
+        self.computations += 1
+        return feeds, now
+
+    async def refresh(self, requested_at=None):
+        async with self.lock:
+            if requested_at is not None and self.loaded_at > requested_at:
+                # Rechargés par une autre requête pendant l'attente du verrou
+                return
+            computed_at, feeds = await async_mongo.load_feeds()
+            age = (datetime.utcnow() - computed_at).total_seconds() if computed_at else None
+            if (age is None or age >= self.refresh_interval) and await async_mongo.acquire_feeds_lease(self.owner, self.refresh_interval):
+                feeds, computed_at = await self.compute()
+                await async_mongo.save_feeds(feeds, computed_at)
+                print(f"[Trending] ✓ {len(feeds)} feeds computed")
+            self.feeds = feeds
+            self.computed_at = computed_at
+            self.loaded_at = time.monotonic()
+            self.reloads += 1
+
+    async def get(self, feed: str, category: str = None):
+        """(articles, computed_at) d'un flux, rafraîchi d'abord s'il dépasse la borne de fraîcheur."""
+        if self.is_stale():
+            try:
+                await self.refresh(requested_at=time.monotonic())
+            except Exception as e:
+                self.failures += 1
+                print(f"[Trending] ✗ Refresh failed: {e}")
+        return self.feeds.get(feed_key(feed, category), []), self.computed_at
+
+    def is_stale(self) -> bool:
+        """Âge des flux depuis leur calcul (et non depuis leur dernière relecture) au-delà de max_staleness."""
+        if self.computed_at is None:
+            # Jamais calculés : calcul immédiat (sous le bail) au premier appel, puis une
+            # relecture par intervalle au plus, et non une par requête
+            return not self.loaded_at or time.monotonic() - self.loaded_at > self.refresh_interval
+        return (datetime.utcnow() - self.computed_at).total_seconds() > self.max_staleness
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.failures += 1
+                print(f"[Trending] ✗ Refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def stats(self):
+        return {
+            "feeds": len(self.feeds),
+            "computed_at": self.computed_at.isoformat() if self.computed_at else None,
+            "loaded_seconds_ago": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None,
+            "computations": self.computations,
+            "reloads": self.reloads,
+            "failures": self.failures,
+        }
+
+
+trending_feeds = TrendingFeeds()
@@ -0,0 +1,164 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "8"))
+# Hachage des mots de passe (bcrypt) : pool dédié, "process" (pas de GIL) ou "thread"
+PASSWORD_EXECUTOR = os.getenv("PASSWORD_EXECUTOR", "process").lower()
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Appels en attente au-delà desquels les nouveaux sont refusés (PasswordQueueFull)
+PASSWORD_QUEUE_MAX = int(os.getenv("PASSWORD_QUEUE_MAX", "100"))
+
+_blocking_executor = ThreadPoolExecutor(
+    max_workers=BLOCKING_WORKERS,
+    thread_name_prefix="eduagent-blocking",
+)
+
+
+# =====================================================
+# BLOCKING CALLS
+# =====================================================
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Exécute un appel bloquant (encodage, Qdrant, pymongo) sur un pool borné
+    pour ne jamais bloquer la boucle d'événements d'uvicorn.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_executor, partial(func, *args, **kwargs))
+
+
+# =====================================================
+# PASSWORD HASHING
+# =====================================================
+
+def _password_context():
+    """
+    Contexte des processus de hachage. Forkés depuis le forkserver, et non depuis
+    le serveur, ils n'héritent ni de ses threads ni de ses connexions (MongoDB,
+    Qdrant) ; utils.passwords (bcrypt) n'y est importé qu'une fois, au démarrage
+    du forkserver, et non par chaque worker.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")  # Windows
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["utils.passwords"])
+    return context
+
+
+class PasswordQueueFull(Exception):
+    """Trop de hachages en attente : la requête doit être refusée (503)."""
+
+
+class PasswordExecutor:
+    """
+    Pool dédié au hachage bcrypt, séparé du pool partagé : une rafale de
+    connexions ne peut occuper que PASSWORD_WORKERS workers. Au-delà, les
+    appels attendent leur tour (sémaphore), dans la limite de PASSWORD_QUEUE_MAX.
+    """
+
+    def __init__(self, kind=PASSWORD_EXECUTOR, workers=PASSWORD_WORKERS, queue_max=PASSWORD_QUEUE_MAX):
+        self.kind = kind
+        self.workers = workers
+        self.queue_max = queue_max
+        self.executor = None
+        self.semaphore = None
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _get_executor(self):
+        # Créé au premier appel : les processus ne démarrent pas à l'import
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_password_context())
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="eduagent-password")
+        return self.executor
+
+    async def run(self, func, *args):
+        if self.queued >= self.queue_max:
+            self.rejected += 1
+            raise PasswordQueueFull()
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.workers)
+
+        started = time.perf_counter()
+        self.queued += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+        waited = time.perf_counter() - started
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+        self.running += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Place libérée quand le hachage se termine, pas quand l'appelant abandonne :
+        # une requête annulée ne laisse pas un calcul en cours hors du sémaphore
+        future.add_done_callback(lambda done: self._finished(loop))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _finished(self, loop):
+        # Thread du pool : retour sur la boucle d'événements pour libérer le sémaphore
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass  # boucle déjà fermée (shutdown)
+
+    def _release(self):
+        self.running -= 1
+        self.completed += 1
+        self.semaphore.release()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def stats(self):
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": round(1000 * self.wait_total / self.completed, 3) if self.completed else 0.0,
+            "queue_wait_max_ms": round(1000 * self.wait_max, 3),
+        }
+
+
+password_executor = PasswordExecutor()
+
+
+async def run_password(func, *args):
+    """
+    Exécute `func` (hash_password / verify_password, fonctions importables par
+    les processus du pool) sur le pool de hachage.
+    """
+    return await password_executor.run(func, *args)
+
+
+def shutdown_executors():
+    """
+    Arrête les pools (appelé au shutdown de l'application).
+    """
+    _blocking_executor.shutdown(wait=True, cancel_futures=True)
+    password_executor.shutdown()
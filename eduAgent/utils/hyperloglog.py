@@ -0,0 +1,65 @@
+import hashlib
+import math
+
+# =====================================================
+# HYPERLOGLOG
+# =====================================================
+# Sketch de cardinalité de taille fixe : 2^p registres d'un octet (2 Ko pour
+# p = 11, erreur type ≈ 1.04 / sqrt(2^p) ≈ 2.3 %). La fusion (max registre par
+# registre) est idempotente et commutative : chaque worker peut fusionner son
+# sketch local dans celui stocké, dans n'importe quel ordre.
+
+HLL_PRECISION = 11
+
+
+class HyperLogLog:
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: bytes = None):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is None:
+            self.registers = bytearray(self.size)
+        elif len(registers) != self.size:
+            raise ValueError(f"Expected {self.size} registers, got {len(registers)}")
+        else:
+            self.registers = bytearray(registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, precision: int = HLL_PRECISION):
+        return cls(precision, data)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    def add(self, item: str) -> bool:
+        """Ajoute un élément. Retourne True si un registre a changé."""
+        value = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def covers(self, other: "HyperLogLog") -> bool:
+        """True si ce sketch contient déjà tout ce que `other` a vu."""
+        return all(a >= b for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Petites cardinalités : comptage linéaire
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __bool__(self):
+        return any(self.registers)
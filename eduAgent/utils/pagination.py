@@ -0,0 +1,50 @@
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+# =====================================================
+# CURSEURS (pagination par clé)
+# =====================================================
+# Un curseur est un jeton opaque qui encode la clé de tri (date, _id) du dernier
+# élément d'une page ; la page suivante est une simple plage sur l'index
+# (date desc, _id desc), quelle que soit sa profondeur.
+
+
+def encode_cursor(sort_value: datetime, doc_id) -> str:
+    payload = json.dumps({"t": sort_value.isoformat(), "id": str(doc_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Retourne (date, ObjectId). Lève ValueError si le jeton est invalide."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), ObjectId(payload["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {token!r}") from e
+
+
+def keyset_filter(field: str, cursor, direction: int = -1) -> dict:
+    """Filtre des documents situés après `cursor` dans l'ordre (field, _id), décroissant par défaut."""
+    sort_value, doc_id = cursor
+    bound, strict = ("$lte", "$lt") if direction < 0 else ("$gte", "$gt")
+    # La borne large garde un seul balayage de plage sur l'index, le $or départage les égalités
+    return {
+        field: {bound: sort_value},
+        "$or": [{field: {strict: sort_value}}, {"_id": {strict: doc_id}}],
+    }
+
+
+def keyset_page(docs: list, limit: int, field: str):
+    """
+    `docs` contient jusqu'à limit + 1 documents : le surplus indique qu'une page
+    suivante existe. Retourne (page, next_cursor).
+    """
+    page = docs[:limit]
+    if len(docs) <= limit or not page:
+        return page, None
+    last = page[-1]
+    return page, encode_cursor(last[field], last["_id"])
@@ -0,0 +1,43 @@
+import os
+
+import bcrypt
+
+# Coût bcrypt (2^rounds itérations) ; les hashs existants gardent le leur
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Module volontairement léger : il est importé par les processus du pool de
+# hachage (utils.executors.run_password), qui ne doivent pas ouvrir de connexions.
+
+
+def hash_password(password: str) -> str:
+    """
+    Hash a password using bcrypt.
+    Bcrypt has a 72-byte limit, so we truncate if necessary.
+    """
+    # Convert to bytes and truncate to 72 bytes if needed
+    password_bytes = password.encode('utf-8')
+    if len(password_bytes) > 72:
+        password_bytes = password_bytes[:72]
+    
+    # Generate salt and hash
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    hashed = bcrypt.hashpw(password_bytes, salt)
+    return hashed.decode('utf-8')
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a password against a bcrypt hash.
+    Bcrypt has a 72-byte limit, so we truncate if necessary.
+    """
+    try:
+        # Convert to bytes and truncate to 72 bytes if needed
+        password_bytes = plain_password.encode('utf-8')
+        if len(password_bytes) > 72:
+            password_bytes = password_bytes[:72]
+        
+        # Verify password
+        hashed_bytes = hashed_password.encode('utf-8')
+        return bcrypt.checkpw(password_bytes, hashed_bytes)
+    except Exception as e:
+        print(f"Password verification error: {e}")
+        return False
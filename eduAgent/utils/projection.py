@@ -0,0 +1,12 @@
+def parse_fields(fields, allowed) -> list:
+    """
+    Liste de champs `fields=a,b,c` d'une route de détail, limitée à `allowed`.
+    Retourne None si aucun champ n'est demandé ; lève ValueError sur un champ inconnu.
+    """
+    if not fields:
+        return None
+    selected = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in selected if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return selected or None
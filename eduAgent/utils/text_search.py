@@ -0,0 +1,73 @@
+import html
+import re
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+MAX_QUERY_TERMS = 16
+SNIPPET_RADIUS = 80
+
+_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+# =====================================================
+# REQUÊTE
+# =====================================================
+
+def search_terms(q: str) -> list:
+    """
+    Découpe la saisie utilisateur en mots simples. Les caractères spéciaux de
+    $text (guillemets, négation `-`) et des regex sont ainsi neutralisés.
+    """
+    terms = []
+    for term in _TERM_PATTERN.findall(q.lower()):
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def text_query(terms: list) -> dict:
+    """Filtre MongoDB $text pour des mots déjà nettoyés par search_terms."""
+    return {"$text": {"$search": " ".join(terms)}}
+
+
+# =====================================================
+# SURLIGNAGE
+# =====================================================
+
+def _terms_pattern(terms: list):
+    # Mots commençant par un terme (« art » : « article », pas « start »), suffixe
+    # compris : $text retrouve aussi les formes dérivées (racinisation)
+    alternatives = "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternatives})\w*", re.IGNORECASE)
+
+
+def highlight(text: str, terms: list) -> str:
+    """Échappe le texte (HTML) et entoure les mots recherchés de <mark>."""
+    if not text or not terms:
+        return html.escape(text or "")
+    pattern = _terms_pattern(terms)
+    parts = []
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
+
+
+def snippet(text: str, terms: list, radius: int = SNIPPET_RADIUS) -> str:
+    """Extrait surligné autour de la première occurrence d'un mot recherché."""
+    text = text or ""
+    match = _terms_pattern(terms).search(text) if terms else None
+    if match is None:
+        excerpt = text[:2 * radius]
+        return html.escape(excerpt) + ("…" if len(text) > len(excerpt) else "")
+
+    start = max(0, match.start() - radius)
+    end = min(len(text), match.end() + radius)
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    return prefix + highlight(text[start:end], terms) + suffix
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+EMBEDDING_DIM = 768
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorIndex:
+    """
+    In-process cosine index: a contiguous float32 matrix of normalized embeddings
+    searched with one matrix product. Same results as the Qdrant collection
+    (Cosine distance), without the network hop, for small and medium catalogs.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.ids = []
+        self.payloads = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def upsert(self, ids, vectors, payloads):
+        vectors = _normalize(vectors) if len(ids) else np.zeros((0, self.dim), dtype=np.float32)
+        with self.lock:
+            # Copy-on-write: a search in progress keeps the matrix it started with
+            positions = {pid: pos for pos, pid in enumerate(self.ids)}
+            matrix, index_ids, index_payloads = self.matrix, list(self.ids), list(self.payloads)
+            new_rows = []
+            for pid, vector, payload in zip(ids, vectors, payloads):
+                pos = positions.get(pid)
+                if pos is None:
+                    positions[pid] = len(index_ids)
+                    index_ids.append(pid)
+                    index_payloads.append(payload)
+                    new_rows.append(vector)
+                else:
+                    if matrix is self.matrix:
+                        matrix = matrix.copy()
+                    matrix[pos] = vector
+                    index_payloads[pos] = payload
+            if new_rows:
+                matrix = np.vstack([matrix, np.stack(new_rows)])
+            self.matrix = np.ascontiguousarray(matrix)
+            self.ids = index_ids
+            self.payloads = index_payloads
+
+    def delete(self, ids):
+        ids = set(ids)
+        with self.lock:
+            keep = [pos for pos, pid in enumerate(self.ids) if pid not in ids]
+            self.matrix = np.ascontiguousarray(self.matrix[keep])
+            self.ids = [self.ids[pos] for pos in keep]
+            self.payloads = [self.payloads[pos] for pos in keep]
+
+    def search(self, query_vectors, limit=1):
+        """Top-`limit` hits for each query vector: [[{"id", "score", "payload"}, ...], ...]."""
+        queries = _normalize(query_vectors)
+        with self.lock:
+            matrix, ids, payloads = self.matrix, self.ids, self.payloads
+        if not ids:
+            return [[] for _ in range(len(queries))]
+
+        scores = queries @ matrix.T
+        k = min(limit, len(ids))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(scores, top):
+            ordered = candidates[np.argsort(-row[candidates])]
+            results.append([
+                {"id": ids[pos], "score": float(row[pos]), "payload": payloads[pos]}
+                for pos in ordered
+            ])
+        return results
+
+    def save(self, path):
+        """Snapshot: `<path>.npy` (matrix) + `<path>.json` (ids and payloads)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            np.save(f"{path}.npy", self.matrix)
+            with open(f"{path}.json", "w", encoding="utf-8") as f:
+                json.dump({"ids": self.ids, "payloads": self.payloads}, f)
+
+    @classmethod
+    def load(cls, path):
+        # Loaded in memory (writable): upserts update rows of the matrix
+        matrix = np.load(f"{path}.npy")
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(dim=matrix.shape[1])
+        index.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        index.ids = meta["ids"]
+        index.payloads = meta["payloads"]
+        return index
+
+    @staticmethod
+    def snapshot_exists(path):
+        return os.path.exists(f"{path}.npy") and os.path.exists(f"{path}.json")
@@ -0,0 +1,171 @@
+import asyncio
+import os
+
+import async_mongo
+from utils.hyperloglog import HyperLogLog
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", "5"))
+VIEW_FLUSH_MAX_DELTA = int(os.getenv("VIEW_FLUSH_MAX_DELTA", "500"))
+# Tentatives de fusion d'un sketch de lecteurs uniques (compare-and-swap) par flush
+SKETCH_MERGE_ATTEMPTS = 3
+
+
+class ViewCounter:
+    """
+    Compteur de vues différé : les vues de chaque article s'accumulent en
+    mémoire et sont écrites ($inc) en un seul bulk_write toutes les
+    VIEW_FLUSH_INTERVAL secondes, ou dès qu'un article atteint
+    VIEW_FLUSH_MAX_DELTA vues en attente.
+
+    Les lecteurs de chaque article sont aussi ajoutés à un HyperLogLog local,
+    fusionné au même moment dans le sketch stocké sur l'article (champ
+    `viewers_hll`, estimation dans `unique_viewers`).
+    """
+
+    def __init__(self, flush_interval=VIEW_FLUSH_INTERVAL, max_delta=VIEW_FLUSH_MAX_DELTA):
+        self.flush_interval = flush_interval
+        self.max_delta = max_delta
+        self.pending = {}    # article_id -> vues pas encore écrites
+        self.in_flight = {}  # vues du bulk_write en cours
+        self.sketches = {}   # article_id -> HyperLogLog des lecteurs depuis le dernier flush
+        self.wakeup = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.task = None
+        self.running = False
+        self.recorded = 0
+        self.flushes = 0
+        self.written_updates = 0
+        self.merged_sketches = 0
+        self.sketch_conflicts = 0
+        self.failures = 0
+
+    def record(self, article_id: str, viewer: str = None, views: int = 1):
+        delta = self.pending.get(article_id, 0) + views
+        self.pending[article_id] = delta
+        self.recorded += views
+        if viewer:
+            self.sketches.setdefault(article_id, HyperLogLog()).add(viewer)
+        if delta >= self.max_delta:
+            self.wakeup.set()
+
+    def pending_views(self, article_id: str) -> int:
+        """Vues déjà comptées mais pas encore visibles dans MongoDB."""
+        return self.pending.get(article_id, 0) + self.in_flight.get(article_id, 0)
+
+    def _requeue_sketches(self, sketches):
+        for article_id, sketch in sketches.items():
+            current = self.sketches.get(article_id)
+            if current is None:
+                self.sketches[article_id] = sketch
+            else:
+                current.merge(sketch)
+
+    async def _merge_sketches(self, sketches):
+        """
+        Fusionne les sketchs locaux dans ceux des articles. Une écriture perdue
+        face à un autre worker (version changée) est vue à la relecture : le
+        sketch stocké ne couvre pas encore le nôtre, on refusionne.
+        """
+        for attempt in range(SKETCH_MERGE_ATTEMPTS + 1):
+            stored = await async_mongo.get_viewer_sketches(list(sketches))
+            updates = []
+            for article_id, local in list(sketches.items()):
+                if article_id not in stored:
+                    # Article supprimé entre-temps
+                    del sketches[article_id]
+                    continue
+                data, version = stored[article_id]
+                merged = HyperLogLog.from_bytes(data) if data else HyperLogLog()
+                if data and merged.covers(local):
+                    del sketches[article_id]
+                    continue
+                merged.merge(local)
+                updates.append((article_id, version, merged.to_bytes(), merged.count()))
+
+            if not updates:
+                return
+            if attempt:
+                self.sketch_conflicts += len(updates)
+            if attempt == SKETCH_MERGE_ATTEMPTS:
+                break
+            await async_mongo.bulk_set_viewer_sketches(updates)
+            self.merged_sketches += len(updates)
+
+        # Contention persistante : nouvel essai au prochain flush
+        self._requeue_sketches(sketches)
+
+    async def flush(self):
+        """Écrit maintenant toutes les vues en attente. Retourne le nombre d'articles mis à jour."""
+        async with self.flush_lock:
+            if not self.pending and not self.sketches:
+                return 0
+            batch, self.pending = self.pending, {}
+            sketches, self.sketches = self.sketches, {}
+            self.in_flight = batch
+            try:
+                if batch:
+                    await async_mongo.bulk_increment_views(batch)
+            except Exception as e:
+                self.failures += 1
+                print(f"[Views] Flush failed, will retry: {e}")
+                for article_id, delta in batch.items():
+                    self.pending[article_id] = self.pending.get(article_id, 0) + delta
+                self._requeue_sketches(sketches)
+                return 0
+            finally:
+                self.in_flight = {}
+            self.flushes += 1
+            self.written_updates += len(batch)
+
+            if sketches:
+                try:
+                    await self._merge_sketches(sketches)
+                except Exception as e:
+                    self.failures += 1
+                    print(f"[Views] Unique-viewer merge failed, will retry: {e}")
+                    self._requeue_sketches(sketches)
+            return len(batch)
+
+    async def _run(self):
+        while self.running:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self.task is None:
+            self.running = True
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Arrête la tâche de fond et écrit ce qui reste (shutdown)."""
+        if self.task is not None:
+            # Pas d'annulation : un bulk_write interrompu perdrait ses vues
+            self.running = False
+            self.wakeup.set()
+            await self.task
+            self.task = None
+        await self.flush()
+
+    def stats(self):
+        return {
+            "pending_articles": len(self.pending),
+            "pending_views": sum(self.pending.values()),
+            "pending_sketches": len(self.sketches),
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "written_updates": self.written_updates,
+            "merged_sketches": self.merged_sketches,
+            "sketch_conflicts": self.sketch_conflicts,
+            "failures": self.failures,
+        }
+
+
+view_counter = ViewCounter()
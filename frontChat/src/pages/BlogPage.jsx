@@ -92,7 +92,7 @@ const BlogPage = () => {
       const query = searchQuery.toLowerCase();
       filtered = filtered.filter(article =>
         article.title.toLowerCase().includes(query) ||
-        article.content.toLowerCase().includes(query) ||
+        (article.excerpt || article.content || '').toLowerCase().includes(query) ||
         article.author_email?.toLowerCase().includes(query)
       );
     }
@@ -211,7 +211,7 @@ const BlogPage = () => {
                 </h2>
 
                 <p className="text-text-secondary mb-6">
-                  {featuredArticle.excerpt || featuredArticle.content.substring(0, 200)}...
+                  {featuredArticle.excerpt || (featuredArticle.content || '').substring(0, 200)}...
                 </p>
 
                 <div className="flex items-center justify-between">
@@ -367,7 +367,7 @@ const ArticleCard = ({ article, index = 0 }) => (
           <Calendar className="w-4 h-4" /> {formatDate(article.created_at)}
         </span>
         <span className="flex items-center gap-1 text-text-secondary text-sm">
-          <Clock className="w-4 h-4" /> {Math.ceil(article.content.length / 1000)} min
+          <Clock className="w-4 h-4" /> {Math.ceil((article.content_length ?? article.content?.length ?? 0) / 1000)} min
         </span>
       </div>
 
@@ -376,7 +376,7 @@ const ArticleCard = ({ article, index = 0 }) => (
       </h3>
 
       <p className="text-text-secondary mb-4 line-clamp-3">
-        {article.excerpt || article.content.substring(0, 130)}...
+        {article.excerpt || (article.content || '').substring(0, 130)}...
       </p>
 
       <div className="mt-auto flex items-center justify-between pt-4 border-t border-brand-grey">